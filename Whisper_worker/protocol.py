@@ -0,0 +1,112 @@
+import json
+import struct
+
+# Every message on the whisper socket is one frame:
+#   type (uint8) | session id (uint32) | payload length (uint32) | payload
+# Several sessions (one per utterance) can share a connection.
+HEADER = struct.Struct("!BII")
+
+HELLO = 1      # client -> server: open a session, JSON audio format (see below)
+AUDIO = 2      # client -> server: PCM in the negotiated format
+END = 3        # client -> server: no more audio for this session
+PARTIAL = 4    # server -> client: JSON {"text", "stable", "tentative", "final": false}
+ERROR = 5      # server -> client: JSON {"error": ...}
+PING = 6       # health check (session id 0)
+PONG = 7       # server -> client: JSON status
+SHUTDOWN = 8   # client -> server: stop the daemon after active sessions
+FINAL = 9      # server -> client: JSON {"text", "stable", "tentative", "final": true}
+READY = 10     # server -> client: JSON accepted format + flow-control window
+ACK = 11       # server -> client: total audio bytes consumed so far (uint64)
+CANCEL = 12    # client -> server: drop the session, no final result
+
+# Format negotiation: HELLO asks for {"sample_rate", "format", "channels"};
+# READY answers with what the server will actually read (it resamples and
+# downmixes to 16 kHz mono itself) or ERROR if the format is unsupported.
+# HELLO may also pick the voice activity gate: "vad" ("energy", "silero"
+# or "off") and "end_silence" (seconds of silence after speech that end
+# the utterance server-side, 0 = wait for END).
+FORMATS = {"s16le": 2, "f32le": 4}  # name -> bytes per sample
+VAD_MODES = ("energy", "silero", "off")
+SAMPLE_RATES = (8000, 16000, 22050, 24000, 32000, 44100, 48000)
+
+# Backpressure: a client may have at most `window` un-ACKed audio bytes in
+# flight; the server ACKs once audio has been fed to the transcriber.
+DEFAULT_WINDOW_SECONDS = 4
+ACK_STRUCT = struct.Struct("!Q")
+
+MAX_PAYLOAD = 16 * 1024 * 1024
+
+DEFAULT_PORT = 8765
+
+
+def encode(msg_type, session_id, payload=b""):
+    return HEADER.pack(msg_type, session_id, len(payload)) + payload
+
+
+def encode_json(msg_type, session_id, obj):
+    return encode(msg_type, session_id, json.dumps(obj).encode("utf-8"))
+
+
+def _recv_exact(sock, n):
+    buf = bytearray(n)
+    view = memoryview(buf)
+    got = 0
+    while got < n:
+        read = sock.recv_into(view[got:], n - got)
+        if not read:
+            return None
+        got += read
+    return bytes(buf)
+
+
+def read_frame(sock):
+    """Blocking read of one frame; returns (type, session_id, payload) or
+    None when the peer closed the connection."""
+    header = _recv_exact(sock, HEADER.size)
+    if header is None:
+        return None
+    msg_type, session_id, length = HEADER.unpack(header)
+    if length > MAX_PAYLOAD:
+        raise ValueError(f"frame too large: {length} bytes")
+    payload = _recv_exact(sock, length) if length else b""
+    if payload is None:
+        return None
+    return msg_type, session_id, payload
+
+
+def encode_ack(session_id, consumed):
+    return encode(ACK, session_id, ACK_STRUCT.pack(consumed))
+
+
+def decode_ack(payload):
+    return ACK_STRUCT.unpack(payload)[0]
+
+
+def negotiate(requested):
+    """Server side of HELLO: returns the accepted format dict or raises
+    ValueError with a message for the ERROR frame."""
+    fmt = requested.get("format", "s16le")
+    if fmt not in FORMATS:
+        raise ValueError(f"unsupported format {fmt!r}, expected one of {sorted(FORMATS)}")
+    rate = int(requested.get("sample_rate", 16000))
+    if rate not in SAMPLE_RATES:
+        raise ValueError(f"unsupported sample rate {rate}")
+    channels = int(requested.get("channels", 1))
+    if channels not in (1, 2):
+        raise ValueError(f"unsupported channel count {channels}")
+    vad = requested.get("vad", "energy")
+    if vad not in VAD_MODES:
+        raise ValueError(f"unsupported vad mode {vad!r}, expected one of {VAD_MODES}")
+    bytes_per_second = rate * channels * FORMATS[fmt]
+    return {
+        "sample_rate": rate,
+        "format": fmt,
+        "channels": channels,
+        "vad": vad,
+        "end_silence": float(requested.get("end_silence", 0.0)),
+        "window": bytes_per_second * DEFAULT_WINDOW_SECONDS,
+    }
+
+
+def decode_json(payload):
+    return json.loads(payload.decode("utf-8")) if payload else {}
@@ -0,0 +1,166 @@
+import numpy as np
+
+SAMPLE_RATE = 16000
+
+
+def to_mono_float32(payload, fmt="s16le", channels=1):
+    if fmt == "s16le":
+        samples = np.frombuffer(payload, dtype="<i2").astype(np.float32)
+        samples /= 32768.0
+    else:
+        samples = np.frombuffer(payload, dtype="<f4").astype(np.float32)
+    if channels > 1:
+        samples = samples[:len(samples) - len(samples) % channels]
+        samples = samples.reshape(-1, channels).mean(axis=1)
+    return samples
+
+
+def resample(samples, rate, target=SAMPLE_RATE):
+    # Linear interpolation is plenty for speech recognition input
+    if rate == target or len(samples) == 0:
+        return samples
+    n = int(round(len(samples) * target / rate))
+    x = np.linspace(0, len(samples) - 1, n, dtype=np.float64)
+    return np.interp(x, np.arange(len(samples)), samples).astype(np.float32)
+
+
+class AudioRingBuffer:
+    """Fixed-size float32 ring buffer addressed by absolute sample index.
+
+    Only audio that has not been committed yet needs to stay in the
+    buffer, so the capacity bounds the longest uncommitted window.
+    """
+
+    def __init__(self, capacity_seconds=40, sample_rate=SAMPLE_RATE):
+        self.capacity = int(capacity_seconds * sample_rate)
+        self.data = np.zeros(self.capacity, dtype=np.float32)
+        self.end = 0    # absolute index one past the newest sample
+        self.start = 0  # oldest absolute index still readable
+
+    def append_pcm16(self, pcm):
+        samples = np.frombuffer(pcm, dtype=np.int16).astype(np.float32)
+        samples /= 32768.0
+        self.append(samples)
+
+    def append(self, samples):
+        n = len(samples)
+        if n >= self.capacity:
+            samples = samples[-self.capacity:]
+            self.end += n - self.capacity
+            n = self.capacity
+        pos = self.end % self.capacity
+        first = min(n, self.capacity - pos)
+        self.data[pos:pos + first] = samples[:first]
+        self.data[:n - first] = samples[first:]
+        self.end += n
+        self.start = max(self.start, self.end - self.capacity)
+
+    def read(self, start):
+        # Contiguous copy of [start, end), clamped to what is still buffered
+        start = max(start, self.start)
+        n = self.end - start
+        pos = start % self.capacity
+        if pos + n <= self.capacity:
+            return self.data[pos:pos + n].copy()
+        return np.concatenate((self.data[pos:], self.data[:pos + n - self.capacity]))
+
+
+class StreamingTranscriber:
+    """Incremental transcription of one utterance.
+
+    Audio past the last committed segment is re-decoded every `step`
+    seconds of new audio. A segment is committed (stable) once Silero VAD
+    and the decoder agree it ended at least `commit_margin` seconds before
+    the end of the window, i.e. it is followed by silence; after that its
+    audio is never decoded again. Everything after it is tentative.
+    """
+
+    def __init__(self, model, sample_rate=SAMPLE_RATE, step=1.0, commit_margin=1.0,
+                 max_window=25.0, transcribe_options=None):
+        self.model = model
+        self.sample_rate = sample_rate
+        self.step = int(step * sample_rate)
+        self.commit_margin = commit_margin
+        self.max_window = max_window
+        self.buffer = AudioRingBuffer(max_window + 15, sample_rate)
+        self.committed = 0      # absolute sample index of the commit point
+        self.decoded_until = 0  # buffer.end at the last decode
+        self.stable = []
+        self.tentative = ""
+        self.transcribe_options = dict(
+            beam_size=1,
+            vad_filter=True,
+            condition_on_previous_text=False,
+        )
+        self.transcribe_options.update(transcribe_options or {})
+
+    def feed(self, pcm):
+        self.buffer.append_pcm16(pcm)
+
+    def feed_samples(self, samples):
+        # float32 mono at self.sample_rate
+        self.buffer.append(samples)
+
+    def audio_seconds(self):
+        return self.buffer.end / self.sample_rate
+
+    def due(self):
+        # Cadence is driven by audio duration, not by how it was chunked
+        return self.buffer.end - self.decoded_until >= self.step
+
+    def text(self):
+        return " ".join(self.stable + ([self.tentative] if self.tentative else [])).strip()
+
+    def stable_text(self):
+        return " ".join(self.stable).strip()
+
+    def process(self, final=False, commit_all=False):
+        # commit_all: the speaker paused (VAD), so everything decoded so far
+        # can be committed even without trailing silence in the window
+        self.decoded_until = self.buffer.end
+        audio = self.buffer.read(self.committed)
+        if len(audio) == 0:
+            self.tentative = ""
+            return self.result(final)
+
+        options = dict(self.transcribe_options)
+        if self.stable:
+            # Keep wording consistent across the commit boundary
+            options["initial_prompt"] = " ".join(self.stable)[-200:]
+        segments, _ = self.model.transcribe(audio, **options)
+        segments = [s for s in segments if s.text.strip()]
+
+        window_end = len(audio) / self.sample_rate
+        commit_end = None
+        tentative = []
+        for segment in segments:
+            stable = final or commit_all or segment.end <= window_end - self.commit_margin
+            # Commits must be a prefix: once one segment is tentative, the
+            # rest are too
+            if stable and not tentative:
+                self.stable.append(segment.text.strip())
+                commit_end = segment.end
+            else:
+                tentative.append(segment.text.strip())
+
+        if commit_end is not None:
+            self.committed += int(commit_end * self.sample_rate)
+        elif not segments and window_end > self.commit_margin:
+            # Nothing but silence: drop it, keeping a margin for speech onset
+            self.committed += int((window_end - self.commit_margin) * self.sample_rate)
+        if window_end > self.max_window and commit_end is None and not final:
+            # Never let the window outgrow Whisper's 30 s context
+            self.stable.extend(tentative)
+            tentative = []
+            self.committed = self.buffer.end
+
+        self.tentative = " ".join(tentative)
+        return self.result(final)
+
+    def result(self, final):
+        return {
+            "text": self.text(),
+            "stable": self.stable_text(),
+            "tentative": "" if final else self.tentative,
+            "final": final,
+        }
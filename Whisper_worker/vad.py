@@ -0,0 +1,136 @@
+import numpy as np
+
+SAMPLE_RATE = 16000
+
+
+class EnergyVAD:
+    """Frame classifier on RMS energy against an adaptive noise floor."""
+
+    latency = 0.0  # seconds of audio before a frame is classified
+
+    def __init__(self, threshold_db=-45.0, margin_db=10.0, floor_adapt=0.05, floor_rise_db=0.03):
+        self.threshold_db = threshold_db  # absolute minimum for speech
+        self.margin_db = margin_db        # how far above the noise floor
+        self.floor_adapt = floor_adapt
+        self.floor_rise_db = floor_rise_db  # per speech frame, ~1 dB/s at 30 ms
+        self.noise_floor_db = threshold_db - margin_db
+
+    def is_speech(self, frame):
+        rms = float(np.sqrt(np.mean(frame * frame))) + 1e-10
+        level_db = 20.0 * np.log10(rms)
+        speech = level_db > max(self.threshold_db, self.noise_floor_db + self.margin_db)
+        if not speech:
+            self.noise_floor_db += self.floor_adapt * (level_db - self.noise_floor_db)
+        else:
+            # Creeps up under "speech": a fan switched on is taken as
+            # background after a while instead of keeping the gate open
+            # for good, while pauses in real speech pull it back down
+            self.noise_floor_db = min(level_db, self.noise_floor_db + self.floor_rise_db)
+        return speech
+
+
+class SileroVAD:
+    """Model-based classifier using the Silero model bundled with
+    faster-whisper (CPU, ONNX). Frames are scored in blocks of
+    `block_seconds` to amortise the model call, so a frame is classified
+    up to a block later (`latency`) and the answer holds for the block."""
+
+    def __init__(self, threshold=0.5, block_seconds=0.5, sample_rate=SAMPLE_RATE):
+        from faster_whisper.vad import VadOptions, get_speech_timestamps
+        self.latency = block_seconds
+        self._get_speech_timestamps = get_speech_timestamps
+        self.options = VadOptions(threshold=threshold, min_silence_duration_ms=100, speech_pad_ms=0)
+        self.block = int(block_seconds * sample_rate)
+        self.pending = []
+        self.pending_len = 0
+        self.last = False
+
+    def is_speech(self, frame):
+        self.pending.append(frame)
+        self.pending_len += len(frame)
+        if self.pending_len >= self.block:
+            audio = np.concatenate(self.pending)
+            self.last = bool(self._get_speech_timestamps(audio, self.options))
+            self.pending = []
+            self.pending_len = 0
+        return self.last
+
+
+class VoiceActivityGate:
+    """Sits between the audio stream and the transcriber.
+
+    Silent frames are dropped, except `pre_roll` seconds before speech
+    starts and `hangover` seconds after it stops so word edges are not
+    clipped. After `end_silence` seconds without speech (following some
+    speech) the utterance is reported as ended. speech_ratio() is the
+    share of input frames classified as speech.
+    """
+
+    def __init__(self, mode="energy", frame_seconds=0.03, pre_roll=0.2, hangover=0.3,
+                 end_silence=0.0, sample_rate=SAMPLE_RATE):
+        if mode == "silero":
+            self.vad = SileroVAD(sample_rate=sample_rate)
+        else:
+            self.vad = EnergyVAD()
+        self.frame = int(frame_seconds * sample_rate)
+        # Also keeps the frames the classifier has not scored yet when it
+        # reports speech, or the start of the first word is lost
+        self.pre_roll_frames = max(1, int(round((pre_roll + self.vad.latency) / frame_seconds)))
+        self.hangover_frames = int(hangover / frame_seconds)
+        self.end_silence_frames = int(end_silence / frame_seconds) if end_silence else 0
+        self.remainder = np.zeros(0, dtype=np.float32)
+        self.pre_roll = []
+        self.silent_run = 0
+        self.heard_speech = False
+        self.in_speech = False
+        self.ended = False
+        self.total_frames = 0
+        self.speech_frames = 0
+
+    def process(self, samples):
+        """Feed float32 mono samples; returns (kept_samples, paused) where
+        paused is True if a stretch of speech just ended."""
+        data = np.concatenate((self.remainder, samples)) if len(self.remainder) else samples
+        usable = len(data) - len(data) % self.frame
+        self.remainder = data[usable:]
+        kept = []
+        paused = False
+        for start in range(0, usable, self.frame):
+            frame = data[start:start + self.frame]
+            self.total_frames += 1
+            if self.vad.is_speech(frame):
+                self.speech_frames += 1
+                if not self.in_speech:
+                    kept.extend(self.pre_roll)
+                    self.pre_roll = []
+                self.in_speech = True
+                self.heard_speech = True
+                self.silent_run = 0
+                kept.append(frame)
+                continue
+
+            self.silent_run += 1
+            if self.in_speech and self.silent_run <= self.hangover_frames:
+                kept.append(frame)
+                continue
+            if self.in_speech:
+                self.in_speech = False
+                paused = True
+            self.pre_roll.append(frame)
+            if len(self.pre_roll) > self.pre_roll_frames:
+                self.pre_roll.pop(0)
+            if (self.end_silence_frames and self.heard_speech
+                    and self.silent_run >= self.end_silence_frames):
+                self.ended = True
+        out = np.concatenate(kept) if kept else np.zeros(0, dtype=np.float32)
+        return out, paused
+
+    def speech_ratio(self):
+        return self.speech_frames / self.total_frames if self.total_frames else 0.0
+
+    def stats(self):
+        return {
+            "speech_ratio": self.speech_ratio(),
+            "input_seconds": self.total_frames * self.frame / SAMPLE_RATE,
+            "speech_seconds": self.speech_frames * self.frame / SAMPLE_RATE,
+        }
@@ -1,58 +1,219 @@
-import socket
+import os
+import sys
+import time
 import json
-import numpy as np
-import tempfile
-import wave
+import threading
+import socketserver
+from collections import deque
 from faster_whisper import WhisperModel
 
-model = WhisperModel("../models/whisper-cpu", device="cpu", compute_type="int8")
-
-def save_wav(frames, filename):
-    with wave.open(filename, 'wb') as wf:
-        wf.setnchannels(1)
-        wf.setsampwidth(2)
-        wf.setframerate(16000)
-        wf.writeframes(b''.join(frames))
-
-def run_socket_server():
-    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    server.bind(("localhost", 8765))
-    server.listen(1)
-    conn, addr = server.accept()
-    frames = []
-    while True:
-        data = conn.recv(2048)
-        if not data:
-            break
-        if b"__END__" in data:
-            data = data.replace(b"__END__", b"")
-            if data:
-                frames.append(data)
-            break
-        frames.append(data)
-        # Optionally, stream partial transcription here for real-time
-        if len(frames) % 10 == 0:
-            with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as tmp:
-                save_wav(frames, tmp.name)
-                segments, _ = model.transcribe(tmp.name)
-                text = " ".join([s.text for s in segments])
-                msg = json.dumps({"text": text}) + "\n"
-                conn.sendall(msg.encode())
-    # Final transcription
-    if frames:
-        with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as tmp:
-            save_wav(frames, tmp.name)
-            segments, _ = model.transcribe(tmp.name)
-            text = " ".join([s.text for s in segments])
-            msg = json.dumps({"text": text}) + "\n"
-            conn.sendall(msg.encode())
-    conn.close()
-    server.close()
+import protocol
+from streaming import StreamingTranscriber, to_mono_float32, resample
+from vad import VoiceActivityGate
+
+MODEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "models", "whisper-cpu")
+MAX_SESSIONS = 4  # concurrent transcriptions (CTranslate2 workers)
+
+model = None
+
+
+def load_model(path=MODEL_PATH, cpu_threads=0):
+    # cpu_threads: CTranslate2 threads per worker, 0 = its default
+    global model
+    if model is None:
+        model = WhisperModel(path, device="cpu", compute_type="int8", num_workers=MAX_SESSIONS,
+                             cpu_threads=cpu_threads)
+    return model
+
+class Session:
+    def __init__(self, session_id, audio_format):
+        self.session_id = session_id
+        self.format = audio_format
+        self.consumed = 0  # audio bytes fed so far (reported in ACKs)
+        self.remainder = b""
+        frame = protocol.FORMATS[audio_format["format"]] * audio_format["channels"]
+        self.frame_bytes = frame
+        # Audio stays in memory; only the uncommitted tail is re-decoded
+        self.transcriber = StreamingTranscriber(model)
+        # Silence never reaches Whisper when a gate is configured
+        self.gate = None
+        if audio_format["vad"] != "off":
+            self.gate = VoiceActivityGate(audio_format["vad"], end_silence=audio_format["end_silence"])
+
+    def feed(self, payload):
+        """Returns True if the speaker just paused (time to commit)."""
+        # AUDIO frames may split a sample; carry the partial one over
+        data = self.remainder + payload
+        usable = len(data) - len(data) % self.frame_bytes
+        self.remainder = data[usable:]
+        samples = to_mono_float32(data[:usable], self.format["format"], self.format["channels"])
+        samples = resample(samples, self.format["sample_rate"])
+        self.consumed += len(payload)
+        if self.gate is None:
+            self.transcriber.feed_samples(samples)
+            return False
+        kept, paused = self.gate.process(samples)
+        self.transcriber.feed_samples(kept)
+        return paused
+
+    def ended(self):
+        return self.gate is not None and self.gate.ended
+
+    def result(self, final, commit_all=False):
+        result = self.transcriber.process(final=final, commit_all=commit_all)
+        if self.gate is not None:
+            result.update(self.gate.stats())
+        return result
+
+
+class ConnectionHandler(socketserver.BaseRequestHandler):
+    # One thread per client connection; a connection may run many sessions
+    # (one per utterance) over its lifetime.
+
+    def setup(self):
+        self.send_lock = threading.Lock()
+        self.sessions = {}
+        # Recently finished session ids: audio the client sent before it
+        # saw the FINAL is still arriving and is dropped without an ERROR
+        self.finished = deque(maxlen=16)
+
+    def send(self, data):
+        with self.send_lock:
+            self.request.sendall(data)
+
+    def handle(self):
+        server = self.server
+        while True:
+            try:
+                frame = protocol.read_frame(self.request)
+            except (OSError, ValueError) as e:
+                print("Whisper connection error:", e)
+                break
+            if frame is None:
+                break
+            msg_type, session_id, payload = frame
+
+            if msg_type == protocol.PING:
+                self.send(protocol.encode_json(protocol.PONG, session_id, server.status()))
+            elif msg_type == protocol.SHUTDOWN:
+                # shutdown() blocks until serve_forever returns, so not here
+                threading.Thread(target=server.shutdown, daemon=True).start()
+                break
+            elif msg_type == protocol.HELLO:
+                try:
+                    audio_format = protocol.negotiate(protocol.decode_json(payload))
+                except ValueError as e:
+                    self.send(protocol.encode_json(protocol.ERROR, session_id, {"error": str(e)}))
+                    continue
+                self.sessions[session_id] = Session(session_id, audio_format)
+                server.session_started()
+                self.send(protocol.encode_json(protocol.READY, session_id, audio_format))
+            elif msg_type == protocol.AUDIO:
+                session = self.sessions.get(session_id)
+                if session is None:
+                    if session_id not in self.finished:
+                        self.send(protocol.encode_json(protocol.ERROR, session_id, {"error": "unknown session"}))
+                    continue
+                paused = session.feed(payload)
+                if session.ended():
+                    # Enough silence after speech: finish without waiting for END
+                    self.send(protocol.encode_ack(session_id, session.consumed))
+                    self.finish_session(session_id)
+                    continue
+                # Partials every `step` seconds of speech, however it was
+                # chunked, and whenever the speaker pauses
+                if paused or session.transcriber.due():
+                    self.send_text(session, final=False, commit_all=paused)
+                # ACK after decoding so a slow decoder throttles the client
+                self.send(protocol.encode_ack(session_id, session.consumed))
+            elif msg_type == protocol.END:
+                # Unknown if the session already ended on silence
+                self.finish_session(session_id)
+            elif msg_type == protocol.CANCEL:
+                # Skip the final decode; buffered audio is just dropped
+                if self.sessions.pop(session_id, None) is not None:
+                    self.finished.append(session_id)
+                    server.session_finished()
+
+        for _ in self.sessions:
+            server.session_finished()
+        self.sessions.clear()
+
+    def finish_session(self, session_id):
+        session = self.sessions.pop(session_id, None)
+        if session is None:
+            return
+        self.finished.append(session_id)
+        self.send_text(session, final=True)
+        self.server.session_finished()
+
+    def send_text(self, session, final, commit_all=False):
+        try:
+            result = session.result(final, commit_all)
+            msg_type = protocol.FINAL if final else protocol.PARTIAL
+            self.send(protocol.encode_json(msg_type, session.session_id, result))
+        except Exception as e:
+            self.send(protocol.encode_json(protocol.ERROR, session.session_id, {"error": str(e)}))
+            if final:
+                # Always close the session with a FINAL so clients stop waiting
+                self.send(protocol.encode_json(protocol.FINAL, session.session_id,
+                                               session.transcriber.result(final=True)))
+
+
+class WhisperServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    # Connection threads must not keep the daemon alive after SHUTDOWN:
+    # other clients may stay connected, idle, for as long as they run
+    daemon_threads = True
+
+    def __init__(self, address):
+        super().__init__(address, ConnectionHandler)
+        self.started_at = time.time()
+        self.active_sessions = 0
+        self.total_sessions = 0
+        self._lock = threading.Lock()
+
+    def session_started(self):
+        with self._lock:
+            self.active_sessions += 1
+            self.total_sessions += 1
+
+    def session_finished(self):
+        with self._lock:
+            self.active_sessions -= 1
+
+    def status(self):
+        with self._lock:
+            return {
+                "status": "ok",
+                "model_loaded": model is not None,
+                "active_sessions": self.active_sessions,
+                "total_sessions": self.total_sessions,
+                "uptime": time.time() - self.started_at,
+            }
+
+
+def run_socket_server(port=protocol.DEFAULT_PORT, cpu_threads=0):
+    # Loaded once for the lifetime of the daemon
+    load_model(cpu_threads=cpu_threads)
+    server = WhisperServer(("localhost", port))
+    print(f"Whisper daemon listening on localhost:{port}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
 
 if __name__ == "__main__":
-    import sys
     if "--socket" in sys.argv:
-        run_socket_server()
+        port = protocol.DEFAULT_PORT
+        if "--port" in sys.argv:
+            port = int(sys.argv[sys.argv.index("--port") + 1])
+        cpu_threads = 0
+        if "--threads" in sys.argv:
+            cpu_threads = int(sys.argv[sys.argv.index("--threads") + 1])
+        run_socket_server(port, cpu_threads)
     else:
         # Fallback: file mode for compatibility
         if len(sys.argv) < 2:
@@ -60,9 +221,9 @@ if __name__ == "__main__":
             sys.exit(1)
         audio_path = sys.argv[1]
         try:
-            segments, _ = model.transcribe(audio_path)
+            segments, _ = load_model().transcribe(audio_path)
             text = " ".join([s.text for s in segments])
             print(json.dumps({"text": text}))
         except Exception as e:
             print(json.dumps({"error": str(e)}))
-            sys.exit(1)
\ No newline at end of file
+            sys.exit(1)
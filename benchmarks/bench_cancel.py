@@ -0,0 +1,103 @@
+# Cancel-to-idle latency: how long after CancellationToken.cancel() a
+# streaming LLM reply and a Stable Diffusion generation actually stop and
+# their thread exits. The LLM is cancelled after --tokens streamed tokens,
+# SD after --steps denoising steps; both use the real models from settings.
+#
+#   python benchmarks/bench_cancel.py [--tokens 8] [--steps 3] [--repeat 3] [--skip-llm] [--skip-sd]
+import os
+import sys
+import time
+import argparse
+import threading
+import statistics
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+from workers.cancellation import CancellationToken, CancelledError
+
+
+def measure(run, arm):
+    """run(token) in a thread; arm(token, fire) must call fire() at the
+    moment to cancel. Returns seconds from cancel() to the thread exiting."""
+    token = CancellationToken()
+    cancelled_at = []
+
+    def fire():
+        cancelled_at.append(time.perf_counter())
+        token.cancel()
+
+    def target():
+        try:
+            run(token, lambda: arm(token, fire))
+        except CancelledError:
+            pass
+
+    thread = threading.Thread(target=target)
+    thread.start()
+    thread.join()
+    if not cancelled_at:
+        raise RuntimeError("finished before the cancel point; lower --tokens/--steps")
+    return time.perf_counter() - cancelled_at[0]
+
+
+def bench_llm(args):
+    from main import load_llm
+    llm = load_llm()
+    seen = []
+
+    def run(token, tick):
+        seen.clear()
+        # force: a cached replay would never reach llama.cpp
+        for _ in llm.ask("Write a long story about a lighthouse keeper.", stream=True,
+                         force=True, cancel=token, max_tokens=512):
+            seen.append(1)
+            tick()
+
+    def arm(token, fire):
+        if len(seen) == args.tokens:
+            fire()
+
+    report("llm", [measure(run, arm) for _ in range(args.repeat)])
+
+
+def bench_sd(args):
+    from main import load_sd
+    sd = load_sd()
+    steps = []
+
+    def run(token, tick):
+        steps.clear()
+        sd.generate_batch(["a lighthouse at dusk"], [1], on_step=lambda step, total: (steps.append(step), tick()),
+                          cancel=token, num_inference_steps=max(20, args.steps + 5))
+
+    def arm(token, fire):
+        if len(steps) == args.steps:
+            fire()
+
+    report("sd", [measure(run, arm) for _ in range(args.repeat)])
+
+
+def report(name, latencies):
+    ms = [t * 1000 for t in latencies]
+    print(f"{name}: cancel-to-idle median {statistics.median(ms):7.1f} ms   max {max(ms):7.1f} ms   "
+          f"({len(ms)} runs)")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tokens", type=int, default=8, help="LLM tokens streamed before cancelling")
+    parser.add_argument("--steps", type=int, default=3, help="SD steps run before cancelling")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--skip-llm", action="store_true")
+    parser.add_argument("--skip-sd", action="store_true")
+    args = parser.parse_args()
+    if not args.skip_llm:
+        bench_llm(args)
+    if not args.skip_sd:
+        bench_sd(args)
+
+
+if __name__ == "__main__":
+    main()
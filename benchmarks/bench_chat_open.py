@@ -0,0 +1,67 @@
+# Time-to-first-paint when opening a chat of 100 / 10k / 100k messages:
+# the old render-everything path vs. the windowed open_chat.
+#
+#   python benchmarks/bench_chat_open.py [--sizes 100 10000 100000]
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PySide6.QtWidgets import QApplication
+
+import main
+
+
+def legacy_open_chat(window, chat_id):
+    window.ui.plainText.clear()
+    for content, sender in window.db.get_messages(chat_id):
+        prefix = "You" if sender == 'user' else "AI"
+        window.append_message(prefix, window.render_message_content(content))
+
+
+def time_to_paint(app, window, fn):
+    t0 = time.perf_counter()
+    fn()
+    window.ui.plainText.viewport().repaint()
+    app.processEvents()
+    return time.perf_counter() - t0
+
+
+def main_():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 10_000, 100_000])
+    parser.add_argument("--legacy-limit", type=int, default=10_000,
+                        help="skip the legacy path above this size (it takes minutes)")
+    args = parser.parse_args()
+
+    app = QApplication(sys.argv)
+    with tempfile.TemporaryDirectory() as tmp:
+        # Nothing is written next to the app's own database and uploads
+        os.environ["FAMOUSNSFW_DATABASE__PATH"] = os.path.join(tmp, "bench.db")
+        os.environ["FAMOUSNSFW_SD__CACHE_DIR"] = os.path.join(tmp, "cache")
+        # Keep the benchmark about rendering, not about loading models
+        window = main.MainWindow(load_models=False)
+        window.show()
+        app.processEvents()
+
+        for size in args.sizes:
+            chat_id = window.db.add_chat(f"{size} messages")
+            window.db.add_messages(
+                (chat_id, f"message {i} " + "lorem ipsum " * 8, "user" if i % 2 else "ai")
+                for i in range(size))
+
+            windowed = time_to_paint(app, window, lambda: window.open_chat(chat_id, "bench"))
+            line = f"{size:>7} messages  windowed: {windowed * 1000:9.1f} ms"
+            if size <= args.legacy_limit:
+                legacy = time_to_paint(app, window, lambda: legacy_open_chat(window, chat_id))
+                line += f"   full render: {legacy * 1000:9.1f} ms"
+            print(line)
+
+        window.db.close()
+
+
+if __name__ == "__main__":
+    main_()
@@ -0,0 +1,98 @@
+# Insert/read throughput of DatabaseManager against the old
+# connect-per-call access pattern, on a database seeded with 100k messages.
+#
+#   python benchmarks/bench_database.py [--messages 100000]
+import os
+import sys
+import time
+import sqlite3
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import DatabaseManager
+
+
+def legacy_add_message(db_name, chat_id, content, sender):
+    with sqlite3.connect(db_name) as conn:
+        conn.execute(
+            "INSERT INTO messages (chat_id, content, sender) VALUES (?, ?, ?)",
+            (chat_id, content, sender))
+        conn.commit()
+
+
+def legacy_get_messages(db_name, chat_id):
+    with sqlite3.connect(db_name) as conn:
+        return conn.execute(
+            "SELECT content, sender FROM messages WHERE chat_id = ? ORDER BY created_at",
+            (chat_id,)).fetchall()
+
+
+def seed(db, messages, chats):
+    chat_ids = [db.add_chat(f"Chat {i}") for i in range(chats)]
+    rows = ((chat_ids[i % chats], f"seed message {i}", "user" if i % 2 else "ai")
+            for i in range(messages))
+    db.add_messages(rows)
+    return chat_ids
+
+
+def rate(n, seconds):
+    return f"{n / seconds:10.0f} ops/s  ({seconds * 1000:8.1f} ms total)"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=100_000)
+    parser.add_argument("--chats", type=int, default=200)
+    parser.add_argument("--inserts", type=int, default=2000)
+    parser.add_argument("--reads", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_name = os.path.join(tmp, "bench.db")
+        db = DatabaseManager(db_name)
+        t0 = time.perf_counter()
+        chat_ids = seed(db, args.messages, args.chats)
+        print(f"seeded {args.messages} messages in {time.perf_counter() - t0:.2f}s")
+        chat_id = chat_ids[0]
+        db.close()
+
+        # "Before": rollback journal, a fresh connection and fsync per call
+        with sqlite3.connect(db_name) as conn:
+            conn.execute("PRAGMA journal_mode=DELETE")
+
+        t0 = time.perf_counter()
+        for i in range(args.inserts):
+            legacy_add_message(db_name, chat_id, f"legacy {i}", "user")
+        print("insert  connect-per-call:", rate(args.inserts, time.perf_counter() - t0))
+
+        t0 = time.perf_counter()
+        for i in range(args.reads):
+            legacy_get_messages(db_name, chat_ids[i % len(chat_ids)])
+        print("read    connect-per-call:", rate(args.reads, time.perf_counter() - t0))
+
+        # "After": persistent per-thread connection in WAL mode
+        db = DatabaseManager(db_name)
+
+        t0 = time.perf_counter()
+        for i in range(args.inserts):
+            db.add_message(chat_id, f"pooled {i}", "user")
+        print("insert  pooled + WAL:    ", rate(args.inserts, time.perf_counter() - t0))
+
+        t0 = time.perf_counter()
+        with db.batch():
+            for i in range(args.inserts):
+                db.add_message(chat_id, f"batched {i}", "user")
+        print("insert  batched:         ", rate(args.inserts, time.perf_counter() - t0))
+
+        t0 = time.perf_counter()
+        for i in range(args.reads):
+            db.get_messages(chat_ids[i % len(chat_ids)])
+        print("read    pooled + WAL:    ", rate(args.reads, time.perf_counter() - t0))
+
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+# Time-to-first-token on turn 1 vs turn N of a conversation, with the
+# chat's KV cache reused (LocalLLM.chat) and with the cache reset before
+# every turn (the full transcript is re-evaluated).
+#
+#   python benchmarks/bench_llm_session.py [--turns 20] [--max-tokens 32]
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from workers.local_llm import LocalLLM
+
+QUESTIONS = [
+    "Tell me something about the history of Lisbon.",
+    "Why did the earthquake of 1755 matter so much?",
+    "How was the city rebuilt afterwards?",
+    "What is the Pombaline style?",
+    "Which neighbourhoods still show it today?",
+]
+
+
+def first_token(llm, chat_id, history, max_tokens):
+    t0 = time.perf_counter()
+    stream = llm.chat(chat_id, history, stream=True, max_tokens=max_tokens)
+    ttft = None
+    chunks = []
+    for chunk in stream:
+        if ttft is None:
+            ttft = time.perf_counter() - t0
+        chunks.append(chunk)
+    return ttft, "".join(chunks)
+
+
+def run(llm, turns, max_tokens, reuse):
+    history = []
+    results = []
+    for turn in range(1, turns + 1):
+        history.append((QUESTIONS[(turn - 1) % len(QUESTIONS)], "user"))
+        if not reuse:
+            llm.forget(1)
+        ttft, answer = first_token(llm, 1, history, max_tokens)
+        history.append((answer, "ai"))
+        results.append(ttft)
+    llm.forget(1)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument("--max-tokens", type=int, default=32)
+    args = parser.parse_args()
+
+    llm = LocalLLM()
+    cold = run(llm, args.turns, args.max_tokens, reuse=False)
+    warm = run(llm, args.turns, args.max_tokens, reuse=True)
+    for turn in (1, args.turns):
+        print(f"turn {turn:>2}  TTFT re-evaluate: {cold[turn - 1] * 1000:8.0f} ms"
+              f"   KV reuse: {warm[turn - 1] * 1000:8.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+# Text encoder time saved by the prompt embedding cache in LocalSD for
+# iterative re-generation: the same prompt with new seeds, then small
+# edits to it. Compares the pipeline's own encode (prompt + empty
+# negative prompt every call) with the cached path.
+#
+#   python benchmarks/bench_prompt_embeddings.py [--rounds 20] [--steps 4]
+import os
+import sys
+import time
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import torch
+
+from workers.local_sd import LocalSD
+
+PROMPTS = [
+    "a lighthouse on a cliff at sunset, oil painting",
+    "a lighthouse on a cliff at sunset, watercolor",
+    "a lighthouse on a cliff at night, oil painting",
+]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--steps", type=int, default=4,
+                        help="denoising steps per image (only the encoder is compared)")
+    parser.add_argument("--profile", default="fast")
+    args = parser.parse_args()
+
+    sd = LocalSD(profile=args.profile)
+    prompts = [PROMPTS[i % len(PROMPTS)] for i in range(args.rounds)]
+
+    # What every sd_pipe(prompt) call used to spend in the text encoder
+    with torch.inference_mode():
+        t0 = time.perf_counter()
+        for prompt in prompts:
+            sd.pipe.encode_prompt(prompt, sd.device, 1, True, negative_prompt=None)
+        uncached = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        for prompt in prompts:
+            sd.embedding_params([prompt])
+        cached = time.perf_counter() - t0
+    print(f"{args.rounds} encodes  uncached: {uncached:6.2f} s   cached: {cached:6.3f} s")
+
+    # End to end: the stats include the embeddings used by the images
+    for seed, prompt in enumerate(prompts[:5]):
+        sd.generate(prompt, num_inference_steps=args.steps,
+                    generator=torch.Generator("cpu").manual_seed(seed))
+    stats = sd.embedding_stats()
+    print(f"hits {stats['hits']}  misses {stats['misses']}  hit rate {stats['hit_rate']:.0%}  "
+          f"encoder time {stats['encode_seconds']:.2f} s  saved ~{stats['saved_seconds_estimate']:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+# Semantic retrieval latency (workers/retrieval.py): top-k cosine search
+# over memory-mapped indexes of 100k and 1M random unit vectors, one query
+# and a batch of queries at a time, cold (first search after opening) and
+# warm. With --model, also the embedding throughput of the real GGUF
+# embedding model, which adds to every query.
+#
+#   python benchmarks/bench_retrieval.py [--sizes 100000 1000000] [--dim 384] [--model]
+import os
+import sys
+import time
+import argparse
+import tempfile
+import statistics
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+import numpy as np
+
+from settings import load_settings
+from workers.retrieval import VectorIndex
+
+
+def unit_vectors(rng, count, dim):
+    vectors = rng.standard_normal((count, dim), dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def build(path, rng, count, dim, chunk=100_000):
+    index = VectorIndex(path, dim, "bench")
+    index.clear()
+    for start in range(0, count, chunk):
+        n = min(chunk, count - start)
+        index.add(np.arange(start + 1, start + n + 1), unit_vectors(rng, n, dim), start + n)
+    return index
+
+
+def bench_search(args, rng, tmp):
+    for size in args.sizes:
+        path = os.path.join(tmp, f"index-{size}")
+        t0 = time.perf_counter()
+        build(path, rng, size, args.dim)
+        print(f"{size} vectors: built in {time.perf_counter() - t0:.1f} s, "
+              f"{os.path.getsize(path + '.f32') / 2**20:.0f} MB")
+        for batch in args.batches:
+            index = VectorIndex(path, args.dim, "bench")  # fresh memory map
+            queries = unit_vectors(rng, batch, args.dim)
+            t0 = time.perf_counter()
+            index.search(queries, args.k)
+            cold = (time.perf_counter() - t0) * 1000
+            times = []
+            for _ in range(args.repeat):
+                queries = unit_vectors(rng, batch, args.dim)
+                t0 = time.perf_counter()
+                index.search(queries, args.k)
+                times.append((time.perf_counter() - t0) * 1000)
+            print(f"    batch {batch:3d}: first {cold:8.1f} ms   median {statistics.median(times):8.1f} ms   "
+                  f"max {max(times):8.1f} ms   ({statistics.median(times) / batch:.1f} ms per query)")
+
+
+def bench_model(args):
+    from workers.retrieval import Embedder
+    settings = load_settings()["retrieval"]
+    embedder = Embedder(settings)
+    texts = [f"message number {i} about the lighthouse keeper and his cat" for i in range(256)]
+    embedder.embed(texts[:1])  # warm-up
+    t0 = time.perf_counter()
+    for start in range(0, len(texts), settings["batch_size"]):
+        embedder.embed(texts[start:start + settings["batch_size"]])
+    total = time.perf_counter() - t0
+    times = []
+    for text in texts[:args.repeat]:
+        t0 = time.perf_counter()
+        embedder.embed([text])
+        times.append((time.perf_counter() - t0) * 1000)
+    print(f"embedding ({embedder.dim} dims): {len(texts) / total:.0f} messages/s indexing, "
+          f"query median {statistics.median(times):.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--batches", type=int, nargs="+", default=[1, 8])
+    parser.add_argument("--dim", type=int, default=384)
+    # context_for over-fetches: 2 * top_k plus the ids already in the prompt
+    parser.add_argument("--k", type=int, default=2 * load_settings()["retrieval"]["top_k"] + 40)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--model", action="store_true", help="also time the embedding model from settings")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(1)
+    with tempfile.TemporaryDirectory() as tmp:
+        bench_search(args, rng, tmp)
+    if args.model:
+        bench_model(args)
+
+
+if __name__ == "__main__":
+    main()
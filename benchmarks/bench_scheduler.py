@@ -0,0 +1,53 @@
+# Inference scheduler under a mixed load (workers/scheduler.py): a burst
+# of image batches, voice sessions and chat replies is submitted at once
+# with stand-in tasks of the given durations, and the queue wait per
+# priority is reported from InferenceScheduler.stats(). Also prints the
+# CPU thread budget split from settings.
+#
+#   python benchmarks/bench_scheduler.py [--workers 3] [--images 8] [--voice 4] [--chats 8]
+import os
+import sys
+import time
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from settings import load_settings, thread_budget
+from workers.scheduler import InferenceScheduler, CHAT, VOICE, IMAGE
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=load_settings()["scheduler"]["workers"])
+    parser.add_argument("--images", type=int, default=8)
+    parser.add_argument("--voice", type=int, default=4)
+    parser.add_argument("--chats", type=int, default=8)
+    parser.add_argument("--image-seconds", type=float, default=0.5)
+    parser.add_argument("--voice-seconds", type=float, default=0.05)
+    parser.add_argument("--chat-seconds", type=float, default=0.2)
+    args = parser.parse_args()
+
+    budget = thread_budget()
+    print("thread budget: " + ", ".join(f"{name} {n}" for name, n in budget.items()))
+
+    scheduler = InferenceScheduler(args.workers)
+    scheduler.start()
+    t0 = time.perf_counter()
+    # Images first, as if a batch of prompts was queued just before chatting
+    tasks = [scheduler.submit(IMAGE, time.sleep, args.image_seconds) for _ in range(args.images)]
+    tasks += [scheduler.submit(VOICE, time.sleep, args.voice_seconds) for _ in range(args.voice)]
+    tasks += [scheduler.submit(CHAT, time.sleep, args.chat_seconds) for _ in range(args.chats)]
+    for task in tasks:
+        task.result()
+    total = time.perf_counter() - t0
+    scheduler.shutdown()
+
+    print(f"{len(tasks)} tasks on {args.workers} workers in {total:.2f} s")
+    for name, s in scheduler.stats().items():
+        print(f"{name:>6}: {s['completed']:3d} done   wait mean {s['wait_mean'] * 1000:7.1f} ms   "
+              f"p95 {s['wait_p95'] * 1000:7.1f} ms   max {s['wait_max'] * 1000:7.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+# Stable Diffusion load time and peak RSS: the original .ckpt through
+# from_single_file vs. the converted diffusers/safetensors copy
+# (workers/local_sd.py). Each load runs in its own process; the converted
+# copy is created first if it does not exist yet.
+#
+#   python benchmarks/bench_sd_load.py [--dtypes float32 float16] [--repeat 2]
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def peak_rss_mb():
+    try:
+        import resource
+        # KiB on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    except ImportError:
+        import psutil
+        return psutil.Process().memory_info().peak_wset / 2**20
+
+
+def child(fmt, dtype_name):
+    import torch
+    from diffusers import StableDiffusionPipeline
+    from settings import load_settings
+    from workers.local_sd import converted_path
+
+    settings = load_settings()["sd"]
+    t0 = time.perf_counter()
+    if fmt == "ckpt":
+        StableDiffusionPipeline.from_single_file(settings["model_path"], torch_dtype=torch.float32)
+    else:
+        StableDiffusionPipeline.from_pretrained(
+            converted_path(settings, dtype_name), torch_dtype=torch.float32, use_safetensors=True)
+    print(json.dumps({"load": time.perf_counter() - t0, "peak_rss_mb": peak_rss_mb()}))
+
+
+def run_child(fmt, dtype_name):
+    proc = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child", fmt, "--dtypes", dtype_name],
+        cwd=ROOT, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr[-2000:])
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dtypes", nargs="+", default=["float32"],
+                        help="storage dtypes of the converted copy to compare")
+    parser.add_argument("--repeat", type=int, default=2,
+                        help="loads per format (later ones run with a warm page cache)")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child, args.dtypes[0])
+        return
+
+    from settings import load_settings
+    from workers.local_sd import convert_checkpoint, is_converted
+    settings = load_settings()["sd"]
+    for dtype_name in args.dtypes:
+        if not is_converted(settings, dtype_name):
+            t0 = time.perf_counter()
+            convert_checkpoint(settings, dtype_name)
+            print(f"converted to {dtype_name} in {time.perf_counter() - t0:.1f} s (one-time)")
+
+    formats = [("ckpt", "float32")] + [("converted", d) for d in args.dtypes]
+    for fmt, dtype_name in formats:
+        for i in range(args.repeat):
+            r = run_child(fmt, dtype_name)
+            label = "ckpt" if fmt == "ckpt" else f"safetensors ({dtype_name})"
+            print(f"{label:>24} load #{i + 1}: {r['load']:6.1f} s   peak RSS {r['peak_rss_mb']:7.0f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+# Wall time and peak RSS of each Stable Diffusion performance profile
+# (workers/local_sd.py). Every profile runs in its own process so peak RSS
+# is not inherited from the previous one. The first image includes
+# warm-up (and torch.compile for "fast"), so a second one is timed too.
+#
+#   python benchmarks/bench_sd_profiles.py [--profiles quality balanced fast] [--size 512]
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+PROMPT = "a lighthouse on a cliff at sunset, oil painting"
+
+
+def peak_rss_mb():
+    try:
+        import resource
+        # KiB on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    except ImportError:
+        import psutil
+        return psutil.Process().memory_info().peak_wset / 2**20
+
+
+def child(profile, size, seed):
+    import torch
+    from workers.local_sd import LocalSD
+
+    t0 = time.perf_counter()
+    sd = LocalSD(profile=profile)
+    load = time.perf_counter() - t0
+    times = []
+    for _ in range(2):
+        generator = torch.Generator("cpu").manual_seed(seed)
+        t0 = time.perf_counter()
+        sd.generate(PROMPT, width=size, height=size, generator=generator)
+        times.append(time.perf_counter() - t0)
+    print(json.dumps({
+        "profile": profile,
+        "options": sd.options,
+        "threads": sd.n_threads,
+        "load": load,
+        "first": times[0],
+        "second": times[1],
+        "peak_rss_mb": peak_rss_mb(),
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--profiles", nargs="+", default=["quality", "balanced", "fast"])
+    parser.add_argument("--size", type=int, default=512)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child, args.size, args.seed)
+        return
+
+    for profile in args.profiles:
+        proc = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--child", profile,
+             "--size", str(args.size), "--seed", str(args.seed)],
+            cwd=ROOT, capture_output=True, text=True)
+        if proc.returncode != 0:
+            print(f"{profile:>8}: failed\n{proc.stderr[-2000:]}")
+            continue
+        r = json.loads(proc.stdout.strip().splitlines()[-1])
+        o = r["options"]
+        print(f"{profile:>8}: load {r['load']:6.1f} s  first image {r['first']:7.1f} s  "
+              f"second {r['second']:7.1f} s  peak RSS {r['peak_rss_mb']:7.0f} MB  "
+              f"({o['steps']} steps, {o['scheduler'] or 'default'} scheduler, "
+              f"{'bf16' if o['bfloat16'] else 'fp32'}, compile={o['compile']}, threads={r['threads']})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+# Full-text search latency (DatabaseManager.search_messages, FTS5) on a
+# seeded history of 1M messages with a Zipf-distributed vocabulary, so
+# there are both very common and rare words; as in real text the common
+# words are the short ones. Each query kind is run --repeat times; the
+# target is a median under 50 ms. A LIKE '%...%' scan is timed once for
+# comparison.
+#
+#   python benchmarks/bench_search.py [--messages 1000000] [--db path/to/keep.db]
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import DatabaseManager
+
+TARGET_MS = 50
+
+
+def make_vocabulary(rng, size):
+    # Most frequent first: shorter words get the higher ranks
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(letters) for _ in range(rng.randint(3, 9))))
+    return sorted(words, key=lambda w: (len(w), rng.random()))
+
+
+def seed(db, rng, vocabulary, messages, chats, words_per_message=12):
+    # Word i is drawn with probability ~ 1/(i+1)
+    cum_weights = []
+    total = 0.0
+    for rank in range(len(vocabulary)):
+        total += 1.0 / (rank + 1)
+        cum_weights.append(total)
+    chat_ids = [db.add_chat(f"Chat {i}") for i in range(chats)]
+    batch = 50_000
+    for start in range(0, messages, batch):
+        count = min(batch, messages - start)
+        words = rng.choices(vocabulary, cum_weights=cum_weights, k=count * words_per_message)
+        db.add_messages(
+            (chat_ids[(start + i) % chats],
+             " ".join(words[i * words_per_message:(i + 1) * words_per_message]),
+             "user" if i % 2 else "ai")
+            for i in range(count))
+    return chat_ids
+
+
+def timed(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        times.append((time.perf_counter() - t0) * 1000)
+    return times, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=1_000_000)
+    parser.add_argument("--chats", type=int, default=2000)
+    parser.add_argument("--vocabulary", type=int, default=50_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--db", help="reuse/keep the seeded database at this path")
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    vocabulary = make_vocabulary(rng, args.vocabulary)
+    with tempfile.TemporaryDirectory() as tmp:
+        db_name = args.db or os.path.join(tmp, "search.db")
+        fresh = not os.path.exists(db_name)
+        db = DatabaseManager(db_name)
+        if fresh:
+            t0 = time.perf_counter()
+            seed(db, rng, vocabulary, args.messages, args.chats)
+            print(f"seeded {args.messages} messages (indexed by the triggers) "
+                  f"in {time.perf_counter() - t0:.1f} s")
+            # Reopen: queries should not profit from the seeding connection's cache
+            db.close()
+            db = DatabaseManager(db_name)
+
+        common, mid, rare = vocabulary[0], vocabulary[100], vocabulary[-1]
+        # Most frequent word longer than the indexed prefixes (2, 3)
+        long_common = next(word for word in vocabulary if len(word) >= 6)
+        queries = {
+            f"common word ({common})": common,
+            f"common long word ({long_common})": long_common,
+            f"mid word ({mid})": mid,
+            f"rare word ({rare})": rare,
+            f"two words ({mid} {rare})": f"{mid} {rare}",
+            f"typing, 2 letters ({mid[:2]})": mid[:2],
+            f"typing, 3 letters ({mid[:3]})": mid[:3],
+            f"typing, whole word ({mid})": mid,
+            "no match (zzzzzzzzzz)": "zzzzzzzzzz",
+        }
+        worst = 0.0
+        for label, query in queries.items():
+            times, rows = timed(lambda: db.search_messages(query, args.limit), args.repeat)
+            median = statistics.median(times)
+            worst = max(worst, median)
+            print(f"{label:>36}: median {median:7.2f} ms   max {max(times):7.2f} ms   "
+                  f"{len(rows)} rows")
+
+        # Page 5 of the results for a mid-frequency word
+        times, _ = timed(lambda: db.search_messages(mid, args.limit, 4 * args.limit), args.repeat)
+        print(f"{'offset paging (page 5)':>36}: median {statistics.median(times):7.2f} ms")
+
+        t0 = time.perf_counter()
+        db._query("SELECT id FROM messages WHERE content LIKE ? LIMIT ?", (f"%{rare}%", args.limit))
+        print(f"{'LIKE scan, for comparison':>36}: {(time.perf_counter() - t0) * 1000:7.2f} ms")
+        db.close()
+
+    print(("OK" if worst < TARGET_MS else "SLOW") + f": worst median {worst:.2f} ms (target {TARGET_MS} ms)")
+
+
+if __name__ == "__main__":
+    main()
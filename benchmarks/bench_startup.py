@@ -0,0 +1,83 @@
+# Startup timeline with the model registry: time until the window is shown
+# and usable (time-to-interactive), until the LLM is ready, until its first
+# streamed token, and until Stable Diffusion is ready (depends on
+# sd.preload). --sequential measures the old "load both, then enable the
+# window" path for comparison.
+#
+#   python benchmarks/bench_startup.py [--preload background|parallel|lazy] [--sequential]
+import os
+import sys
+import time
+import argparse
+
+T0 = time.perf_counter()
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+
+def elapsed():
+    return time.perf_counter() - T0
+
+
+def first_token(llm):
+    # force: a cached replay would never reach llama.cpp
+    for _ in llm.ask("Hello!", stream=True, force=True, max_tokens=1):
+        return elapsed()
+    return elapsed()
+
+
+def sequential():
+    import main
+    llm = main.load_llm()
+    main.load_sd()
+    interactive = elapsed()
+    print(f"sequential load: interactive after {interactive:6.2f} s, "
+          f"first token at {first_token(llm):6.2f} s")
+
+
+def registry(preload, timeout):
+    os.environ["FAMOUSNSFW_SD__PRELOAD"] = preload
+    from PySide6.QtWidgets import QApplication
+    import main
+
+    app = QApplication(sys.argv)
+    window = main.MainWindow()
+    window.show()
+    app.processEvents()
+    marks = {"interactive": elapsed()}
+
+    # Pump the event loop so ready signals reach the window
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        app.processEvents()
+        if "llm" not in marks and window.local_llm is not None:
+            marks["llm"] = elapsed()
+            marks["first token"] = first_token(window.local_llm)
+        if "sd" not in marks and window.local_sd is not None:
+            marks["sd"] = elapsed()
+        states = {window.models.state(name) for name in ("llm", "sd")}
+        if "loading" not in states and ("llm" in marks or "failed" in states):
+            break
+        time.sleep(0.01)
+
+    print(f"preload={preload}: " + "   ".join(f"{name} {t:6.2f} s" for name, t in marks.items()))
+    print("   states: " + window.model_status_text())
+    window.close()
+
+
+def main_():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--preload", default="background", choices=["background", "parallel", "lazy"])
+    parser.add_argument("--sequential", action="store_true")
+    parser.add_argument("--timeout", type=float, default=600)
+    args = parser.parse_args()
+    if args.sequential:
+        sequential()
+    else:
+        registry(args.preload, args.timeout)
+
+
+if __name__ == "__main__":
+    main_()
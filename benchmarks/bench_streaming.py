@@ -0,0 +1,72 @@
+# UI-thread time per generated token while streaming a response into the
+# chat view: the old undo + full re-render per token vs. delta buffering
+# painted at STREAM_FPS.
+#
+#   python benchmarks/bench_streaming.py [--tokens 128 2048] [--token-rate 40]
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PySide6.QtWidgets import QApplication
+
+import main
+
+TOKEN = " lorem"
+
+
+def legacy_stream(window, tokens):
+    window.append_message("AI", main.THINKING_PLACEHOLDER, italic=True)
+    output = ""
+    t0 = time.perf_counter()
+    for _ in range(tokens):
+        output += TOKEN
+        window.ui.plainText.undo()
+        window.append_message("AI", output)
+    return time.perf_counter() - t0
+
+
+def batched_stream(window, tokens, token_rate):
+    # One flush per frame: at token_rate tok/s that is every
+    # token_rate / STREAM_FPS tokens.
+    per_flush = max(1, round(token_rate / main.STREAM_FPS))
+    window.begin_live_message()
+    window.stream_timer.stop()  # flushes are driven manually below
+    t0 = time.perf_counter()
+    for i in range(tokens):
+        window.update_typing(TOKEN)
+        if (i + 1) % per_flush == 0:
+            window.flush_stream()
+    window.end_live_message(TOKEN * tokens)
+    return time.perf_counter() - t0
+
+
+def main_():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tokens", type=int, nargs="+", default=[128, 2048])
+    parser.add_argument("--token-rate", type=float, default=40.0,
+                        help="simulated generation speed in tokens/s")
+    args = parser.parse_args()
+
+    app = QApplication(sys.argv)
+    window = main.MainWindow(load_models=False)
+    window.show()
+    app.processEvents()
+
+    for tokens in args.tokens:
+        window.ui.plainText.clear()
+        legacy = legacy_stream(window, tokens)
+        app.processEvents()
+        window.ui.plainText.clear()
+        batched = batched_stream(window, tokens, args.token_rate)
+        app.processEvents()
+        print(f"{tokens:>5} tokens  undo+re-render: {legacy / tokens * 1e6:9.1f} us/token"
+              f"   batched deltas: {batched / tokens * 1e6:9.1f} us/token")
+
+    window.db.close()
+
+
+if __name__ == "__main__":
+    main_()
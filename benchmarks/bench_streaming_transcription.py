@@ -0,0 +1,98 @@
+# CPU seconds per second of audio for 10 s / 60 s / 300 s dictations:
+# the old "rewrite a WAV of everything and re-transcribe every 10 chunks"
+# loop vs. the in-memory StreamingTranscriber. Run with the whisper venv.
+#
+#   python benchmarks/bench_streaming_transcription.py --wav speech.wav [--durations 10 60 300]
+import os
+import sys
+import time
+import wave
+import argparse
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "Whisper_worker"))
+
+import numpy as np
+from faster_whisper import WhisperModel
+
+from streaming import StreamingTranscriber, SAMPLE_RATE
+
+CHUNK_BYTES = 2048  # what the old server read per recv()
+
+
+def load_speech(path, seconds):
+    with wave.open(path, "rb") as wf:
+        assert wf.getframerate() == SAMPLE_RATE and wf.getsampwidth() == 2 and wf.getnchannels() == 1, \
+            "expected 16 kHz mono int16"
+        pcm = np.frombuffer(wf.readframes(wf.getnframes()), dtype=np.int16)
+    # Loop the recording to the requested length
+    reps = int(np.ceil(seconds * SAMPLE_RATE / len(pcm)))
+    return np.tile(pcm, reps)[:seconds * SAMPLE_RATE].tobytes()
+
+
+def chunks(pcm):
+    for i in range(0, len(pcm), CHUNK_BYTES):
+        yield pcm[i:i + CHUNK_BYTES]
+
+
+def legacy(model, pcm):
+    frames = []
+
+    def transcribe_all():
+        with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as tmp:
+            with wave.open(tmp.name, "wb") as wf:
+                wf.setnchannels(1)
+                wf.setsampwidth(2)
+                wf.setframerate(SAMPLE_RATE)
+                wf.writeframes(b"".join(frames))
+        try:
+            segments, _ = model.transcribe(tmp.name)
+            return " ".join(s.text for s in segments)
+        finally:
+            os.remove(tmp.name)
+
+    for chunk in chunks(pcm):
+        frames.append(chunk)
+        if len(frames) % 10 == 0:
+            transcribe_all()
+    return transcribe_all()
+
+
+def streaming(model, pcm):
+    transcriber = StreamingTranscriber(model)
+    for chunk in chunks(pcm):
+        transcriber.feed(chunk)
+        if transcriber.due():
+            transcriber.process()
+    return transcriber.process(final=True)["text"]
+
+
+def measure(fn, model, pcm):
+    cpu0, wall0 = time.process_time(), time.perf_counter()
+    fn(model, pcm)
+    return time.process_time() - cpu0, time.perf_counter() - wall0
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--wav", required=True)
+    parser.add_argument("--durations", type=int, nargs="+", default=[10, 60, 300])
+    parser.add_argument("--legacy-limit", type=int, default=60,
+                        help="skip the quadratic legacy loop above this many seconds")
+    parser.add_argument("--model", default=os.path.join(ROOT, "models", "whisper-cpu"))
+    args = parser.parse_args()
+
+    model = WhisperModel(args.model, device="cpu", compute_type="int8")
+    for seconds in args.durations:
+        pcm = load_speech(args.wav, seconds)
+        cpu, wall = measure(streaming, model, pcm)
+        line = f"{seconds:>4} s  streaming: {cpu / seconds:6.3f} CPU s/audio s ({wall:6.1f} s wall)"
+        if seconds <= args.legacy_limit:
+            cpu, wall = measure(legacy, model, pcm)
+            line += f"   re-transcribe all: {cpu / seconds:6.3f} CPU s/audio s ({wall:6.1f} s wall)"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
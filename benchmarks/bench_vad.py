@@ -0,0 +1,95 @@
+# Transcription CPU time with and without the voice activity gate for
+# recordings that are 0/25/50/75 % silence (speech padded with low-level
+# noise), plus the speech ratio the gate measured and the final text so
+# the two can be compared. Run with the whisper venv.
+#
+#   python benchmarks/bench_vad.py --wav speech.wav [--seconds 30] [--vad energy|silero]
+import os
+import sys
+import time
+import wave
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "Whisper_worker"))
+
+import numpy as np
+from faster_whisper import WhisperModel
+
+from streaming import StreamingTranscriber, SAMPLE_RATE
+from vad import VoiceActivityGate
+
+CHUNK_SAMPLES = 1600  # 100 ms, what the capture thread sends
+NOISE_LEVEL = 0.002   # roughly -54 dBFS room noise
+
+
+def load_speech(path):
+    with wave.open(path, "rb") as wf:
+        assert wf.getframerate() == SAMPLE_RATE and wf.getsampwidth() == 2 and wf.getnchannels() == 1, \
+            "expected 16 kHz mono int16"
+        pcm = np.frombuffer(wf.readframes(wf.getnframes()), dtype=np.int16)
+    return pcm.astype(np.float32) / 32768.0
+
+
+def fixture(speech, seconds, silence_ratio, rng):
+    # Speech and silence alternate in 2 s pieces, ending with speech
+    total = seconds * SAMPLE_RATE
+    silence_total = int(total * silence_ratio)
+    speech_total = total - silence_total
+    speech = np.tile(speech, int(np.ceil(speech_total / len(speech))))[:speech_total]
+    piece = 2 * SAMPLE_RATE
+    parts = []
+    spoken = 0
+    silent = 0
+    while spoken < speech_total or silent < silence_total:
+        if silent < silence_total:
+            n = min(piece, silence_total - silent)
+            parts.append(rng.normal(0, NOISE_LEVEL, n).astype(np.float32))
+            silent += n
+        if spoken < speech_total:
+            n = min(piece, speech_total - spoken)
+            parts.append(speech[spoken:spoken + n] + rng.normal(0, NOISE_LEVEL, n).astype(np.float32))
+            spoken += n
+    return np.concatenate(parts)
+
+
+def run(model, audio, vad):
+    gate = VoiceActivityGate(vad) if vad != "off" else None
+    transcriber = StreamingTranscriber(model)
+    cpu0 = time.process_time()
+    for i in range(0, len(audio), CHUNK_SAMPLES):
+        chunk = audio[i:i + CHUNK_SAMPLES]
+        paused = False
+        if gate is not None:
+            chunk, paused = gate.process(chunk)
+        transcriber.feed_samples(chunk)
+        if paused or transcriber.due():
+            transcriber.process(commit_all=paused)
+    text = transcriber.process(final=True)["text"]
+    return time.process_time() - cpu0, text, gate.speech_ratio() if gate else 1.0
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--wav", required=True)
+    parser.add_argument("--seconds", type=int, default=30)
+    parser.add_argument("--vad", default="energy", choices=["energy", "silero"])
+    parser.add_argument("--model", default=os.path.join(ROOT, "models", "whisper-cpu"))
+    args = parser.parse_args()
+
+    model = WhisperModel(args.model, device="cpu", compute_type="int8")
+    speech = load_speech(args.wav)
+    rng = np.random.default_rng(0)
+    for ratio in (0.0, 0.25, 0.5, 0.75):
+        audio = fixture(speech, args.seconds, ratio, rng)
+        cpu_off, text_off, _ = run(model, audio, "off")
+        cpu_on, text_on, speech_ratio = run(model, audio, args.vad)
+        saved = 1 - cpu_on / cpu_off if cpu_off else 0.0
+        print(f"{ratio:4.0%} silence  no gate: {cpu_off:6.2f} CPU s   {args.vad}: {cpu_on:6.2f} CPU s"
+              f"  ({saved:5.1%} saved, speech ratio {speech_ratio:.2f})")
+        print(f"    no gate: {text_off}")
+        print(f"    {args.vad + ':':<8} {text_on}")
+
+
+if __name__ == "__main__":
+    main()
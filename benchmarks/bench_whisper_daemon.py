@@ -0,0 +1,75 @@
+# Cold vs warm latency of a short utterance through the whisper daemon:
+# cold = start the daemon (model load) + transcribe, warm = a new session
+# on the already running daemon.
+#
+#   python benchmarks/bench_whisper_daemon.py [--wav utterance.wav] [--python path/to/venv/python]
+import os
+import sys
+import time
+import wave
+import argparse
+import threading
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from workers.whisper_client import WhisperClient
+
+
+def load_pcm(path, seconds):
+    if path:
+        with wave.open(path, "rb") as wf:
+            assert wf.getframerate() == 16000 and wf.getsampwidth() == 2 and wf.getnchannels() == 1, \
+                "expected 16 kHz mono int16"
+            return wf.readframes(wf.getnframes())
+    # Silence is enough to time the pipeline when no recording is given
+    return b"\0\0" * 16000 * seconds
+
+
+def transcribe(client, pcm, chunk_bytes=2048):
+    done = threading.Event()
+    result = {}
+    session = {}
+
+    def on_text(session_id, text, final):
+        if final and session_id == session.get("id"):
+            result["text"] = text
+            done.set()
+
+    client.transcription.connect(on_text)
+    session["id"] = client.start_session(sample_rate=16000, format="s16le")
+    for i in range(0, len(pcm), chunk_bytes):
+        client.send_audio(session["id"], pcm[i:i + chunk_bytes])
+    t0 = time.perf_counter()
+    client.end_session(session["id"])
+    done.wait(120)
+    client.transcription.disconnect(on_text)
+    return time.perf_counter() - t0, result.get("text", "")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--wav")
+    parser.add_argument("--seconds", type=int, default=3)
+    parser.add_argument("--python", default=sys.executable)
+    parser.add_argument("--warm-runs", type=int, default=5)
+    args = parser.parse_args()
+
+    pcm = load_pcm(args.wav, args.seconds)
+    client = WhisperClient(python=args.python, script=os.path.join(ROOT, "Whisper_worker", "whisper_server.py"))
+
+    t0 = time.perf_counter()
+    if not client.ensure_server(timeout=120):
+        sys.exit("could not start the whisper daemon")
+    startup = time.perf_counter() - t0
+    final, text = transcribe(client, pcm)
+    print(f"cold: {(startup + final) * 1000:8.0f} ms  (daemon start + model load {startup * 1000:.0f} ms)  {text!r}")
+
+    warm = [transcribe(client, pcm)[0] for _ in range(args.warm_runs)]
+    print(f"warm: {min(warm) * 1000:8.0f} ms best, {sum(warm) / len(warm) * 1000:.0f} ms mean over {len(warm)} runs")
+    print("status:", client.ping())
+    client.close(shutdown_server=True)
+
+
+if __name__ == "__main__":
+    main()
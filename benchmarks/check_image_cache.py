@@ -0,0 +1,96 @@
+# Image cache regression check: fails (exit 1) unless a repeated image
+# request, submitted the way the UI does it (prompt and output path, no
+# seed), is served from the cache without another pipeline call, and two
+# identical requests queued together share one generated image. A
+# stand-in generator replaces Stable Diffusion.
+#
+#   python benchmarks/check_image_cache.py
+import os
+import sys
+import time
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PySide6.QtCore import QCoreApplication
+
+from database import DatabaseManager
+from workers.image_cache import ImageCache
+from workers.image_queue import ImageJobQueue
+
+
+class StandInImage:
+    def __init__(self, seed):
+        self.seed = seed
+
+    def save(self, path):
+        with open(path, "w") as f:
+            f.write(str(self.seed))
+
+
+class StandInSD:
+    # What ImageJobQueue uses of LocalSD
+    model_id = "stand-in"
+    profile = "fast"
+    options = {"scheduler": "euler"}
+
+    def __init__(self):
+        self.prompts = []
+
+    def generation_params(self, **params):
+        return dict({"num_inference_steps": 4, "guidance_scale": 7.5}, **params)
+
+    def generate_batch(self, prompts, seeds, on_step=None, cancel=None, **kwargs):
+        self.prompts += prompts
+        return [StandInImage(seed) for seed in seeds]
+
+
+def wait_for(queue, job_ids, timeout=10):
+    deadline = time.monotonic() + timeout
+    while any(queue.status(job_id)["status"] in ("queued", "running") for job_id in job_ids):
+        if time.monotonic() > deadline:
+            raise RuntimeError("image jobs did not finish")
+        time.sleep(0.01)
+
+
+def main():
+    app = QCoreApplication([])  # cache hits are announced from the event loop
+    failures = []
+    with tempfile.TemporaryDirectory() as tmp:
+        db = DatabaseManager(os.path.join(tmp, "check.db"))
+        cache = ImageCache(db, os.path.join(tmp, "cache"), 2**20)
+        queue = ImageJobQueue(db, cache)
+        sd = StandInSD()
+        queue.start()
+
+        # Two identical requests queued before the pipeline is ready
+        first = [queue.submit("a red fox", os.path.join(tmp, f"fox{i}.png")) for i in range(2)]
+        queue.set_generator(sd)
+        wait_for(queue, first)
+        if sd.prompts != ["a red fox"]:
+            failures.append(f"queued duplicates generated {len(sd.prompts)} times")
+
+        # The same request again later, as a second click in the UI would
+        served = []
+        queue.finished.connect(lambda job_id, path: served.append(job_id))
+        job_id = queue.submit("a red fox", os.path.join(tmp, "fox-again.png"))
+        app.processEvents()
+        if served != [job_id] or queue.status(job_id)["status"] != "done":
+            failures.append("repeated request was not served from the cache on submit")
+        if len(sd.prompts) != 1:
+            failures.append("repeated request ran the pipeline again")
+
+        stats = cache.stats()
+        print(f"pipeline calls for 'a red fox': {len(sd.prompts)}   "
+              f"cache hits {stats['hits']}   deduped {stats['deduped']}")
+        queue.stop(timeout=5)
+        db.close()
+
+    if failures:
+        print("FAILED:", "; ".join(failures))
+        sys.exit(1)
+    print("OK: repeated image requests are served from the cache")
+
+
+if __name__ == "__main__":
+    main()
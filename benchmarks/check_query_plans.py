@@ -0,0 +1,69 @@
+# Query-plan regression check: fails (exit 1) if any hot query in
+# database.HOT_QUERIES falls back to a full table SCAN, either on a fresh
+# database or on one created with the pre-migration schema. FTS5 lookups
+# show up as "SCAN ... VIRTUAL TABLE INDEX" and are fine.
+#
+#   python benchmarks/check_query_plans.py
+import os
+import sys
+import sqlite3
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import DatabaseManager, HOT_QUERIES, MIGRATIONS
+
+
+def check(db):
+    failures = []
+    for name, (sql, params) in HOT_QUERIES.items():
+        plan = db.explain(sql, params)
+        print(f"{name}:")
+        for line in plan:
+            print(f"    {line}")
+        if any(line.startswith("SCAN") and "VIRTUAL TABLE INDEX" not in line for line in plan):
+            failures.append(name)
+    return failures
+
+
+def make_legacy_db(path):
+    # Same layout as chat_app.db files written before schema_version existed
+    with sqlite3.connect(path) as conn:
+        for sql in MIGRATIONS[0][1]:
+            conn.execute(sql)
+        conn.execute("INSERT INTO chats (title) VALUES ('legacy')")
+        conn.execute("INSERT INTO messages (chat_id, content) VALUES (1, 'hello')")
+        # A short second chat: with a single row ANALYZE makes every scan
+        # look as cheap as a lookup
+        conn.execute("INSERT INTO chats (title) VALUES ('older')")
+        conn.executemany("INSERT INTO messages (chat_id, content) VALUES (2, ?)",
+                         [(f"message {i}",) for i in range(20)])
+
+
+def main():
+    failures = []
+    with tempfile.TemporaryDirectory() as tmp:
+        fresh = DatabaseManager(os.path.join(tmp, "fresh.db"))
+        print(f"== fresh database (schema v{fresh.schema_version()})")
+        failures += check(fresh)
+        fresh.close()
+
+        legacy_path = os.path.join(tmp, "legacy.db")
+        make_legacy_db(legacy_path)
+        legacy = DatabaseManager(legacy_path)
+        print(f"== upgraded legacy database (schema v{legacy.schema_version()})")
+        failures += check(legacy)
+        if legacy.get_messages(1) != [("hello", "user")]:
+            failures.append("legacy data lost during migration")
+        if [row[0] for row in legacy.search_messages("hel")] != [1]:
+            failures.append("legacy messages missing from the search index")
+        legacy.close()
+
+    if failures:
+        print("FAILED:", ", ".join(failures))
+        sys.exit(1)
+    print("OK: no full table scans on hot queries")
+
+
+if __name__ == "__main__":
+    main()
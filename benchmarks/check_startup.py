@@ -0,0 +1,42 @@
+# Startup regression check: fails (exit 1) if main.py takes longer than
+# --max-seconds to show its window, or if any heavy dependency (torch,
+# diffusers, llama_cpp, sounddevice, numpy, ...) is imported before the
+# window is shown. Those belong to features that import them on first use.
+# The probe runs on an empty database in a temporary directory.
+#
+#   python benchmarks/check_startup.py [--max-seconds 1.5]
+import os
+import sys
+import argparse
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from startup_profile import profile_startup, print_report
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--max-seconds", type=float, default=1.5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        report = profile_startup(os.path.join(ROOT, "main.py"), data_dir=tmp)
+    print_report(report, top=10)
+    failures = []
+    if report["window_shown"] is None:
+        failures.append("window was not shown")
+    elif report["window_shown"] > args.max_seconds:
+        failures.append(f"window shown after {report['window_shown']:.3f} s > {args.max_seconds} s")
+    if report["heavy"]:
+        failures.append("heavy modules imported at startup: " + ", ".join(report["heavy"]))
+
+    if failures:
+        print("FAILED:", "; ".join(failures))
+        sys.exit(1)
+    print("OK: startup within budget")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+# Loopback harness for the whisper socket protocol: replays WAV files
+# through WhisperClient -> daemon and reports, per file, time to first
+# partial, END -> FINAL latency, the peak un-ACKed audio (backpressure)
+# and the final text. Any sample rate / channel count the protocol
+# negotiates is sent as-is.
+#
+#   python benchmarks/loopback_whisper.py a.wav b.wav [--realtime] [--python whisper/venv/python]
+import os
+import sys
+import time
+import wave
+import argparse
+import threading
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from workers.whisper_client import WhisperClient
+
+CHUNK_SECONDS = 0.064  # same block size VoiceModal captures
+
+
+def replay(client, path, realtime):
+    with wave.open(path, "rb") as wf:
+        rate, channels, width = wf.getframerate(), wf.getnchannels(), wf.getsampwidth()
+        pcm = wf.readframes(wf.getnframes())
+    assert width == 2, "expected 16-bit PCM"
+    duration = len(pcm) / (rate * channels * width)
+
+    events = {}
+    done = threading.Event()
+    session = {}
+
+    def on_text(session_id, text, final):
+        if session_id != session.get("id"):
+            return
+        now = time.perf_counter()
+        events.setdefault("first_partial", now)
+        if final:
+            events["final"] = now
+            events["text"] = text
+            done.set()
+
+    client.transcription.connect(on_text)
+    session["id"] = client.start_session(sample_rate=rate, format="s16le", channels=channels)
+    chunk_bytes = int(rate * CHUNK_SECONDS) * channels * width
+    peak_in_flight = 0
+    start = time.perf_counter()
+    for i in range(0, len(pcm), chunk_bytes):
+        if realtime:
+            target = start + i / (rate * channels * width)
+            delay = target - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        client.send_audio(session["id"], pcm[i:i + chunk_bytes])
+        peak_in_flight = max(peak_in_flight, client.in_flight(session["id"]))
+    end_sent = time.perf_counter()
+    client.end_session(session["id"])
+    done.wait(300)
+    client.transcription.disconnect(on_text)
+
+    return {
+        "duration": duration,
+        "first_partial": events.get("first_partial", end_sent) - start,
+        "end_to_final": events.get("final", float("nan")) - end_sent,
+        "peak_in_flight": peak_in_flight / (rate * channels * width),
+        "text": events.get("text", ""),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("wavs", nargs="+")
+    parser.add_argument("--realtime", action="store_true", help="pace audio like a live microphone")
+    parser.add_argument("--python", default=sys.executable)
+    parser.add_argument("--port", type=int, default=8799)
+    args = parser.parse_args()
+
+    client = WhisperClient(port=args.port, python=args.python,
+                           script=os.path.join(ROOT, "Whisper_worker", "whisper_server.py"))
+    if not client.ensure_server(timeout=120):
+        sys.exit("could not start the whisper daemon")
+    try:
+        for path in args.wavs:
+            r = replay(client, path, args.realtime)
+            print(f"{os.path.basename(path)}: {r['duration']:.1f} s audio, "
+                  f"first partial {r['first_partial'] * 1000:.0f} ms, "
+                  f"END->FINAL {r['end_to_final'] * 1000:.0f} ms, "
+                  f"peak in flight {r['peak_in_flight']:.2f} s  {r['text']!r}")
+    finally:
+        client.close(shutdown_server=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,136 +1,568 @@
+import re
+import json
 import sqlite3
+import threading
+from contextlib import contextmanager
 from PySide6.QtCore import QObject, Signal
 
+# Statements are kept as module constants so sqlite3's per-connection
+# statement cache (cached_statements) hands back the prepared statement
+# instead of re-parsing the SQL on every call.
+SQL_ADD_CHAT = "INSERT INTO chats (title) VALUES (?)"
+SQL_RENAME_CHAT = "UPDATE chats SET title = ? WHERE id = ?"
+SQL_DELETE_CHAT = "UPDATE chats SET is_deleted = 1 WHERE id = ?"
+SQL_TOGGLE_FAVORITE = "UPDATE chats SET is_favorite = NOT is_favorite WHERE id = ?"
+SQL_GET_FAVORITE = "SELECT is_favorite FROM chats WHERE id = ?"
+SQL_GET_CHATS_FAVORITES = """
+    SELECT id, title FROM chats 
+    WHERE is_deleted = 0 AND is_favorite = 1 
+    ORDER BY created_at DESC
+"""
+SQL_GET_CHATS_REGULAR = """
+    SELECT id, title FROM chats 
+    WHERE is_deleted = 0 AND is_favorite = 0 
+    ORDER BY created_at DESC
+"""
+SQL_GET_CHATS_ALL = """
+    SELECT id, title FROM chats 
+    WHERE is_deleted = 0 
+    ORDER BY created_at DESC
+"""
+SQL_ADD_MESSAGE = "INSERT INTO messages (chat_id, content, sender) VALUES (?, ?, ?)"
+SQL_GET_MESSAGES = "SELECT content, sender FROM messages WHERE chat_id = ? ORDER BY created_at"
+# Keyset pagination: newest `limit` messages older than `before_id`
+SQL_GET_MESSAGES_PAGE = """
+    SELECT id, content, sender FROM messages
+    WHERE chat_id = ? AND id < ?
+    ORDER BY id DESC LIMIT ?
+"""
+# The other direction, for the window opened around a search hit
+SQL_GET_MESSAGES_NEWER = """
+    SELECT id, content, sender FROM messages
+    WHERE chat_id = ? AND id > ?
+    ORDER BY id LIMIT ?
+"""
+SQL_GET_MESSAGES_LATEST = """
+    SELECT id, content, sender FROM messages
+    WHERE chat_id = ?
+    ORDER BY id DESC LIMIT ?
+"""
+# Semantic retrieval (workers/retrieval.py): messages past the index's
+# high-water mark, and the hits of a search with their chat, skipping
+# deleted chats. The ids are passed as one JSON array.
+SQL_GET_MESSAGES_AFTER = "SELECT id, content FROM messages WHERE id > ? ORDER BY id LIMIT ?"
+SQL_GET_MESSAGES_BY_IDS = """
+    SELECT m.id, m.chat_id, m.content, m.sender, c.title
+    FROM json_each(?) j
+    CROSS JOIN messages m ON m.id = j.value
+    CROSS JOIN chats c ON c.id = m.chat_id
+    WHERE c.is_deleted = 0
+"""
+SQL_ADD_UPLOAD = "INSERT INTO uploads (chat_id, filename) VALUES (?, ?)"
+SQL_ADD_IMAGE_JOB = """
+    INSERT INTO image_jobs (chat_id, prompt, params, output_path) VALUES (?, ?, ?, ?)
+"""
+SQL_SET_IMAGE_JOB_STATUS = """
+    UPDATE image_jobs SET status = ?, error = ?,
+        finished_at = CASE WHEN ? IN ('done', 'failed', 'cancelled') THEN CURRENT_TIMESTAMP END
+    WHERE id = ?
+"""
+SQL_CANCEL_QUEUED_IMAGE_JOB = """
+    UPDATE image_jobs SET status = 'cancelled', finished_at = CURRENT_TIMESTAMP
+    WHERE id = ? AND status = 'queued'
+"""
+SQL_REQUEUE_IMAGE_JOBS = "UPDATE image_jobs SET status = 'queued' WHERE status = 'running'"
+SQL_GET_IMAGE_JOB = """
+    SELECT id, chat_id, prompt, params, output_path, status, error FROM image_jobs WHERE id = ?
+"""
+SQL_GET_CACHED_IMAGE = "SELECT path FROM image_cache WHERE key = ?"
+SQL_TOUCH_CACHED_IMAGE = "UPDATE image_cache SET last_used_at = ?, hits = hits + 1 WHERE key = ?"
+SQL_ADD_CACHED_IMAGE = """
+    INSERT OR REPLACE INTO image_cache (key, path, size, last_used_at) VALUES (?, ?, ?, ?)
+"""
+SQL_DELETE_CACHED_IMAGE = "DELETE FROM image_cache WHERE key = ?"
+SQL_GET_IMAGE_CACHE_SIZE = "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM image_cache"
+SQL_GET_LRU_CACHED_IMAGES = "SELECT key, path, size FROM image_cache ORDER BY last_used_at LIMIT ?"
+SQL_GET_CACHED_RESPONSE = "SELECT chunks FROM llm_cache WHERE key = ?"
+SQL_TOUCH_CACHED_RESPONSE = "UPDATE llm_cache SET last_used_at = ?, hits = hits + 1 WHERE key = ?"
+SQL_ADD_CACHED_RESPONSE = """
+    INSERT OR REPLACE INTO llm_cache (key, chunks, last_used_at) VALUES (?, ?, ?)
+"""
+# Keeps the `max_entries` most recently used responses
+SQL_EVICT_CACHED_RESPONSES = """
+    DELETE FROM llm_cache WHERE key IN (
+        SELECT key FROM llm_cache ORDER BY last_used_at DESC LIMIT -1 OFFSET ?
+    )
+"""
+SQL_GET_QUEUED_IMAGE_JOBS = """
+    SELECT id, chat_id, prompt, params, output_path, status, error FROM image_jobs
+    WHERE status = 'queued'
+    ORDER BY id LIMIT ?
+"""
+# Full-text search, best bm25 match first among the SEARCH_RANK_WINDOW
+# most recent matches: ranking every match of a very common word would
+# cost a bm25 evaluation per message. Messages of deleted chats are still
+# indexed but not returned. CROSS JOIN pins the join order: the planner
+# would otherwise start from chats and scan messages.
+SQL_SEARCH_MESSAGES = """
+    SELECT m.id, m.chat_id, c.title, m.sender,
+           snippet(messages_fts, 0, ?, ?, '…', 12)
+    FROM messages_fts
+    CROSS JOIN messages m ON m.id = messages_fts.rowid
+    CROSS JOIN chats c ON c.id = m.chat_id
+    WHERE messages_fts MATCH ? AND c.is_deleted = 0
+      AND messages_fts.rowid >= COALESCE((
+          SELECT rowid FROM messages_fts WHERE messages_fts MATCH ?
+          ORDER BY rowid DESC LIMIT 1 OFFSET ?), 0)
+    ORDER BY messages_fts.rank LIMIT ? OFFSET ?
+"""
+SEARCH_RANK_WINDOW = 2000
+SNIPPET_MARKS = ("[", "]")  # around matched terms in search snippets
+
+# Schema migrations, applied in order by _init_db. Version 1 is the
+# original schema (IF NOT EXISTS so databases created before versioning
+# are adopted in place); append new versions, never edit old ones.
+MIGRATIONS = [
+    (1, [
+        """
+        CREATE TABLE IF NOT EXISTS chats (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT NOT NULL,
+            is_favorite BOOLEAN DEFAULT 0,
+            is_deleted BOOLEAN DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS messages (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            chat_id INTEGER,
+            content TEXT NOT NULL,
+            sender TEXT DEFAULT 'user',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (chat_id) REFERENCES chats(id)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS uploads (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            chat_id INTEGER,
+            filename TEXT NOT NULL,
+            uploaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (chat_id) REFERENCES chats(id)
+        )
+        """,
+    ]),
+    (2, [
+        # get_messages: WHERE chat_id = ? ORDER BY created_at
+        "CREATE INDEX IF NOT EXISTS idx_messages_chat_created ON messages (chat_id, created_at, id)",
+        # get_chats(only_favorites=True/False), title included so the
+        # sidebar query never touches the table
+        "CREATE INDEX IF NOT EXISTS idx_chats_visible ON chats (is_deleted, is_favorite, created_at, title)",
+        # get_chats() without a favorites filter
+        "CREATE INDEX IF NOT EXISTS idx_chats_created ON chats (is_deleted, created_at, title)",
+        "CREATE INDEX IF NOT EXISTS idx_uploads_chat ON uploads (chat_id)",
+        "ANALYZE",
+    ]),
+    (3, [
+        # get_messages_page: the implicit rowid suffix makes this serve
+        # WHERE chat_id = ? AND id < ? ORDER BY id DESC
+        "CREATE INDEX IF NOT EXISTS idx_messages_chat_id ON messages (chat_id)",
+        "ANALYZE",
+    ]),
+    (4, [
+        # Image generation queue; unfinished jobs are resumed on restart
+        """
+        CREATE TABLE IF NOT EXISTS image_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            chat_id INTEGER,
+            prompt TEXT NOT NULL,
+            params TEXT NOT NULL DEFAULT '{}',
+            output_path TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'queued',
+            error TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            finished_at TIMESTAMP,
+            FOREIGN KEY (chat_id) REFERENCES chats(id)
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_image_jobs_status ON image_jobs (status, id)",
+    ]),
+    (5, [
+        # Generated images by content key (workers/image_cache.py)
+        """
+        CREATE TABLE IF NOT EXISTS image_cache (
+            key TEXT PRIMARY KEY,
+            path TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            hits INTEGER DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            last_used_at REAL NOT NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_image_cache_lru ON image_cache (last_used_at)",
+    ]),
+    (6, [
+        # LLM responses by (model, prompt, params) key (workers/response_cache.py);
+        # chunks is the JSON list of streamed pieces, replayed as a stream
+        """
+        CREATE TABLE IF NOT EXISTS llm_cache (
+            key TEXT PRIMARY KEY,
+            chunks TEXT NOT NULL,
+            hits INTEGER DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            last_used_at REAL NOT NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_llm_cache_lru ON llm_cache (last_used_at)",
+    ]),
+    (7, [
+        # Full-text index over messages.content (search_messages). External
+        # content: the text is stored once, in messages; the triggers keep
+        # the index in sync and 'rebuild' indexes the existing rows.
+        # prefix='2 3' keeps as-you-type prefix queries off the slow path.
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+            content, content='messages', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+        )
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN
+            INSERT INTO messages_fts (rowid, content) VALUES (new.id, new.content);
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN
+            INSERT INTO messages_fts (messages_fts, rowid, content) VALUES ('delete', old.id, old.content);
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS messages_fts_update AFTER UPDATE OF content ON messages BEGIN
+            INSERT INTO messages_fts (messages_fts, rowid, content) VALUES ('delete', old.id, old.content);
+            INSERT INTO messages_fts (rowid, content) VALUES (new.id, new.content);
+        END
+        """,
+        # No ANALYZE here: statistics on the FTS shadow tables slow down
+        # every indexed insert
+        "INSERT INTO messages_fts (messages_fts) VALUES ('rebuild')",
+    ]),
+]
+
+# Hot queries checked by benchmarks/check_query_plans.py; none of them may
+# fall back to a full table SCAN.
+HOT_QUERIES = {
+    "get_messages": (SQL_GET_MESSAGES, (1,)),
+    "get_messages_page": (SQL_GET_MESSAGES_PAGE, (1, 1000, 50)),
+    "get_messages_newer": (SQL_GET_MESSAGES_NEWER, (1, 1000, 50)),
+    "get_messages_page(latest)": (SQL_GET_MESSAGES_LATEST, (1, 50)),
+    "get_chats(favorites)": (SQL_GET_CHATS_FAVORITES, ()),
+    "get_chats(regular)": (SQL_GET_CHATS_REGULAR, ()),
+    "get_chats(all)": (SQL_GET_CHATS_ALL, ()),
+    "get_queued_image_jobs": (SQL_GET_QUEUED_IMAGE_JOBS, (64,)),
+    "get_cached_image": (SQL_GET_CACHED_IMAGE, ("0" * 64,)),
+    "get_cached_response": (SQL_GET_CACHED_RESPONSE, ("0" * 64,)),
+    "get_messages_after": (SQL_GET_MESSAGES_AFTER, (1000, 32)),
+    "get_messages_by_ids": (SQL_GET_MESSAGES_BY_IDS, ("[1, 2, 3]",)),
+    "search_messages": (SQL_SEARCH_MESSAGES, ("[", "]", '"hello"*', '"hello"*', SEARCH_RANK_WINDOW, 20, 0)),
+}
+
+
 class DatabaseManager(QObject):
-    data_updated = Signal()
+    # Fine-grained change notifications, emitted after the write commits
+    chat_added = Signal(int, str)          # chat_id, title
+    chat_renamed = Signal(int, str)        # chat_id, new title
+    chat_deleted = Signal(int)             # chat_id
+    chat_favorited = Signal(int, bool)     # chat_id, is_favorite
+    message_added = Signal(object, int)    # chat_id (may be None), message_id
+    upload_added = Signal(object, str)     # chat_id (may be None), filename
+    image_job_updated = Signal(int, str)   # job_id, status
 
     def __init__(self, db_name="chat_app.db"):
         super().__init__()
         self.db_name = db_name
+        # One persistent connection per thread (sqlite3 connections must not
+        # be shared across threads without external locking).
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
         self._init_db()
 
-    def _init_db(self):
-        with sqlite3.connect(self.db_name) as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS chats (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    title TEXT NOT NULL,
-                    is_favorite BOOLEAN DEFAULT 0,
-                    is_deleted BOOLEAN DEFAULT 0,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-            
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS messages (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    chat_id INTEGER,
-                    content TEXT NOT NULL,
-                    sender TEXT DEFAULT 'user',
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (chat_id) REFERENCES chats(id)
-                )
-            """)
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_name, cached_statements=256)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # WAL + NORMAL only fsyncs on checkpoint, not on every commit
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA temp_store=MEMORY")
+            self._local.conn = conn
+            self._local.batch_depth = 0
+            self._local.pending = []
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    def close(self):
+        with self._connections_lock:
+            for conn in self._connections:
+                try:
+                    conn.close()
+                except sqlite3.ProgrammingError:
+                    # Created in another thread that is already gone
+                    pass
+            self._connections.clear()
+        self._local = threading.local()
+
+    @contextmanager
+    def batch(self):
+        """Group every write made inside the block into a single transaction.
+
+        Change signals are held back until the outermost batch commits and
+        dropped if it rolls back.
+        """
+        conn = self._connect()
+        self._local.batch_depth += 1
+        try:
+            yield self
+        except Exception:
+            self._local.batch_depth -= 1
+            if self._local.batch_depth == 0:
+                conn.rollback()
+                self._local.pending = []
+            raise
+        self._local.batch_depth -= 1
+        if self._local.batch_depth == 0:
             conn.commit()
+            pending, self._local.pending = self._local.pending, []
+            for signal, args in pending:
+                signal.emit(*args)
+
+    def _write(self, sql, params=()):
+        conn = self._connect()
+        try:
+            return conn.execute(sql, params)
+        except sqlite3.Error:
+            if not self._local.batch_depth:
+                conn.rollback()
+            raise
+
+    def _commit(self, signal=None, *args):
+        if self._local.batch_depth:
+            if signal is not None:
+                self._local.pending.append((signal, args))
+        else:
+            self._local.conn.commit()
+            if signal is not None:
+                signal.emit(*args)
+
+    def _query(self, sql, params=()):
+        return self._connect().execute(sql, params).fetchall()
 
-            cursor.execute("""
-            CREATE TABLE IF NOT EXISTS uploads (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                chat_id INTEGER,
-                filename TEXT NOT NULL,
-                uploaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (chat_id) REFERENCES chats(id)
+    def _init_db(self):
+        conn = self._connect()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER NOT NULL,
+                applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             )
-            """)
-            conn.commit()
-            
+        """)
+        conn.commit()
+        current = self.schema_version()
+        for version, statements in MIGRATIONS:
+            if version <= current:
+                continue
+            # Each migration is applied atomically so a crash half-way
+            # through leaves the file at the previous version.
+            conn.execute("BEGIN")
+            try:
+                for sql in statements:
+                    conn.execute(sql)
+                conn.execute("INSERT INTO schema_version (version) VALUES (?)", (version,))
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+    def explain(self, sql, params=()):
+        rows = self._connect().execute("EXPLAIN QUERY PLAN " + sql, params).fetchall()
+        return [row[-1] for row in rows]
+
+    def schema_version(self):
+        row = self._connect().execute("SELECT MAX(version) FROM schema_version").fetchone()
+        return row[0] or 0
+
     def rename_chat(self, chat_id, new_title):
-        with sqlite3.connect(self.db_name) as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                "UPDATE chats SET title = ? WHERE id = ?",
-                (new_title, chat_id))
-            conn.commit()
-            self.data_updated.emit()
+        self._write(SQL_RENAME_CHAT, (new_title, chat_id))
+        self._commit(self.chat_renamed, chat_id, new_title)
     
     def delete_chat(self, chat_id):
-        with sqlite3.connect(self.db_name) as conn:
-            cursor = conn.cursor()
-            
-            # Soft delete: just mark the chat as deleted
-            cursor.execute("UPDATE chats SET is_deleted = 1 WHERE id = ?", (chat_id,))
-            
-            conn.commit()
-            self.data_updated.emit()
-
+        # Soft delete: just mark the chat as deleted
+        self._write(SQL_DELETE_CHAT, (chat_id,))
+        self._commit(self.chat_deleted, chat_id)
 
     def toggle_favorite(self, chat_id):
-        with sqlite3.connect(self.db_name) as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                "UPDATE chats SET is_favorite = NOT is_favorite WHERE id = ?",
-                (chat_id,))
-            conn.commit()
-            self.data_updated.emit()
+        self._write(SQL_TOGGLE_FAVORITE, (chat_id,))
+        row = self._connect().execute(SQL_GET_FAVORITE, (chat_id,)).fetchone()
+        is_favorite = bool(row and row[0])
+        self._commit(self.chat_favorited, chat_id, is_favorite)
+        return is_favorite
 
     def add_chat(self, title):
-        with sqlite3.connect(self.db_name) as conn:
-            cursor = conn.cursor()
-            cursor.execute("INSERT INTO chats (title) VALUES (?)", (title,))
-            conn.commit()
-            self.data_updated.emit()
-            return cursor.lastrowid
+        chat_id = self._write(SQL_ADD_CHAT, (title,)).lastrowid
+        self._commit(self.chat_added, chat_id, title)
+        return chat_id
 
     def get_chats(self, only_favorites=None):
-        with sqlite3.connect(self.db_name) as conn:
-            cursor = conn.cursor()
-
-            if only_favorites is True:
-                cursor.execute("""
-                    SELECT id, title FROM chats 
-                    WHERE is_deleted = 0 AND is_favorite = 1 
-                    ORDER BY created_at DESC
-                """)
-            elif only_favorites is False:
-                cursor.execute("""
-                    SELECT id, title FROM chats 
-                    WHERE is_deleted = 0 AND is_favorite = 0 
-                    ORDER BY created_at DESC
-                """)
-            else:
-                cursor.execute("""
-                    SELECT id, title FROM chats 
-                    WHERE is_deleted = 0 
-                    ORDER BY created_at DESC
-                """)
-            return cursor.fetchall()
+        if only_favorites is True:
+            return self._query(SQL_GET_CHATS_FAVORITES)
+        elif only_favorites is False:
+            return self._query(SQL_GET_CHATS_REGULAR)
+        return self._query(SQL_GET_CHATS_ALL)
 
     def add_message(self, chat_id, content, sender='user'):
-        with sqlite3.connect(self.db_name) as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                "INSERT INTO messages (chat_id, content, sender) VALUES (?, ?, ?)",
-                (chat_id, content, sender)
-            )
-            conn.commit()
-            self.data_updated.emit()
+        message_id = self._write(SQL_ADD_MESSAGE, (chat_id, content, sender)).lastrowid
+        self._commit(self.message_added, chat_id, message_id)
+        return message_id
+
+    def add_messages(self, rows):
+        # rows: iterable of (chat_id, content, sender), one transaction
+        with self.batch():
+            for chat_id, content, sender in rows:
+                self.add_message(chat_id, content, sender)
 
     def get_messages(self, chat_id):
-        with sqlite3.connect(self.db_name) as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                "SELECT content, sender FROM messages WHERE chat_id = ? ORDER BY created_at",
-                (chat_id,)
-            )
-            return cursor.fetchall()
+        return self._query(SQL_GET_MESSAGES, (chat_id,))
+
+    def get_messages_page(self, chat_id, before_id=None, limit=50):
+        # Returns up to `limit` (id, content, sender) rows older than
+        # before_id (or the newest ones if None), oldest first.
+        if before_id is None:
+            rows = self._query(SQL_GET_MESSAGES_LATEST, (chat_id, limit))
+        else:
+            rows = self._query(SQL_GET_MESSAGES_PAGE, (chat_id, before_id, limit))
+        rows.reverse()
+        return rows
     
+    def get_messages_newer(self, chat_id, after_id, limit=50):
+        # Up to `limit` (id, content, sender) rows newer than after_id,
+        # oldest first
+        return self._query(SQL_GET_MESSAGES_NEWER, (chat_id, after_id, limit))
+
+    def search_messages(self, query, limit=20, offset=0):
+        """Messages matching the words of `query` (the last one as a
+        prefix, for as-you-type search), best match first:
+        [(message_id, chat_id, chat_title, sender, snippet)]. The snippet
+        wraps matched terms in SNIPPET_MARKS."""
+        match = fts_query(query)
+        if not match:
+            return []
+        return self._query(SQL_SEARCH_MESSAGES,
+                           (*SNIPPET_MARKS, match, match, SEARCH_RANK_WINDOW, limit, offset))
+
+    def get_messages_after(self, message_id, limit=32):
+        # (id, content) of every chat, in insertion order
+        return self._query(SQL_GET_MESSAGES_AFTER, (message_id, limit))
+
+    def get_messages_by_ids(self, message_ids):
+        # (id, chat_id, content, sender, chat_title) rows, in no particular
+        # order; ids of deleted chats or unknown ids are left out
+        return self._query(SQL_GET_MESSAGES_BY_IDS, (json.dumps(list(message_ids)),))
+
     def add_uploaded_file(self, chat_id, filename):
-        with sqlite3.connect(self.db_name) as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                "INSERT INTO uploads (chat_id, filename) VALUES (?, ?)",
-                (chat_id, filename)
-            )
-            conn.commit()
-            self.data_updated.emit()
\ No newline at end of file
+        self._write(SQL_ADD_UPLOAD, (chat_id, filename))
+        self._commit(self.upload_added, chat_id, filename)
+
+    # --- image generation queue ---
+
+    def add_image_job(self, chat_id, prompt, params, output_path):
+        job_id = self._write(SQL_ADD_IMAGE_JOB, (chat_id, prompt, json.dumps(params), output_path)).lastrowid
+        self._commit(self.image_job_updated, job_id, "queued")
+        return job_id
+
+    def set_image_job_status(self, job_id, status, error=None):
+        self._write(SQL_SET_IMAGE_JOB_STATUS, (status, error, status, job_id))
+        self._commit(self.image_job_updated, job_id, status)
+
+    def cancel_queued_image_job(self, job_id):
+        # Only jobs that have not started; returns False otherwise
+        cancelled = self._write(SQL_CANCEL_QUEUED_IMAGE_JOB, (job_id,)).rowcount > 0
+        if cancelled:
+            self._commit(self.image_job_updated, job_id, "cancelled")
+        else:
+            self._commit()
+        return cancelled
+
+    def requeue_image_jobs(self):
+        # Jobs left running by a previous process go back to the queue
+        self._write(SQL_REQUEUE_IMAGE_JOBS)
+        self._commit()
+
+    def get_image_job(self, job_id):
+        # (id, chat_id, prompt, params dict, output_path, status, error) or None
+        rows = self._query(SQL_GET_IMAGE_JOB, (job_id,))
+        return _image_job(rows[0]) if rows else None
+
+    def get_queued_image_jobs(self, limit=64):
+        return [_image_job(row) for row in self._query(SQL_GET_QUEUED_IMAGE_JOBS, (limit,))]
+
+
+    # --- generated image cache ---
+
+    def get_cached_image(self, key, now):
+        # Path of the cached image (and marks it recently used) or None
+        rows = self._query(SQL_GET_CACHED_IMAGE, (key,))
+        if not rows:
+            return None
+        self._write(SQL_TOUCH_CACHED_IMAGE, (now, key))
+        self._commit()
+        return rows[0][0]
+
+    def add_cached_image(self, key, path, size, now):
+        self._write(SQL_ADD_CACHED_IMAGE, (key, path, size, now))
+        self._commit()
+
+    def delete_cached_image(self, key):
+        self._write(SQL_DELETE_CACHED_IMAGE, (key,))
+        self._commit()
+
+    def get_image_cache_size(self):
+        # (entries, total bytes)
+        return self._query(SQL_GET_IMAGE_CACHE_SIZE)[0]
+
+    def get_lru_cached_images(self, limit=16):
+        # Least recently used first: (key, path, size)
+        return self._query(SQL_GET_LRU_CACHED_IMAGES, (limit,))
+
+
+    # --- LLM response cache ---
+
+    def get_cached_response(self, key, now):
+        # JSON chunk list (and marks it recently used) or None
+        rows = self._query(SQL_GET_CACHED_RESPONSE, (key,))
+        if not rows:
+            return None
+        self._write(SQL_TOUCH_CACHED_RESPONSE, (now, key))
+        self._commit()
+        return rows[0][0]
+
+    def add_cached_response(self, key, chunks, now, max_entries):
+        with self.batch():
+            self._write(SQL_ADD_CACHED_RESPONSE, (key, chunks, now))
+            self._write(SQL_EVICT_CACHED_RESPONSES, (max_entries,))
+
+
+def fts_query(text):
+    # User text -> FTS5 query: every word quoted (so quotes, AND, NEAR,
+    # column filters, ... are just text), the last one a prefix unless it
+    # is a single letter (that prefix would match most of the history)
+    words = re.findall(r"\w+", text)
+    if not words:
+        return ""
+    query = " ".join(f'"{word}"' for word in words)
+    return query + "*" if len(words[-1]) > 1 else query
+
+
+def _image_job(row):
+    job_id, chat_id, prompt, params, output_path, status, error = row
+    return job_id, chat_id, prompt, json.loads(params), output_path, status, error
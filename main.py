@@ -1,8 +1,10 @@
+import time
+STARTUP_T0 = time.perf_counter()  # for --profile-startup
+
 import os
 import sys
-import time
 import json
-import socket
+import random
 import datetime
 import threading
 import subprocess
@@ -11,69 +13,120 @@ from PySide6.QtWidgets import (
     QApplication, QMainWindow, QMenu, QFileDialog,
     QInputDialog, QMessageBox, QListWidgetItem,
 )
-from PySide6.QtGui import QFont, QIcon, QTextCursor
-from PySide6.QtCore import Qt, QSize, QTimer, QMetaObject, QEvent, QThread, QObject, Signal
+from PySide6.QtGui import QIcon, QImage, QTextCursor, QTextDocument
+from PySide6.QtCore import Qt, QTimer, QMetaObject, QEvent, Signal, QUrl
 
 from ui.ui_MainWindow import Ui_MainWindow
-from ui.voice_modal import VoiceModal
-from ui.spinner_widget import Spinner
-from ui.spinner_overlay import SpinnerOverlay
+from ui.chat_list_model import ChatListModel, FAVORITE_ROLE
 
 from database import DatabaseManager
+from settings import load_settings, thread_budget
 
 from workers.ai_worker import AIWorker
-from workers.image_worker import ImageWorker
+from workers.cancellation import CancellationToken
+from workers.image_queue import ImageJobQueue
+from workers.image_cache import ImageCache
+from workers.model_registry import ModelRegistry, UNLOADED, LOADING, READY, FAILED
+from workers.scheduler import InferenceScheduler, CHAT, VOICE
+from workers.whisper_client import WhisperClient
 
-class ModelLoaderWorker(QObject):
-    finished = Signal(object, object)  # (local_llm, sd_pipe)
-    error = Signal(str)
+THINKING_PLACEHOLDER = "🤖 Thinking..."
+STREAM_FPS = 30  # how often streamed tokens are painted into the chat view
+HISTORY_MESSAGES = 40  # messages offered to the LLM as context, at least (up to twice as many)
+VOICE_END_SILENCE = 1.5  # seconds of silence after speech that end voice input
+SEARCH_DEBOUNCE_MS = 250  # typing pause before the sidebar search runs
+SEARCH_PAGE_SIZE = 50     # results fetched per scroll to the bottom
+
+MODEL_LABELS = {"llm": "Chat", "sd": "Images", "retrieval": "Memory"}
+MODEL_STATE_ICONS = {UNLOADED: "💤", LOADING: "🔄", READY: "✅", FAILED: "❌"}
+
+
+def load_llm(db=None):
+    from workers.local_llm import LocalLLM
+    return LocalLLM(db=db)
+
+
+def load_sd():
+    # Scheduler, steps, dtype and memory options come from the "sd"
+    # profile in settings
+    from workers.local_sd import LocalSD
+    return LocalSD()
+
+
+def load_retrieval(db, scheduler):
+    # numpy and the embedding model; the index catches up once started
+    from workers.retrieval import RetrievalIndex
+    return RetrievalIndex(db, scheduler)
 
-    def run(self):
-        try:
-            from workers.local_llm import LocalLLM
-            local_llm = LocalLLM()
-            from diffusers import StableDiffusionPipeline
-            import traceback
-            import torch, os
-
-            ckpt_path = r"models/stable-diffusion/sd-v1-4.ckpt"
-            sd_pipe = StableDiffusionPipeline.from_single_file(
-                ckpt_path,
-                torch_dtype=torch.float32
-            )
-            if torch.cuda.is_available():
-                sd_pipe = sd_pipe.to("cuda")
-            else:
-                sd_pipe = sd_pipe.to("cpu")
-            self.finished.emit(local_llm, sd_pipe)
-        except Exception as e:
-            tb = traceback.format_exc()
-            print("Model loading error:", tb)
-            self.error.emit(f"{e}\n{tb}")
 
 class MainWindow(QMainWindow):
-    def __init__(self):
+    MESSAGE_PAGE_SIZE = 50
+    voice_error = Signal(str)
+
+    def __init__(self, load_models=True):
         super().__init__()
         self.ui = Ui_MainWindow()
         self.ui.setupUi(self)
         self.ui.sidebarWidget.installEventFilter(self)
         self.ui.uploadButton.clicked.connect(self.handle_file_upload)
 
-        self.db = DatabaseManager()  # <-- Add this before self.load_chats()
+        settings = load_settings()
+        self.db = DatabaseManager(settings["database"]["path"])  # <-- Add this before self.load_chats()
+
+        # Sidebar is driven row by row from the database change signals
+        self.chat_model = ChatListModel(self)
+        self.ui.chatListView.setModel(self.chat_model)
+        self.db.chat_added.connect(self.chat_model.add_chat)
+        self.db.chat_renamed.connect(self.on_chat_renamed)
+        self.db.chat_deleted.connect(self.on_chat_deleted)
+        self.db.chat_favorited.connect(self.chat_model.set_favorite)
 
         self.pending_image_path = None
         self.pending_image_filename = None
 
-        self.ui.statusLabel.setText("🔄 Loading models...")  # Show loading status
-        self.setEnabled(False)  # Disable UI until ready
-
-        self.model_loader_thread = QThread()
-        self.model_loader_worker = ModelLoaderWorker()
-        self.model_loader_worker.moveToThread(self.model_loader_thread)
-        self.model_loader_worker.finished.connect(self.on_models_loaded)
-        self.model_loader_worker.error.connect(self.on_model_load_error)
-        self.model_loader_thread.started.connect(self.model_loader_worker.run)
-        self.model_loader_thread.start()
+        # Chat replies, voice sessions and image batches all run on one
+        # long-lived pool: waiting chat first, then voice, then images
+        self.scheduler = InferenceScheduler(settings["scheduler"]["workers"])
+        self.scheduler.start()
+
+        # Image jobs run in the background (persisted, resumed on restart);
+        # the pipeline is handed over in on_model_ready. Repeated
+        # requests are answered from the generated image cache.
+        sd_settings = settings["sd"]
+        self.image_cache = ImageCache(self.db, sd_settings["cache_dir"],
+                                      sd_settings["cache_max_mb"] * 2**20)
+        self.image_queue = ImageJobQueue(self.db, self.image_cache, scheduler=self.scheduler, parent=self)
+        self.image_queue.progress.connect(self.on_image_progress)
+        self.image_queue.finished.connect(self.on_image_generated)
+        self.image_queue.failed.connect(self.on_image_error)
+        self.image_queue.cancelled.connect(self.on_image_cancelled)
+        self.image_queue.start()
+
+        # Models load in the background while the window is already usable:
+        # the LLM right away, Stable Diffusion per sd.preload ("background"
+        # after the LLM, "parallel" with it, or "lazy" on the first image).
+        self.local_llm = None
+        self.local_sd = None
+        self.retrieval = None
+        self.history_start = {}  # chat_id -> first message id offered to the LLM
+        self.pending_prompt = None
+        self.sd_preload = sd_settings.get("preload", "background")
+        # Semantic memory is optional: on if enabled and its model is there
+        retrieval_settings = settings["retrieval"]
+        self.retrieval_available = (retrieval_settings["enabled"]
+                                    and os.path.exists(retrieval_settings["model_path"]))
+        self.models = ModelRegistry(self)
+        self.models.register("llm", lambda: load_llm(self.db))
+        self.models.register("sd", load_sd)
+        self.models.register("retrieval", lambda: load_retrieval(self.db, self.scheduler))
+        self.models.state_changed.connect(self.on_model_state_changed)
+        self.models.ready.connect(self.on_model_ready)
+        self.models.failed.connect(self.on_model_load_error)
+        if load_models:
+            self.models.load("llm")
+            # Jobs left over from the last run need the pipeline too
+            if self.sd_preload == "parallel" or self.image_queue.pending():
+                self.models.load("sd")
 
         # model_path = os.path.abspath(os.path.join(os.getcwd(), "models", "stable-diffusion"))
         # self.sd_pipe = StableDiffusionPipeline.from_pretrained(
@@ -95,33 +148,54 @@ class MainWindow(QMainWindow):
         self.ui.cancelButton.clicked.connect(self.cancel_ai)
 
         # Enable custom context menu for list items
-        self.ui.listWidget.setContextMenuPolicy(Qt.CustomContextMenu)
-        self.ui.listWidget.customContextMenuRequested.connect(self.show_chat_menu)
+        self.ui.chatListView.setContextMenuPolicy(Qt.CustomContextMenu)
+        self.ui.chatListView.customContextMenuRequested.connect(self.show_chat_menu)
         
         # Connect signals
         self.ui.newChatButton.clicked.connect(self.create_new_chat)
         self.ui.sendButton.clicked.connect(self.send_message)
-        self.ui.listWidget.itemClicked.connect(self.load_chat)
+        self.ui.chatListView.clicked.connect(self.load_chat)
+        self.ui.plainText.verticalScrollBar().valueChanged.connect(self.on_chat_scrolled)
+
+        self.search_query = ""
+        self.search_has_more = False
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(SEARCH_DEBOUNCE_MS)
+        self.search_timer.timeout.connect(self.run_search)
+        self.ui.searchInput.textChanged.connect(self.on_search_text_changed)
+        self.ui.searchResultsView.itemClicked.connect(self.on_search_result_clicked)
+        self.ui.searchResultsView.verticalScrollBar().valueChanged.connect(self.on_search_results_scrolled)
 
         self.ui.micOnButton.clicked.connect(self.activate_voice_input)
         self.ui.micOffButton.clicked.connect(self.deactivate_voice_input)
         self.ui.sidebarToggleButton.clicked.connect(self.handle_sidebar_toggle)
 
-        self.spinner_overlay = SpinnerOverlay(self)
-        self.spinner_overlay.setGeometry(self.rect())
-        self.spinner_overlay.show()
-        self.spinner_overlay.raise_()
-
-        # ...existing code...
-        self.whisper_process = None
-        self.whisper_socket = None
-        self.voice_modal = None
-        self.audio_buffer = bytearray()
-        self.transcribe_thread = None
-        # ...rest of your __init__...
+        # Whisper daemon connection, shared by every voice input
+        self.whisper_client = WhisperClient(cpu_threads=thread_budget(settings)["whisper"], parent=self)
+        self.whisper_client.transcription.connect(self.on_transcription)
+        self.whisper_client.error.connect(lambda session_id, msg: print("Whisper error:", msg))
+        self.voice_error.connect(self.on_voice_error)
+        self.voice_lock = threading.Lock()
+        self.voice_session = None
+        self.voice_cancel = None
+        self.voice_pending = []
+        self.voice_end_requested = False
         
-        self.load_chats()
         self.current_chat_id = None
+        self.oldest_message_id = None
+        self.has_older_messages = False
+        self.has_newer_messages = False
+        self.ai_worker = None
+        self.ai_cancel = None
+        self.live_cursor = None
+        self.live_start = None
+        self.live_text = ""
+        self.pending_deltas = []
+        self.stream_timer = QTimer(self)
+        self.stream_timer.setInterval(1000 // STREAM_FPS)
+        self.stream_timer.timeout.connect(self.flush_stream)
+        self.load_chats()
 
         self.ui.textInput.sendMessage.connect(self.send_message)
 
@@ -190,78 +264,86 @@ class MainWindow(QMainWindow):
 
         QTimer.singleShot(0, reposition)
 
-    def connect_whisper_socket(self):
-        # Connect to the whisper server socket
-        self.whisper_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.whisper_socket.connect(("localhost", 8765))
-
-        def on_audio_chunk(chunk):
-            try:
-                self.whisper_socket.sendall(chunk)
-            except Exception as e:
-                print("Socket send error:", e)
-
-        def on_stop():
-            try:
-                self.whisper_socket.sendall(b"__END__")
-            except Exception:
-                pass
+    def activate_voice_input(self):
+        self.ui.micOnButton.setVisible(False)
+        self.ui.micOffButton.setVisible(True)
 
-        self.voice_modal = VoiceModal(on_audio_chunk, on_stop, self)
+        # Start capturing right away; chunks are held until the daemon
+        # session is open (the first use may have to start the daemon).
+        with self.voice_lock:
+            self.voice_session = None
+            self.voice_pending = []
+            self.voice_end_requested = False
+            self.voice_cancel = CancellationToken()
+
+        # sounddevice/numpy are only imported once voice input is used
+        from ui.voice_modal import VoiceModal
+        self.voice_modal = VoiceModal(self.on_voice_chunk, self.on_voice_stop, self)
         self.position_modal_above_button()
         self.voice_modal.show()
         QTimer.singleShot(1, self.position_modal_above_button)
         self.voice_modal.start_recording()
 
-        # Start thread to receive transcriptions
-        self.transcribe_thread = threading.Thread(target=self.receive_transcriptions, daemon=True)
-        self.transcribe_thread.start()
+        self.scheduler.submit(VOICE, self.open_voice_session, self.voice_cancel)
 
-    def activate_voice_input(self):
-        self.ui.micOnButton.setVisible(False)
-        self.ui.micOffButton.setVisible(True)
-        self.audio_buffer = bytearray()
-
-        # Start Whisper server as a subprocess (if not running)
-        if not self.whisper_process:
-            self.whisper_process = subprocess.Popen(
-                [r"whisper_worker\.venv\Scripts\python.exe", r"whisper_worker\whisper_server.py", "--socket"],
-                stdout=subprocess.PIPE, stderr=subprocess.PIPE
-            )
-            # Try to connect, retrying for up to 5 seconds
-            for _ in range(50):
-                try:
-                    self.connect_whisper_socket()
-                    break
-                except ConnectionRefusedError:
-                    time.sleep(0.1)
-            else:
-                QMessageBox.critical(self, "Whisper Error", "Could not connect to Whisper server.")
-                self.ui.micOnButton.setVisible(True)
-                self.ui.micOffButton.setVisible(False)
+    def open_voice_session(self, cancel):
+        try:
+            if not self.whisper_client.ensure_server():
+                self.voice_error.emit("Could not connect to Whisper server.")
                 return
-        else:
-            self.connect_whisper_socket()
+            # The daemon drops silence before decoding and ends the session
+            # once the speaker has been quiet for VOICE_END_SILENCE
+            session = self.whisper_client.start_session(
+                sample_rate=16000, format="s16le", channels=1,
+                vad="energy", end_silence=VOICE_END_SILENCE, cancel=cancel)
+            with self.voice_lock:
+                if cancel.cancelled:
+                    return
+                self.voice_session = session
+                for chunk in self.voice_pending:
+                    self.whisper_client.send_audio(self.voice_session, chunk)
+                self.voice_pending = []
+                if self.voice_end_requested:
+                    self.whisper_client.end_session(self.voice_session)
+        except Exception as e:
+            self.voice_error.emit(str(e))
+
+    def on_voice_chunk(self, chunk):
+        # Called on the capture sender thread: waiting for flow-control
+        # credit here is fine, the PortAudio callback keeps filling its
+        # ring buffer meanwhile.
+        with self.voice_lock:
+            session = self.voice_session
+            if session is None:
+                self.voice_pending.append(chunk)
+                return
+        try:
+            self.whisper_client.send_audio(session, chunk)
+        except Exception as e:
+            print("Socket send error:", e)
 
-    def receive_transcriptions(self):
-        buffer = b""
-        while True:
+    def on_voice_stop(self):
+        with self.voice_lock:
+            if self.voice_session is None:
+                self.voice_end_requested = True
+                return
             try:
-                data = self.whisper_socket.recv(4096)
-                if not data:
-                    break
-                buffer += data
-                while b"\n" in buffer:
-                    line, buffer = buffer.split(b"\n", 1)
-                    try:
-                        msg = json.loads(line.decode())
-                        text = msg.get("text", "")
-                        self.ui.textInput.setText(text)
-                    except Exception as e:
-                        print("Transcription parse error:", e)
-            except Exception as e:
-                print("Socket receive error:", e)
-                break
+                self.whisper_client.end_session(self.voice_session)
+            except Exception:
+                pass
+
+    def on_transcription(self, session_id, text, final):
+        if session_id == self.voice_session:
+            self.ui.textInput.setText(text)
+            if final and self.voice_modal:
+                # Ended on silence before the user pressed stop
+                self.deactivate_voice_input()
+
+    def on_voice_error(self, msg):
+        if self.voice_cancel is not None:
+            self.voice_cancel.cancel()
+        QMessageBox.critical(self, "Whisper Error", msg)
+        self.deactivate_voice_input()
 
     def deactivate_voice_input(self):
         self.ui.micOnButton.setVisible(True)
@@ -272,109 +354,118 @@ class MainWindow(QMainWindow):
             except Exception as e:
                 print("Stop recording error:", e)
             self.voice_modal = None
-        if self.whisper_socket:
-            try:
-                self.whisper_socket.close()
-            except Exception:
-                pass
-            self.whisper_socket = None
-        if self.whisper_process:
-            try:
-                self.whisper_process.terminate()
-            except Exception:
-                pass
-            self.whisper_process = None
+        # The daemon and its connection stay up for the next voice input
 
     def show_chat_menu(self, pos):
-        item = self.ui.listWidget.itemAt(pos)
-        if not item:
+        index = self.ui.chatListView.indexAt(pos)
+        if not index.isValid() or self.get_chat_id(index) is None:
             return
             
         menu = QMenu()
         
         rename_action = menu.addAction("Rename Chat")
         delete_action = menu.addAction("Delete Chat")
-        chat_id = self.get_chat_id(item)
-        is_favorite = False
-        if chat_id:
-            chats = self.db.get_chats()
-            for cid, title in chats:
-                if cid == chat_id:
-                    is_favorite = True if "★" in item.text() else False
-                    break
+        is_favorite = bool(index.data(FAVORITE_ROLE))
 
         fav_text = "Remove from Favorites" if is_favorite else "Add to Favorites"
         favorite_action = menu.addAction(fav_text)
 
         
-        action = menu.exec(self.ui.listWidget.mapToGlobal(pos))
+        action = menu.exec(self.ui.chatListView.mapToGlobal(pos))
         
         if action == rename_action:
-            self.rename_chat(item)
+            self.rename_chat(index)
         elif action == delete_action:
-            self.delete_chat(item)
+            self.delete_chat(index)
         elif action == favorite_action:
-            self.add_to_favorites(item)
+            self.add_to_favorites(index)
 
-    def rename_chat(self, item):
+    def rename_chat(self, index):
         new_name, ok = QInputDialog.getText(
-            self, "Rename Chat", "Enter new name:", text=item.text()
+            self, "Rename Chat", "Enter new name:", text=index.data()
         )
         if ok and new_name:
-            chat_id = self.get_chat_id(item)
-            self.db.rename_chat(chat_id, new_name)
-            item.setText(new_name)
-            if self.ui.listWidget.currentItem() == item:
-                self.ui.chat_title.setText(new_name)
+            self.db.rename_chat(self.get_chat_id(index), new_name)
+
+    def on_chat_renamed(self, chat_id, new_title):
+        self.chat_model.rename_chat(chat_id, new_title)
+        if chat_id == self.current_chat_id:
+            self.ui.chat_title.setText(new_title)
 
-    def delete_chat(self, item):
+    def delete_chat(self, index):
         reply = QMessageBox.question(
             self, "Delete Chat", 
             "Are you sure you want to delete this chat?",
             QMessageBox.Yes | QMessageBox.No
         )
         if reply == QMessageBox.Yes:
-            chat_id = self.get_chat_id(item)
-            self.db.delete_chat(chat_id)
-            self.ui.listWidget.takeItem(self.ui.listWidget.row(item))
-            if self.ui.listWidget.count() == 0:
-                self.ui.plainText.clear()
-                self.ui.chat_title.setText("Welcome to FamousNSFW!")
+            self.db.delete_chat(self.get_chat_id(index))
+
+    def on_chat_deleted(self, chat_id):
+        self.chat_model.remove_chat(chat_id)
+        if self.ai_worker is not None and self.ai_worker.chat_id == chat_id:
+            self.ai_cancel.cancel()  # nowhere to save the reply
+        if self.chat_model.chat_count() == 0:
+            self.detach_live_message()
+            self.ui.plainText.clear()
+            self.ui.chat_title.setText("Welcome to FamousNSFW!")
 
     def load_chats(self):
-        self.ui.listWidget.clear()
-
-        # === Favorites Section ===
-        favorite_chats = self.db.get_chats(only_favorites=True)
-        if favorite_chats:
-            fav_header = QListWidgetItem("★ Favorites")
-            fav_header.setFlags(Qt.NoItemFlags)
-            fav_header.setFont(QFont("Arial", 11, QFont.Bold))
-            fav_header.setBackground(Qt.lightGray)  
-            fav_header.setTextAlignment(Qt.AlignBottom | Qt.AlignLeft)
-            self.ui.listWidget.addItem(fav_header)
-
-            for chat_id, title in favorite_chats:
-                item = QListWidgetItem(f"{title}")
-                self.ui.listWidget.addItem(item)
-
-        # === Regular Chats Section ===
-        regular_chats = self.db.get_chats(only_favorites=False)
-        if regular_chats:
-            all_header = QListWidgetItem("— All Chats")
-            all_header.setFlags(Qt.NoItemFlags)
-            all_header.setFont(QFont("Arial", 11, QFont.Bold))
-            all_header.setSizeHint(QSize(0, 40))
-            all_header.setBackground(Qt.lightGray)
-            all_header.setTextAlignment(Qt.AlignBottom | Qt.AlignLeft)
-            self.ui.listWidget.addItem(all_header)
-
-            for chat_id, title in regular_chats:
-                item = QListWidgetItem(title)
-                self.ui.listWidget.addItem(item)
+        # Full load at startup only; afterwards the model follows the
+        # DatabaseManager signals.
+        self.chat_model.reset_chats(
+            self.db.get_chats(only_favorites=True),
+            self.db.get_chats(only_favorites=False),
+        )
+
+    # --- search ---
+
+    def on_search_text_changed(self, text):
+        # Debounced: the query runs once typing pauses
+        if text.strip():
+            self.search_timer.start()
+            return
+        self.search_timer.stop()
+        self.ui.searchResultsView.clear()
+        self.ui.searchResultsView.setVisible(False)
+        self.ui.chatListView.setVisible(True)
+
+    def run_search(self):
+        self.search_query = self.ui.searchInput.text()
+        self.ui.searchResultsView.clear()
+        self.ui.chatListView.setVisible(False)
+        self.ui.searchResultsView.setVisible(True)
+        self.load_more_search_results()
+
+    def load_more_search_results(self):
+        results = self.ui.searchResultsView
+        rows = self.db.search_messages(self.search_query, SEARCH_PAGE_SIZE, results.count())
+        self.search_has_more = len(rows) == SEARCH_PAGE_SIZE
+        for message_id, chat_id, title, sender, snippet in rows:
+            item = QListWidgetItem(f"{title}\n{'You' if sender == 'user' else 'AI'}: {snippet}")
+            item.setData(Qt.UserRole, (chat_id, message_id, title))
+            results.addItem(item)
+        if results.count() == 0:
+            item = QListWidgetItem("No matches")
+            item.setFlags(Qt.NoItemFlags)
+            results.addItem(item)
+
+    def on_search_results_scrolled(self, value):
+        if self.search_has_more and value == self.ui.searchResultsView.verticalScrollBar().maximum():
+            self.load_more_search_results()
+
+    def on_search_result_clicked(self, item):
+        if item.data(Qt.UserRole) is None:
+            return
+        chat_id, message_id, title = item.data(Qt.UserRole)
+        self.open_chat_at(chat_id, title, message_id)
 
     def create_new_chat(self):
         self.current_chat_id = None  # No chat yet
+        self.oldest_message_id = None
+        self.has_older_messages = False
+        self.has_newer_messages = False
+        self.detach_live_message()
         self.ui.plainText.clear()
         self.ui.chat_title.setText("Welcome!")
         self.ui.plainText.setPlainText("What can I help you with?")
@@ -385,117 +476,302 @@ class MainWindow(QMainWindow):
         save_path = os.path.join(upload_dir, filename)
         return f'<img src="{save_path}" alt="" style="max-width:200px; max-height:200px; border-radius:16px;"/>'  # No filename
 
-    def load_chat(self, item):
-        chat_id = self.get_chat_id(item)
+    def load_chat(self, index):
+        chat_id = self.get_chat_id(index)
         if not chat_id:
             return
-        
-        self.current_chat_id = chat_id
 
-        title = item.text().replace("★ ", "")
+        self.open_chat(chat_id, index.data())
+
+    def open_chat(self, chat_id, title):
+        self.current_chat_id = chat_id
         self.ui.chat_title.setText(title)  
 
-        messages = self.db.get_messages(chat_id)
+        # Only the most recent window is rendered; older pages are pulled
+        # in by on_chat_scrolled when the user reaches the top.
+        self.detach_live_message()
         self.ui.plainText.clear()
-        for content, sender in messages:
-            prefix = "You" if sender == 'user' else "AI"
-            if content.startswith("[image:") and content.endswith("]"):
-                filename = content[7:-1]
-                html = self.render_image_message(filename)
-                self.append_message(prefix, html)
-            else:
-                self.append_message(prefix, content)
+        self.oldest_message_id = None
+        self.has_older_messages = True
+        self.has_newer_messages = False
+        self.load_older_messages()
+        scrollbar = self.ui.plainText.verticalScrollBar()
+        scrollbar.setValue(scrollbar.maximum())
+
+    def open_chat_at(self, chat_id, title, message_id):
+        # Only a page around the message is rendered, however old it is;
+        # scrolling pulls in older pages at the top and newer ones at the
+        # bottom
+        self.current_chat_id = chat_id
+        self.ui.chat_title.setText(title)
+        half = self.MESSAGE_PAGE_SIZE // 2
+        older = self.db.get_messages_page(chat_id, message_id + 1, half)
+        newer = self.db.get_messages_newer(chat_id, message_id, half)
+        self.detach_live_message()
+        self.ui.plainText.clear()
+        self.has_older_messages = len(older) == half
+        self.has_newer_messages = len(newer) == half
+        rows = older + newer
+        self.oldest_message_id = rows[0][0] if rows else None
+        self.newest_message_id = rows[-1][0] if rows else None
+        cursor = QTextCursor(self.ui.plainText.document())
+        cursor.insertHtml(self.messages_html(rows))
+        self.ui.plainText.scrollToAnchor(str(message_id))
+
+    def show_latest_messages(self):
+        # Before anything new is appended at the bottom
+        if self.has_newer_messages:
+            self.open_chat(self.current_chat_id, self.ui.chat_title.text())
+
+    def messages_html(self, rows):
+        return "".join(
+            self.format_message("You" if sender == 'user' else "AI",
+                                self.render_message_content(content),
+                                message_id=message_id)
+            for message_id, content, sender in rows
+        )
+
+    def load_older_messages(self):
+        if self.current_chat_id is None or not self.has_older_messages:
+            return
+
+        rows = self.db.get_messages_page(
+            self.current_chat_id, self.oldest_message_id, self.MESSAGE_PAGE_SIZE)
+        self.has_older_messages = len(rows) == self.MESSAGE_PAGE_SIZE
+        if not rows:
+            return
+        self.oldest_message_id = rows[0][0]
+        html = self.messages_html(rows)
+
+        # Insert in one go at the top and keep the viewport where it was
+        scrollbar = self.ui.plainText.verticalScrollBar()
+        old_max, old_value = scrollbar.maximum(), scrollbar.value()
+        cursor = QTextCursor(self.ui.plainText.document())
+        cursor.movePosition(QTextCursor.Start)
+        cursor.insertHtml(html)
+        scrollbar.setValue(scrollbar.maximum() - old_max + old_value)
+
+    def load_newer_messages(self):
+        if self.current_chat_id is None or not self.has_newer_messages:
+            return
+        rows = self.db.get_messages_newer(
+            self.current_chat_id, self.newest_message_id, self.MESSAGE_PAGE_SIZE)
+        self.has_newer_messages = len(rows) == self.MESSAGE_PAGE_SIZE
+        if not rows:
+            return
+        self.newest_message_id = rows[-1][0]
+        # Appended below the viewport, which does not move
+        cursor = QTextCursor(self.ui.plainText.document())
+        cursor.movePosition(QTextCursor.End)
+        cursor.insertHtml(self.messages_html(rows))
+
+    def on_chat_scrolled(self, value):
+        scrollbar = self.ui.plainText.verticalScrollBar()
+        if value == scrollbar.minimum() and self.has_older_messages:
+            QTimer.singleShot(0, self.load_older_if_at_top)
+        elif value == scrollbar.maximum() and self.has_newer_messages:
+            QTimer.singleShot(0, self.load_newer_if_at_bottom)
+
+    def load_older_if_at_top(self):
+        # Re-checked after the event loop settles: clear() and the initial
+        # jump to the bottom also pass through the top of the scrollbar.
+        scrollbar = self.ui.plainText.verticalScrollBar()
+        if scrollbar.value() == scrollbar.minimum():
+            self.load_older_messages()
+
+    def load_newer_if_at_bottom(self):
+        scrollbar = self.ui.plainText.verticalScrollBar()
+        if scrollbar.value() == scrollbar.maximum():
+            self.load_newer_messages()
+
+    def render_message_content(self, content):
+        if content.startswith("[image:") and content.endswith("]"):
+            return self.render_image_message(content[7:-1])
+        return content
         
-    def get_chat_id(self, item):
-        raw_title = item.text().replace("★ ", "")
-        if raw_title in ["★ Favorites", "— All Chats"]:
-            return None
-        chats = self.db.get_chats()
-        for cid, title in chats:
-            if title == raw_title:
-                return cid
-        return None
+    def get_chat_id(self, index):
+        # Section headers carry no chat id
+        return index.data(Qt.UserRole)
     
-    def update_typing(self, text):
-        # If text is a dict, extract the text field
-        if isinstance(text, dict):
-            text = text.get("text", str(text))
+    def begin_live_message(self):
+        # The placeholder becomes the live block: tokens are inserted in
+        # place at live_cursor instead of re-rendering the whole message.
+        self.append_message("AI", THINKING_PLACEHOLDER, italic=True)
+        doc = self.ui.plainText.document()
+        self.live_cursor = doc.find(THINKING_PLACEHOLDER, doc.characterCount(), QTextDocument.FindBackward)
+        self.live_start = QTextCursor(doc)
+        self.live_start.setPosition(self.live_cursor.selectionStart())
+        self.live_start.setKeepPositionOnInsert(True)
+        self.live_format = self.live_cursor.charFormat()
+        self.live_format.setFontItalic(False)
+        self.live_text = ""
+        self.pending_deltas = []
+        self.stream_timer.start()
+
+    def update_typing(self, delta):
+        # Runs once per token: only buffer, flush_stream paints at STREAM_FPS
+        if self.live_cursor is not None:
+            self.pending_deltas.append(delta)
+
+    def flush_stream(self):
+        if not self.pending_deltas or self.live_cursor is None:
+            return
         if self.ui.statusLabel.text() != "✍️ Typing...":
             self.ui.statusLabel.setText("✍️ Typing...")
-        cursor = self.ui.plainText.textCursor()
-        cursor.movePosition(QTextCursor.End)
-        self.ui.plainText.undo()
-        self.append_message("AI", text)
+        chunk = "".join(self.pending_deltas)
+        self.pending_deltas = []
+        # First flush replaces the selected placeholder, later ones append
+        self.live_cursor.insertText(chunk, self.live_format)
+        self.live_text += chunk
+        scrollbar = self.ui.plainText.verticalScrollBar()
+        scrollbar.setValue(scrollbar.maximum())
+
+    def end_live_message(self, text):
+        self.stream_timer.stop()
+        self.flush_stream()
+        if self.live_cursor is not None and text != self.live_text:
+            # e.g. cancelled: swap the streamed text for the final one
+            self.live_cursor.setPosition(self.live_start.position(), QTextCursor.KeepAnchor)
+            self.live_cursor.insertText(text, self.live_format)
+        self.live_cursor = None
+        self.live_start = None
+
+    def detach_live_message(self):
+        # The view is about to be cleared: a reply still streaming goes on
+        # in the background and ai_done saves it to its own chat
+        self.stream_timer.stop()
+        self.live_cursor = None
+        self.live_start = None
+        self.pending_deltas = []
 
     def ai_done(self, text):
         # If text is a dict, extract the text field
         if isinstance(text, dict):
             text = text.get("text", str(text))
         self.ui.statusLabel.setText("")
-        cursor = self.ui.plainText.textCursor()
-        cursor.movePosition(QTextCursor.End)
-        self.ui.plainText.undo()
-        self.append_message("AI", text)
-        self.db.add_message(self.current_chat_id, text, 'ai')
+        chat_id = self.ai_worker.chat_id
+        detached = self.live_cursor is None
+        self.end_live_message(text)
+        if self.chat_model.index_for_chat(chat_id).isValid():
+            self.db.add_message(chat_id, text, 'ai')
+        if detached and chat_id == self.current_chat_id and not self.has_newer_messages:
+            # Back in the reply's chat, which was reloaded without it
+            self.append_message("AI", text)
         self.last_ai_response = text
         self.ui.sendButton.setEnabled(True)
-        self.cleanup_ai_thread()
+        self.cleanup_ai()
 
     def ai_error(self, msg):
+        self.stream_timer.stop()
+        self.live_cursor = None
         self.ui.statusLabel.setText(f"❌ Error: {msg}")
         self.ui.sendButton.setEnabled(True)
-        self.ui.cancelButton.setVisible(False)
-        self.cleanup_ai_thread()
+        self.cleanup_ai()
 
     def cancel_ai(self):
-        if hasattr(self, 'ai_worker'):
-            self.ai_worker.stop()
+        # The reply stops after the current token (ai_done then shows the
+        # cancel note); with no reply running, the image batch in progress
+        # stops at its next denoising step
+        if self.pending_prompt is not None:
+            self.pending_prompt = None
+            self.ui.sendButton.setEnabled(True)
+            self.ui.statusLabel.setText("")
+        elif self.ai_cancel is not None:
+            self.ai_cancel.cancel()
+        else:
+            self.image_queue.cancel_all()
+        self.update_cancel_button()
+
+    def update_cancel_button(self):
+        busy = (self.ai_cancel is not None or self.pending_prompt is not None
+                or self.image_queue.pending() > 0)
+        self.ui.cancelButton.setVisible(busy)
 
     def retry_ai(self):
+        # Identical prompts are answered from the response cache;
+        # Shift+Retry forces a fresh generation
         if hasattr(self, 'last_user_message'):
-            self.generate_ai_response(self.last_user_message)
+            force = bool(QApplication.keyboardModifiers() & Qt.ShiftModifier)
+            self.generate_ai_response(self.last_user_message, force=force)
 
-    def cleanup_ai_thread(self):
-        if self.ai_thread:
-            self.ai_thread.quit()
-            self.ai_thread.wait()
-            self.ai_thread = None
-            self.ai_worker = None
+    def cleanup_ai(self):
+        # The worker has emitted its last signal; the pool thread it ran on
+        # goes back to the scheduler, nothing to wait for here
+        self.ai_worker = None
+        self.ai_cancel = None
+        self.update_cancel_button()
 
 
-    def generate_ai_response(self, prompt):
-        if not hasattr(self, "local_llm") or self.local_llm is None:
-            self.ui.statusLabel.setText("❌ Model not loaded yet. Please wait.")
-            self.ui.sendButton.setEnabled(True)
+    def reply_busy(self):
+        # One reply at a time: a second one would stream into the same live
+        # block and be saved next to the first
+        return self.ai_worker is not None or self.pending_prompt is not None
+
+    def generate_ai_response(self, prompt, force=False):
+        if self.reply_busy():
+            return
+        if self.local_llm is None:
+            # Answered from on_model_ready once the LLM is loaded
+            if self.models.state("llm") == FAILED:
+                self.models.load("llm")
+            self.pending_prompt = (prompt, self.current_chat_id)
+            self.ui.sendButton.setEnabled(False)
+            self.ui.statusLabel.setText("🔄 Chat model is still loading, the answer will follow...")
+            self.update_cancel_button()
             return
 
         self.ui.sendButton.setEnabled(False)
         self.ui.statusLabel.setText("🤖 Thinking...") 
-        self.append_message("AI", "🤖 Thinking...", italic=True)
-
-        self.ai_thread = QThread()
-        self.ai_worker = AIWorker(self.local_llm.model, prompt)
-        self.ai_worker.moveToThread(self.ai_thread)
-
+        self.begin_live_message()
+
+        # Recent history (includes the message just sent); LocalLLM trims
+        # it to the context budget and reuses the chat's KV cache.
+        history = []
+        history_ids = []
+        if self.current_chat_id is not None:
+            rows = self.db.get_messages_page(self.current_chat_id, None, 2 * HISTORY_MESSAGES)
+            # The window starts at a fixed message and grows to twice
+            # HISTORY_MESSAGES before it jumps forward, so the prompt prefix
+            # (and the chat's KV state in LocalLLM) holds for many turns
+            start_id = self.history_start.get(self.current_chat_id)
+            if rows and (start_id is None or (start_id < rows[0][0] and len(rows) == 2 * HISTORY_MESSAGES)):
+                start_id = rows[max(0, len(rows) - HISTORY_MESSAGES)][0]
+                self.history_start[self.current_chat_id] = start_id
+            rows = [row for row in rows if row[0] >= start_id]
+            history = [(content, sender) for _, content, sender in rows]
+            history_ids = [message_id for message_id, _, _ in rows]
+            # On retry the previous answer is dropped so the prompt ends
+            # with the user's turn again
+            while history and history[-1][1] != 'user':
+                history.pop()
+
+        # The worker stays on the UI thread; run() executes on a pool thread
+        # and its signals are queued back here
+        self.ai_cancel = CancellationToken()
+        self.ai_worker = AIWorker(self.local_llm, prompt, self.current_chat_id, history, force,
+                                  cancel=self.ai_cancel, retrieval=self.retrieval,
+                                  exclude_ids=history_ids)
         self.ai_worker.partial.connect(self.update_typing)
         self.ai_worker.finished.connect(self.ai_done)
         self.ai_worker.error.connect(self.ai_error)
-        self.ai_thread.started.connect(self.ai_worker.run)
-
-        self.ai_thread.start()
+        self.scheduler.submit(CHAT, self.ai_worker.run)
+        self.update_cancel_button()
     
-    def append_message(self, sender: str, text: str, italic=False, message_id=None):
+    def format_message(self, sender: str, text: str, italic=False, message_id=None):
         color = "#007acc" if sender == "You" else "#333"
         weight = "bold" if sender == "You" else "normal"
         style = "italic" if italic else "normal"
 
-        html = f"""
+        return f"""
         <div id="{message_id or ''}" style="margin-bottom:12px;">
             <span style="color:{color}; font-weight:{weight};">{sender}:</span><br>
             <span style="font-style:{style};">{text}</span>
         </div>
         <br> <!-- Add this for extra spacing -->
         """
+
+    def append_message(self, sender: str, text: str, italic=False, message_id=None):
+        html = self.format_message(sender, text, italic, message_id)
         cursor = self.ui.plainText.textCursor()
         cursor.movePosition(QTextCursor.End)
         cursor.insertHtml(html)
@@ -516,17 +792,28 @@ class MainWindow(QMainWindow):
             prompt = message.split(":", 1)[1].strip()
             output_filename = f"gen_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.png"
             output_path = os.path.join(os.getcwd(), "upload", output_filename)
-            self.generate_image_from_text(prompt, output_path)
+            self.show_latest_messages()
+            # A repeated prompt gets the same seed and so the cached image;
+            # Shift+Send draws a new variation
+            seed = None
+            if QApplication.keyboardModifiers() & Qt.ShiftModifier:
+                seed = random.randrange(2**32)
+            self.generate_image_from_text(prompt, output_path, seed=seed)
             self.db.add_uploaded_file(self.current_chat_id, output_filename)
             self.db.add_message(self.current_chat_id, f"[image:{output_filename}]", 'user')
             self.append_message("You", self.render_image_message(output_filename))
             self.ui.textInput.clear()
             return
 
+        # Enter still reaches here while the send button is disabled; the
+        # text stays in the input until the reply is done
+        if self.reply_busy():
+            return
+        self.show_latest_messages()
+
         if self.current_chat_id is None:
             title = self.generate_chat_title(message or "Image")
             self.current_chat_id = self.db.add_chat(title)
-            self.load_chats()
             self.select_chat_in_list(self.current_chat_id)
             self.ui.chat_title.setText(title)
             self.ui.plainText.clear()
@@ -554,34 +841,41 @@ class MainWindow(QMainWindow):
             self.last_user_message = message
             self.generate_ai_response(message)
 
-    def generate_image_from_text(self, prompt, output_path):
+    def generate_image_from_text(self, prompt, output_path, seed=None):
+        # The window stays usable; progress goes to the status label.
+        # Loads the pipeline on first use if it was not preloaded.
+        self.models.load("sd")
+        self.image_queue.submit(prompt, output_path, chat_id=self.current_chat_id, seed=seed)
+        self.ui.statusLabel.setText(f"🎨 Image queued ({self.image_queue.pending()} pending)")
         self.ui.spinner.start()
         self.ui.spinner.setVisible(True)
-        self.setEnabled(False)
+        self.update_cancel_button()
 
-        self.image_thread = QThread()
-        self.image_worker = ImageWorker(self.sd_pipe, prompt, output_path)
-        self.image_worker.moveToThread(self.image_thread)
-        self.image_worker.finished.connect(self.on_image_generated)
-        self.image_worker.error.connect(self.on_image_error)
-        self.image_thread.started.connect(self.image_worker.run)
-        self.image_thread.start()
+    def on_image_progress(self, job_id, step, total):
+        self.ui.statusLabel.setText(f"🎨 Generating image... step {step}/{total}")
 
-    def on_image_generated(self, output_path):
+    def image_job_done(self, status):
+        if self.image_queue.pending():
+            return
+        self.update_cancel_button()
+        self.ui.statusLabel.setText(status)
         self.ui.spinner.stop()
         self.ui.spinner.setVisible(False)
-        self.setEnabled(True)
-        self.image_thread.quit()
-        self.image_thread.wait()
-        # You may want to update the UI with the new image here
 
-    def on_image_error(self, msg):
-        self.ui.statusLabel.setText(f"❌ Image error: {msg}")
-        self.ui.spinner.stop()
-        self.ui.spinner.setVisible(False)
-        self.setEnabled(True)
-        self.image_thread.quit()
-        self.image_thread.wait()
+    def on_image_generated(self, job_id, output_path):
+        # The <img> was inserted before the file existed: hand the document
+        # the new image and relayout so it shows up in place
+        doc = self.ui.plainText.document()
+        doc.addResource(QTextDocument.ImageResource, QUrl(output_path), QImage(output_path))
+        doc.markContentsDirty(0, doc.characterCount())
+        self.image_job_done("✅ Image ready")
+
+    def on_image_error(self, job_id, msg):
+        print("Image error:", msg)
+        self.image_job_done(f"❌ Image error: {msg}")
+
+    def on_image_cancelled(self, job_id):
+        self.image_job_done("Image cancelled")
 
     def generate_chat_title(self, text):
         words = text.strip().split()
@@ -590,46 +884,90 @@ class MainWindow(QMainWindow):
         return text.strip().capitalize()
     
     def select_chat_in_list(self, chat_id):
-        for i in range(self.ui.listWidget.count()):
-            item = self.ui.listWidget.item(i)
-            if item and item.data(Qt.UserRole) == chat_id:
-                self.ui.listWidget.setCurrentItem(item)
-                break
-
-    def add_to_favorites(self, item):
-        chat_id = self.get_chat_id(item)
+        index = self.chat_model.index_for_chat(chat_id)
+        if index.isValid():
+            self.ui.chatListView.setCurrentIndex(index)
+
+    def add_to_favorites(self, index):
+        chat_id = self.get_chat_id(index)
         if chat_id:
             self.db.toggle_favorite(chat_id)
-            self.load_chats()
 
     def resizeEvent(self, event):
         super().resizeEvent(event)
-        if hasattr(self, "spinner_overlay"):
-            self.spinner_overlay.setGeometry(self.rect())
         self.position_modal_above_button()
 
     def moveEvent(self, event):
         super().moveEvent(event)
         self.position_modal_above_button()
 
-    def on_models_loaded(self, local_llm, sd_pipe):
-        self.local_llm = local_llm
-        self.sd_pipe = sd_pipe
-        self.ui.statusLabel.setText("✅ Ready")
-        self.spinner_overlay.hide()
-        self.setEnabled(True)
-        self.model_loader_thread.quit()
-        self.model_loader_thread.wait()
-
-    def on_model_load_error(self, msg):
-        self.ui.statusLabel.setText(f"❌ Model load error: {msg}")
-        self.spinner_overlay.hide()
-        self.setEnabled(True)
-        self.model_loader_thread.quit()
-        self.model_loader_thread.wait()
+    def closeEvent(self, event):
+        for token in (self.ai_cancel, self.voice_cancel):
+            if token is not None:
+                token.cancel()
+        if self.voice_modal:
+            self.deactivate_voice_input()
+        self.whisper_client.close(shutdown_server=True)
+        self.image_queue.stop(timeout=5)
+        self.scheduler.shutdown()
+        self.db.close()
+        super().closeEvent(event)
+
+    def model_status_text(self):
+        return "   ".join(
+            f"{MODEL_STATE_ICONS[self.models.state(name)]} {label}: {self.models.state(name)}"
+            for name, label in MODEL_LABELS.items()
+        )
+
+    def on_model_state_changed(self, name, state):
+        self.ui.statusLabel.setText(self.model_status_text())
+
+    def on_model_ready(self, name, model):
+        if name == "llm":
+            self.local_llm = model
+            if self.sd_preload == "background":
+                self.models.load("sd")
+            if self.retrieval_available:
+                self.models.load("retrieval")
+            if self.pending_prompt is not None:
+                (prompt, chat_id), self.pending_prompt = self.pending_prompt, None
+                if chat_id == self.current_chat_id:
+                    self.generate_ai_response(prompt)
+                else:
+                    self.ui.sendButton.setEnabled(True)
+                    self.update_cancel_button()
+        elif name == "sd":
+            self.local_sd = model
+            self.image_queue.set_generator(model)
+        elif name == "retrieval":
+            self.retrieval = model
+            model.start()
+
+    def on_model_load_error(self, name, msg):
+        self.ui.statusLabel.setText(f"❌ {MODEL_LABELS[name]} model load error: {msg}")
+        if name == "llm" and self.pending_prompt is not None:
+            self.pending_prompt = None
+            self.ui.sendButton.setEnabled(True)
+            self.update_cancel_button()
+
+def report_window_shown():
+    # Probe mode of --profile-startup: report and quit once the window is up
+    print(f"window shown after {time.perf_counter() - STARTUP_T0:.3f} s", flush=True)
+    QApplication.quit()
+
 
 if __name__ == "__main__":
+    if "--profile-startup" in sys.argv:
+        from startup_profile import profile_startup, print_report
+        print_report(profile_startup(os.path.abspath(__file__)))
+        sys.exit(0)
+
+    probe = os.environ.get("FAMOUSNSFW_STARTUP_PROBE") == "1"
     app = QApplication(sys.argv)
-    window = MainWindow()
+    # Model loading runs in background threads and is measured separately
+    # (benchmarks/bench_startup.py), so the probe leaves it out
+    window = MainWindow(load_models=not probe)
     window.show()
+    if probe:
+        QTimer.singleShot(0, report_window_shown)
     sys.exit(app.exec())
\ No newline at end of file
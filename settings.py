@@ -0,0 +1,159 @@
+import os
+import json
+import copy
+
+# Runtime settings: built-in defaults, overridden by settings.json, then by
+# environment variables. Nested keys are joined with "__" in the variable
+# name, e.g. FAMOUSNSFW_LLM__N_THREADS=16 or
+# FAMOUSNSFW_LLM__GENERATION__MAX_TOKENS=256. Values are parsed as JSON
+# when possible ("true", "512", "null"), otherwise kept as strings.
+SETTINGS_FILE = "settings.json"
+ENV_PREFIX = "FAMOUSNSFW_"
+
+DEFAULTS = {
+    "database": {
+        "path": "chat_app.db",
+    },
+    "llm": {
+        "model_path": os.path.join("models", "llm", "mistral-7b-instruct-v0.1.Q4_K_M.gguf"),
+        "n_ctx": 2048,
+        "n_threads": None,        # None = its share of scheduler.cpu_threads
+        "n_threads_batch": None,  # None = same as n_threads
+        "n_batch": 512,
+        "use_mmap": True,
+        "use_mlock": False,
+        "cache": True,            # reuse responses for identical prompt + params
+        "cache_max_entries": 500,
+        "generation": {
+            "max_tokens": 128,
+            "temperature": 0.7,
+            "top_p": 0.95,
+            "repeat_penalty": 1.1,
+        },
+    },
+    "sd": {
+        "model_path": os.path.join("models", "stable-diffusion", "sd-v1-4.ckpt"),
+        "profile": "balanced",    # quality | balanced | fast (workers/local_sd.py)
+        "preload": "background",  # background (after the LLM) | parallel | lazy (first image)
+        "convert": True,          # load from a safetensors copy, converted on first run
+        "converted_dir": os.path.join("models", "stable-diffusion", "converted"),
+        "convert_dtype": None,    # float32 | float16 | bfloat16, None = runtime dtype
+        "overrides": {},          # per-option overrides of the profile, e.g. {"steps": 20}
+        "n_threads": None,        # None = its share of scheduler.cpu_threads
+        "guidance_scale": 7.5,
+        "cache_dir": os.path.join("upload", "cache"),
+        "cache_max_mb": 1024,     # generated image cache, LRU-evicted
+        "embedding_cache_size": 64,  # prompts whose CLIP embeddings are kept
+    },
+    "retrieval": {
+        # Semantic memory over past chats (workers/retrieval.py): related
+        # earlier messages are added to the prompt. Any GGUF embedding
+        # model works; changing it rebuilds the index in the background.
+        "enabled": True,
+        "model_path": os.path.join("models", "embedding", "all-MiniLM-L6-v2.Q8_0.gguf"),
+        "n_threads": None,        # None = the index share of scheduler.cpu_threads
+        "index_dir": os.path.join("upload", "index"),
+        "batch_size": 32,         # messages embedded per call while indexing
+        "top_k": 4,               # snippets added to a prompt at most
+        "min_score": 0.35,        # cosine similarity below which a hit is ignored
+        "context_tokens": 256,    # prompt budget for the snippets
+    },
+    "scheduler": {
+        "workers": 3,             # inference pool threads (workers/scheduler.py)
+        "cpu_threads": None,      # total CPU thread budget, None = number of physical cores
+        # Split of the budget between the engines, so a chat reply, an image
+        # and a transcription running at once do not oversubscribe cores.
+        # An explicit llm/sd n_threads still wins.
+        "shares": {"llm": 0.45, "sd": 0.3, "whisper": 0.15, "index": 0.1},
+    },
+}
+
+
+def _merge(base, override):
+    for key, value in override.items():
+        if isinstance(value, dict) and isinstance(base.get(key), dict):
+            _merge(base[key], value)
+        else:
+            base[key] = value
+    return base
+
+
+def _parse_env_value(raw):
+    try:
+        return json.loads(raw)
+    except ValueError:
+        return raw
+
+
+def _env_overrides(environ):
+    overrides = {}
+    for name, raw in environ.items():
+        if not name.startswith(ENV_PREFIX):
+            continue
+        path = name[len(ENV_PREFIX):].lower().split("__")
+        node = overrides
+        for key in path[:-1]:
+            node = node.setdefault(key, {})
+        node[path[-1]] = _parse_env_value(raw)
+    return overrides
+
+
+def load_settings(path=SETTINGS_FILE, environ=None):
+    settings = copy.deepcopy(DEFAULTS)
+    if path and os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            _merge(settings, json.load(f))
+    _merge(settings, _env_overrides(os.environ if environ is None else environ))
+    return settings
+
+
+def save_settings(section, values, path=SETTINGS_FILE):
+    # Only writes the given section so unrelated keys in the file survive
+    data = {}
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    _merge(data.setdefault(section, {}), values)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+
+
+def physical_cores():
+    # Hyper-threads do not help llama.cpp / torch matmuls, so count cores
+    try:
+        import psutil
+        cores = psutil.cpu_count(logical=False)
+        if cores:
+            return cores
+    except ImportError:
+        pass
+    try:
+        with open("/proc/cpuinfo", "r") as f:
+            cores = set()
+            physical_id = core_id = None
+            for line in f:
+                key, _, value = line.partition(":")
+                key = key.strip()
+                if key == "physical id":
+                    physical_id = value.strip()
+                elif key == "core id":
+                    core_id = value.strip()
+                elif not key and core_id is not None:
+                    cores.add((physical_id, core_id))
+                    physical_id = core_id = None
+            if core_id is not None:
+                cores.add((physical_id, core_id))
+            if cores:
+                return len(cores)
+    except OSError:
+        pass
+    return max(1, (os.cpu_count() or 2) // 2)
+
+
+def thread_budget(settings=None):
+    # {"llm": n, "sd": n, "whisper": n, "index": n} from the "scheduler" section
+    section = (settings or load_settings())["scheduler"]
+    total = section.get("cpu_threads") or physical_cores()
+    shares = section["shares"]
+    weight = sum(shares.values())
+    return {name: max(1, int(total * share / weight)) for name, share in shares.items()}
@@ -0,0 +1,63 @@
+import os
+import re
+import sys
+import subprocess
+
+# Startup profiling for `python main.py --profile-startup`: runs main.py in
+# a child with `-X importtime` and FAMOUSNSFW_STARTUP_PROBE=1 (the window
+# quits as soon as it is shown) and summarises both.
+
+# Must not be imported before the window is shown; they belong to
+# features that load them on first use.
+HEAVY_MODULES = ("torch", "diffusers", "transformers", "llama_cpp", "faster_whisper",
+                 "sounddevice", "numpy")
+
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def parse_importtime(stderr):
+    """[(module, self_us, cumulative_us, depth)] in import order."""
+    rows = []
+    for line in stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            rows.append((module, int(self_us), int(cumulative_us), (len(indent) - 1) // 2))
+    return rows
+
+
+def profile_startup(script, timeout=120, data_dir=None):
+    env = dict(os.environ, FAMOUSNSFW_STARTUP_PROBE="1")
+    if data_dir is not None:
+        # The child's database and upload folders, instead of the app's own
+        env.update(FAMOUSNSFW_DATABASE__PATH=os.path.join(data_dir, "chat_app.db"),
+                   FAMOUSNSFW_SD__CACHE_DIR=os.path.join(data_dir, "cache"),
+                   FAMOUSNSFW_RETRIEVAL__INDEX_DIR=os.path.join(data_dir, "index"))
+    proc = subprocess.run([sys.executable, "-X", "importtime", script],
+                          cwd=os.path.dirname(script), env=env,
+                          capture_output=True, text=True, timeout=timeout)
+    rows = parse_importtime(proc.stderr)
+    match = re.search(r"window shown after ([\d.]+) s", proc.stdout)
+    top_level = [row for row in rows if row[3] == 0]
+    return {
+        "window_shown": float(match.group(1)) if match else None,
+        "import_seconds": sum(row[2] for row in top_level) / 1e6,
+        "imports": rows,
+        "heavy": sorted({row[0].split(".")[0] for row in rows} & set(HEAVY_MODULES)),
+        "returncode": proc.returncode,
+        "stderr": "\n".join(line for line in proc.stderr.splitlines() if not line.startswith("import time:")),
+    }
+
+
+def print_report(report, top=20):
+    if report["window_shown"] is None:
+        print("window was not shown (exit code", report["returncode"], ")")
+        print(report["stderr"][-2000:])
+        return
+    print(f"window shown after {report['window_shown']:.3f} s "
+          f"({report['import_seconds']:.3f} s of it in top-level imports)")
+    print(f"heavy modules imported at startup: {', '.join(report['heavy']) or 'none'}")
+    print("\nslowest top-level imports (cumulative):")
+    top_level = sorted((row for row in report["imports"] if row[3] == 0), key=lambda row: -row[2])
+    for module, self_us, cumulative_us, _ in top_level[:top]:
+        print(f"  {cumulative_us / 1000:8.1f} ms  {module}")
@@ -0,0 +1,157 @@
+import time
+import threading
+import numpy as np
+import sounddevice as sd
+
+
+class CaptureRingBuffer:
+    """Single-producer / single-consumer int16 ring buffer.
+
+    The PortAudio callback is the only writer of write_pos and the sender
+    thread the only writer of read_pos; each index is published after the
+    samples are copied, so neither side ever takes a lock. When the
+    consumer falls behind, new samples are dropped (and counted) rather
+    than blocking the realtime thread.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.data = np.zeros(capacity, dtype=np.int16)
+        self.write_pos = 0  # total samples ever written
+        self.read_pos = 0   # total samples ever read
+        self.dropped = 0
+
+    def available(self):
+        return self.write_pos - self.read_pos
+
+    def write(self, samples):
+        n = len(samples)
+        free = self.capacity - (self.write_pos - self.read_pos)
+        if n > free:
+            self.dropped += n - free
+            samples = samples[:free]
+            n = free
+        if n == 0:
+            return
+        pos = self.write_pos % self.capacity
+        first = min(n, self.capacity - pos)
+        self.data[pos:pos + first] = samples[:first]
+        self.data[:n - first] = samples[first:]
+        self.write_pos += n
+
+    def read(self, max_samples=None):
+        n = self.write_pos - self.read_pos
+        if max_samples is not None:
+            n = min(n, max_samples)
+        pos = self.read_pos % self.capacity
+        first = min(n, self.capacity - pos)
+        out = np.concatenate((self.data[pos:pos + first], self.data[:n - first]))
+        self.read_pos += n
+        return out
+
+    def latest(self, n):
+        # Most recent n samples, for metering; never advances read_pos
+        end = self.write_pos
+        n = min(n, end, self.capacity)
+        pos = (end - n) % self.capacity
+        first = min(n, self.capacity - pos)
+        return np.concatenate((self.data[pos:pos + first], self.data[:n - first]))
+
+
+class AudioCapture:
+    """Microphone capture where the PortAudio callback only copies into a
+    preallocated ring buffer. A sender thread drains it every
+    `batch_seconds` and hands larger chunks to on_audio_chunk(bytes), so a
+    slow consumer (socket, daemon) can never stall the audio thread.
+    on_finished() runs on the sender thread after the last chunk."""
+
+    def __init__(self, on_audio_chunk, on_finished=None, samplerate=16000, blocksize=1024,
+                 buffer_seconds=10, batch_seconds=0.1):
+        self.on_audio_chunk = on_audio_chunk
+        self.on_finished = on_finished
+        self.samplerate = samplerate
+        self.blocksize = blocksize
+        self.batch_seconds = batch_seconds
+        self.ring = CaptureRingBuffer(int(buffer_seconds * samplerate))
+        self.stream = None
+        self.sender = None
+        self.running = False
+        # PortAudio status flags seen by the callback
+        self.input_overflows = 0
+        self.input_underflows = 0
+        self.batches_sent = 0
+
+    def has_input_device(self):
+        devices = sd.query_devices()
+        return any(d['max_input_channels'] > 0 for d in devices)
+
+    def start(self):
+        self.running = True
+        self.stream = sd.InputStream(
+            samplerate=self.samplerate,
+            channels=1,
+            dtype='int16',
+            callback=self.audio_callback,
+            blocksize=self.blocksize
+        )
+        self.sender = threading.Thread(target=self._send_loop, daemon=True)
+        self.sender.start()
+        self.stream.start()
+
+    def audio_callback(self, indata, frames, time_info, status):
+        # Realtime thread: copy and count, nothing else
+        if status:
+            if status.input_overflow:
+                self.input_overflows += 1
+            if status.input_underflow:
+                self.input_underflows += 1
+        if self.running:
+            self.ring.write(indata[:, 0])
+
+    def _send_loop(self):
+        while self.running:
+            time.sleep(self.batch_seconds)
+            self._drain()
+        self._drain()
+        if self.on_finished:
+            self.on_finished()
+
+    def _drain(self):
+        if self.ring.available() == 0:
+            return
+        samples = self.ring.read()
+        try:
+            self.on_audio_chunk(samples.tobytes())
+            self.batches_sent += 1
+        except Exception as e:
+            print("Audio send error:", e)
+
+    def level(self):
+        # L2 norm of the newest block (the scale the waveform meter expects);
+        # called from the Qt timer, not the audio thread
+        samples = self.ring.latest(self.blocksize).astype(np.float32)
+        return float(np.linalg.norm(samples))
+
+    def stop(self):
+        if self.stream is not None:
+            try:
+                self.stream.stop()
+                self.stream.close()
+            except Exception as e:
+                print("Stream close error:", e)
+            self.stream = None
+        self.running = False
+        # Does not wait: the sender flushes what is left (possibly waiting
+        # on the consumer) and then calls on_finished itself
+        if self.sender is None and self.on_finished:
+            self.on_finished()
+        self.sender = None
+
+    def stats(self):
+        return {
+            "dropped_samples": self.ring.dropped,
+            "input_overflows": self.input_overflows,
+            "input_underflows": self.input_underflows,
+            "buffered_samples": self.ring.available(),
+            "batches_sent": self.batches_sent,
+        }
@@ -0,0 +1,207 @@
+import bisect
+from PySide6.QtCore import Qt, QAbstractListModel, QModelIndex, QSize
+from PySide6.QtGui import QFont, QBrush, QColor
+
+# Chat rows expose their chat id in Qt.UserRole and the favorite flag here
+FAVORITE_ROLE = Qt.UserRole + 1
+
+FAVORITES_HEADER = "★ Favorites"
+ALL_CHATS_HEADER = "— All Chats"
+
+
+class ChatEntry:
+    __slots__ = ("chat_id", "title", "is_favorite")
+
+    def __init__(self, chat_id, title, is_favorite):
+        self.chat_id = chat_id
+        self.title = title
+        self.is_favorite = is_favorite
+
+
+def _sort_key(entry):
+    # Newest first, same as get_chats (ids grow with created_at)
+    return -entry.chat_id
+
+
+class ChatListModel(QAbstractListModel):
+    """Sidebar model: a favorites section and an all-chats section, each
+    with a header row, updated row by row from DatabaseManager signals.
+
+    Layout:  [fav header] favorites...  [all header] regular...
+    (a header is only present while its section is non-empty)
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._favorites = []
+        self._regular = []
+        self._entries = {}  # chat_id -> ChatEntry
+        self.header_font = QFont("Arial", 11, QFont.Bold)
+        self.header_brush = QBrush(QColor(Qt.lightGray))
+
+    # --- row arithmetic ---
+
+    def _section(self, is_favorite):
+        return self._favorites if is_favorite else self._regular
+
+    def _section_start(self, is_favorite):
+        # Row of the first chat in the section (just below its header)
+        if is_favorite:
+            return 1
+        return (len(self._favorites) + 1 if self._favorites else 0) + 1
+
+    def _row_of(self, entry):
+        section = self._section(entry.is_favorite)
+        pos = bisect.bisect_left(section, _sort_key(entry), key=_sort_key)
+        return self._section_start(entry.is_favorite) + pos
+
+    def _entry_at(self, row):
+        if row < 0:
+            return None
+        if self._favorites:
+            if row == 0:
+                return FAVORITES_HEADER
+            if row <= len(self._favorites):
+                return self._favorites[row - 1]
+            row -= len(self._favorites) + 1
+        if not self._regular:
+            return None
+        if row == 0:
+            return ALL_CHATS_HEADER
+        if row <= len(self._regular):
+            return self._regular[row - 1]
+        return None
+
+    # --- Qt model interface ---
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        count = 0
+        if self._favorites:
+            count += len(self._favorites) + 1
+        if self._regular:
+            count += len(self._regular) + 1
+        return count
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        entry = self._entry_at(index.row())
+        if entry is None:
+            return None
+        if isinstance(entry, str):
+            if role == Qt.DisplayRole:
+                return entry
+            if role == Qt.FontRole:
+                return self.header_font
+            if role == Qt.BackgroundRole:
+                return self.header_brush
+            if role == Qt.TextAlignmentRole:
+                return int(Qt.AlignBottom | Qt.AlignLeft)
+            if role == Qt.SizeHintRole and entry == ALL_CHATS_HEADER:
+                return QSize(0, 40)
+            return None
+        if role in (Qt.DisplayRole, Qt.EditRole):
+            return entry.title
+        if role == Qt.UserRole:
+            return entry.chat_id
+        if role == FAVORITE_ROLE:
+            return entry.is_favorite
+        return None
+
+    def flags(self, index):
+        if index.isValid() and isinstance(self._entry_at(index.row()), ChatEntry):
+            return Qt.ItemIsEnabled | Qt.ItemIsSelectable
+        return Qt.NoItemFlags
+
+    # --- lookups ---
+
+    def index_for_chat(self, chat_id):
+        entry = self._entries.get(chat_id)
+        if entry is None:
+            return QModelIndex()
+        return self.index(self._row_of(entry))
+
+    def chat_count(self):
+        return len(self._entries)
+
+    # --- updates ---
+
+    def reset_chats(self, favorite_chats, regular_chats):
+        self.beginResetModel()
+        self._favorites = [ChatEntry(cid, title, True) for cid, title in favorite_chats]
+        self._regular = [ChatEntry(cid, title, False) for cid, title in regular_chats]
+        self._favorites.sort(key=_sort_key)
+        self._regular.sort(key=_sort_key)
+        self._entries = {e.chat_id: e for e in self._favorites + self._regular}
+        self.endResetModel()
+
+    def _insert(self, entry):
+        section = self._section(entry.is_favorite)
+        if not section:
+            header_row = self._section_start(entry.is_favorite) - 1
+            self.beginInsertRows(QModelIndex(), header_row, header_row + 1)
+            section.append(entry)
+            self.endInsertRows()
+            return
+        row = self._row_of(entry)
+        self.beginInsertRows(QModelIndex(), row, row)
+        bisect.insort(section, entry, key=_sort_key)
+        self.endInsertRows()
+
+    def _remove(self, entry):
+        section = self._section(entry.is_favorite)
+        row = self._row_of(entry)
+        if len(section) == 1:
+            # Last chat in the section: drop its header as well
+            self.beginRemoveRows(QModelIndex(), row - 1, row)
+        else:
+            self.beginRemoveRows(QModelIndex(), row, row)
+        section.pop(row - self._section_start(entry.is_favorite))
+        self.endRemoveRows()
+
+    def add_chat(self, chat_id, title, is_favorite=False):
+        if chat_id in self._entries:
+            return
+        entry = ChatEntry(chat_id, title, is_favorite)
+        self._entries[chat_id] = entry
+        self._insert(entry)
+
+    def rename_chat(self, chat_id, title):
+        entry = self._entries.get(chat_id)
+        if entry is None:
+            return
+        entry.title = title
+        index = self.index(self._row_of(entry))
+        self.dataChanged.emit(index, index, [Qt.DisplayRole, Qt.EditRole])
+
+    def remove_chat(self, chat_id):
+        entry = self._entries.pop(chat_id, None)
+        if entry is not None:
+            self._remove(entry)
+
+    def set_favorite(self, chat_id, is_favorite):
+        entry = self._entries.get(chat_id)
+        if entry is None or entry.is_favorite == is_favorite:
+            return
+        source = self._section(entry.is_favorite)
+        target = self._section(is_favorite)
+        if len(source) == 1 or not target:
+            # A header appears or disappears: not expressible as one move
+            self._remove(entry)
+            entry.is_favorite = is_favorite
+            self._insert(entry)
+            return
+
+        src_row = self._row_of(entry)
+        pos = bisect.bisect_left(target, _sort_key(entry), key=_sort_key)
+        dest_row = self._section_start(is_favorite) + pos
+        # beginMoveRows takes the destination in pre-move coordinates
+        self.beginMoveRows(QModelIndex(), src_row, src_row, QModelIndex(), dest_row)
+        source.pop(src_row - self._section_start(entry.is_favorite))
+        entry.is_favorite = is_favorite
+        target.insert(pos, entry)
+        self.endMoveRows()
+        index = self.index(self._row_of(entry))
+        self.dataChanged.emit(index, index, [FAVORITE_ROLE])
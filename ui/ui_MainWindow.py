@@ -6,10 +6,11 @@ from PySide6.QtCore import (QCoreApplication, QMetaObject, Qt, QSize)
 from PySide6.QtGui import QFont, QTextOption, QIcon
 from PySide6.QtWidgets import (
     QHBoxLayout, QVBoxLayout, QWidget, QMainWindow, QLabel,
-    QPushButton, QListWidget, QTextEdit, QListWidgetItem,
+    QPushButton, QListView, QListWidget, QTextEdit,
     QLineEdit, QFrame, QSizePolicy, QMenu, QInputDialog, 
 )
 from ui.custom_text_input import ChatTextInput
+from ui.spinner_widget import Spinner
 
 class Ui_MainWindow(object):
     def setupUi(self, MainWindow):
@@ -88,10 +89,26 @@ class Ui_MainWindow(object):
         self.separator.setFrameShadow(QFrame.Sunken)
         self.sidebar_layout.addWidget(self.separator)
 
-        # Chat History List
-        self.listWidget = QListWidget()
-        self.listWidget.setFont(self.list_font)
-        self.listWidget.setStyleSheet("""
+        # Search over all messages; results replace the chat list while
+        # there is a query
+        self.searchInput = QLineEdit()
+        self.searchInput.setFont(self.list_font)
+        self.searchInput.setPlaceholderText("Search chats...")
+        self.searchInput.setClearButtonEnabled(True)
+        self.searchInput.setStyleSheet("""
+            QLineEdit {
+                border: 1px solid #d0d0d0;
+                border-radius: 5px;
+                padding: 6px;
+            }
+        """)
+        self.sidebar_layout.addWidget(self.searchInput)
+
+        self.searchResultsView = QListWidget()
+        self.searchResultsView.setFont(self.list_font)
+        self.searchResultsView.setWordWrap(True)
+        self.searchResultsView.setVisible(False)
+        self.searchResultsView.setStyleSheet("""
             QListWidget {
                 border: none;
                 background: transparent;
@@ -104,8 +121,29 @@ class Ui_MainWindow(object):
                 background-color: #e8e8e8;
             }
         """)
-        self.listWidget.addItems(["Chat 1", "Chat 2", "Chat 3"])
-        self.sidebar_layout.addWidget(self.listWidget)
+        self.sidebar_layout.addWidget(self.searchResultsView)
+
+        # Chat History List (model set by MainWindow)
+        self.chatListView = QListView()
+        self.chatListView.setFont(self.list_font)
+        # Lay out rows in batches so very long histories stay responsive
+        self.chatListView.setLayoutMode(QListView.Batched)
+        self.chatListView.setBatchSize(200)
+        self.chatListView.setEditTriggers(QListView.NoEditTriggers)
+        self.chatListView.setStyleSheet("""
+            QListView {
+                border: none;
+                background: transparent;
+            }
+            QListView::item {
+                padding: 8px;
+                border-bottom: 1px solid #e0e0e0;
+            }
+            QListView::item:hover {
+                background-color: #e8e8e8;
+            }
+        """)
+        self.sidebar_layout.addWidget(self.chatListView)
 
         # Hide Sidebar Button
         self.hideSidebarButton = QPushButton("Hide Sidebar")
@@ -266,6 +304,10 @@ class Ui_MainWindow(object):
         """)
 
         self.statusLabel = QLabel("")
+        # Shown next to the status while image jobs are pending
+        self.spinner = Spinner()
+        self.spinner.setFixedSize(24, 24)
+        self.spinner.movie.setScaledSize(QSize(24, 24))
         self.retryButton = QPushButton("🔁 Retry")
         self.cancelButton = QPushButton("❌ Cancel")
 
@@ -286,6 +328,7 @@ class Ui_MainWindow(object):
 
         # Send & controls
         self.inputLayout.addWidget(self.sendButton)
+        self.inputLayout.addWidget(self.spinner)
         self.inputLayout.addWidget(self.statusLabel)
         self.inputLayout.addWidget(self.retryButton)
         self.inputLayout.addWidget(self.cancelButton)
@@ -1,30 +1,59 @@
 from PySide6.QtCore import QObject, Signal
-import time
+
+from workers.cancellation import CancellationToken, CancelledError
+
+CANCELLED_TEXT = "[⚠️ Cancelled]"
+
 
 class AIWorker(QObject):
-    partial = Signal(str)
-    finished = Signal(str)
+    partial = Signal(str)   # new text since the previous emission (delta)
+    finished = Signal(str)  # full response
     error = Signal(str)
 
-    def __init__(self, llm, prompt):
+    def __init__(self, llm, prompt, chat_id=None, history=None, force=False, cancel=None,
+                 retrieval=None, exclude_ids=()):
         super().__init__()
         self.llm = llm
         self.prompt = prompt
-        self._abort = False
+        self.chat_id = chat_id
+        self.history = history  # (content, sender) rows; enables chat mode
+        self.force = force      # bypass the response cache
+        self.cancel = cancel or CancellationToken()
+        self.retrieval = retrieval      # RetrievalIndex, adds related earlier messages
+        self.exclude_ids = exclude_ids  # ids of the history rows, already in the prompt
 
     def run(self):
+        stream = None
         try:
-            output = ""
-            for word in self.llm.ask(self.prompt, stream=True):
-                if self._abort:
-                    self.finished.emit("[⚠️ Cancelled]")
-                    return
-                output += word
-                self.partial.emit(output)
-                time.sleep(0.01)  # smooth typing
-            self.finished.emit(output)
+            chunks = []
+            if self.history:
+                stream = self.llm.chat(self.chat_id, self.history, stream=True, force=self.force,
+                                       cancel=self.cancel, context=self.related_context())
+            else:
+                stream = self.llm.ask(self.prompt, stream=True, force=self.force, cancel=self.cancel)
+            for word in stream:
+                # Also covers cached replays, which never reach llama.cpp
+                self.cancel.raise_if_cancelled()
+                chunks.append(word)
+                self.partial.emit(word)
+            self.finished.emit("".join(chunks))
+        except CancelledError:
+            self.finished.emit(CANCELLED_TEXT)
         except Exception as e:
             self.error.emit(str(e))
+        finally:
+            if stream is not None and hasattr(stream, "close"):
+                stream.close()
+
+    def related_context(self):
+        if self.retrieval is None:
+            return ""
+        try:
+            return self.retrieval.context_for(self.prompt, self.llm.count_tokens, self.exclude_ids)
+        except Exception as e:
+            # The reply is still useful without it
+            print("Retrieval error:", e)
+            return ""
 
     def abort(self):
-        self._abort = True
\ No newline at end of file
+        self.cancel.cancel()
@@ -0,0 +1,53 @@
+import threading
+
+
+class CancelledError(Exception):
+    pass
+
+
+class CancellationToken:
+    """Shared by the UI (which cancels) and a running job (which checks).
+
+    Each backend hooks it where it can stop soonest: llama.cpp through
+    stopping_criteria (checked every token), diffusers through the
+    step-end callback (every denoising step) and the whisper client by
+    dropping the session (on_cancel).
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks = []
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def cancel(self):
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                print("Cancel callback error:", e)
+
+    def on_cancel(self, callback):
+        # Runs callback on cancel(), or right away if already cancelled
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def raise_if_cancelled(self):
+        if self._event.is_set():
+            raise CancelledError()
+
+    def stopping_criteria(self):
+        # llama_cpp stopping_criteria: ends generation after the current token
+        from llama_cpp import StoppingCriteriaList
+        return StoppingCriteriaList([lambda input_ids, logits: self._event.is_set()])
@@ -0,0 +1,105 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import threading
+
+
+def cache_key(model_id, profile, scheduler, prompt, params):
+    """Content key of one generated image. params are the resolved
+    generation parameters (LocalSD.generation_params plus the seed)."""
+    fields = {
+        "model": model_id,
+        "profile": profile,
+        "scheduler": scheduler,
+        "prompt": prompt,
+        "negative_prompt": params.get("negative_prompt"),
+        "seed": params.get("seed"),
+        "steps": params.get("num_inference_steps"),
+        "guidance_scale": params.get("guidance_scale"),
+        "width": params.get("width"),
+        "height": params.get("height"),
+    }
+    return hashlib.sha256(json.dumps(fields, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class ImageCache:
+    """Generated images by content key, stored as files in `directory` and
+    indexed in the image_cache table. The total size is kept under
+    `max_bytes` by evicting the least recently used entries."""
+
+    def __init__(self, db, directory, max_bytes):
+        self.db = db
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.deduped = 0
+        self.evictions = 0
+
+    def get(self, key, record_miss=True):
+        path = self.db.get_cached_image(key, time.time())
+        if path is not None and not os.path.exists(path):
+            # Deleted behind our back
+            self.db.delete_cached_image(key)
+            path = None
+        with self._lock:
+            if path is not None:
+                self.hits += 1
+            elif record_miss:
+                self.misses += 1
+        return path
+
+    def copy_to(self, key, output_path, record_miss=True):
+        # Serves a cache hit into output_path; False on a miss
+        path = self.get(key, record_miss)
+        if path is None:
+            return False
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        shutil.copyfile(path, output_path)
+        return True
+
+    def put(self, key, source_path):
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, key + os.path.splitext(source_path)[1])
+        shutil.copyfile(source_path, path)
+        self.db.add_cached_image(key, path, os.path.getsize(path), time.time())
+        self.evict()
+
+    def record_dedupe(self, count=1):
+        # Identical requests served by one generation
+        with self._lock:
+            self.deduped += count
+
+    def evict(self):
+        entries, total = self.db.get_image_cache_size()
+        while total > self.max_bytes and entries:
+            rows = self.db.get_lru_cached_images()
+            for key, path, size in rows:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                self.db.delete_cached_image(key)
+                total -= size
+                entries -= 1
+                with self._lock:
+                    self.evictions += 1
+
+    def stats(self):
+        entries, total = self.db.get_image_cache_size()
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "deduped": self.deduped,
+                "evictions": self.evictions,
+                "entries": entries,
+                "bytes": total,
+            }
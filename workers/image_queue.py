@@ -0,0 +1,316 @@
+import os
+import json
+import shutil
+import hashlib
+import threading
+from PySide6.QtCore import QObject, Signal, QTimer
+
+from workers.image_cache import cache_key
+from workers.cancellation import CancellationToken, CancelledError
+from workers.scheduler import IMAGE
+
+# Generation parameters that must match for jobs to share one pipeline call
+# (the seed is per image, so it is not part of the key).
+BATCH_KEYS = ("num_inference_steps", "guidance_scale", "negative_prompt", "width", "height")
+
+
+def batch_key(params):
+    return tuple(params.get(key) for key in BATCH_KEYS)
+
+
+def default_seed(prompt, params):
+    # Same request, same seed: a repeated prompt is then answered from the
+    # image cache (or shares a queued generation) instead of drawing a
+    # new image. Pass a seed explicitly for another variation.
+    fields = {"prompt": prompt, "params": {k: v for k, v in params.items() if k != "seed"}}
+    digest = hashlib.sha256(json.dumps(fields, sort_keys=True, default=str).encode("utf-8")).digest()
+    return int.from_bytes(digest[:4], "big")
+
+
+class ImageJobQueue(QObject):
+    """Image generation queue persisted in the image_jobs table.
+
+    One background thread runs the jobs, batching queued prompts with the
+    same generation parameters into a single pipeline call. Jobs survive a
+    restart: whatever was queued or running is picked up again once the
+    pipeline is available (set_generator).
+
+    With an ImageCache, a request identical to one already generated is
+    answered from the cache, and identical queued requests are generated
+    once. With an InferenceScheduler, the pipeline calls run on its pool
+    at image priority, behind waiting chat replies and voice sessions.
+    """
+
+    progress = Signal(int, int, int)   # job_id, step, total steps
+    finished = Signal(int, str)        # job_id, output path
+    failed = Signal(int, str)          # job_id, message
+    cancelled = Signal(int)            # job_id
+
+    def __init__(self, db, cache=None, max_batch=4, scheduler=None, parent=None):
+        super().__init__(parent)
+        self.db = db
+        self.cache = cache
+        self.scheduler = scheduler
+        self.max_batch = max_batch
+        self.local_sd = None
+        self._cond = threading.Condition()
+        self._stopping = False
+        self._dirty = True       # the table may hold queued jobs
+        self._running = {}       # job_id -> (step, total) of the current batch
+        self._cancelled = set()  # running jobs the user cancelled
+        self._token = None       # cancels the running batch
+        self._thread = None
+
+    def start(self):
+        self.db.requeue_image_jobs()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def set_generator(self, local_sd):
+        with self._cond:
+            self.local_sd = local_sd
+            self._cond.notify_all()
+
+    def stop(self, timeout=None):
+        # A batch in progress is interrupted at its next step and its jobs
+        # go back to "queued" for the next start
+        with self._cond:
+            self._stopping = True
+            token = self._token
+            self._cond.notify_all()
+        if token is not None:
+            token.cancel()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    # --- API ---
+
+    def submit(self, prompt, output_path, chat_id=None, **params):
+        """Queue one image; params are LocalSD generation parameters
+        (seed, num_inference_steps, negative_prompt, width, height, ...).
+        Without a seed, one derived from prompt and params is stored."""
+        if params.get("seed") is None:
+            params["seed"] = default_seed(prompt, params)
+        key = self._cache_key(prompt, params)
+        # A miss here is looked up (and counted) again when the job runs
+        if key is not None and self._copy_cached(key, output_path, record_miss=False):
+            # Served right away, without waiting behind running jobs
+            with self.db.batch():
+                job_id = self.db.add_image_job(chat_id, prompt, params, output_path)
+                self.db.set_image_job_status(job_id, "done")
+            # Announced from the event loop, after the caller has shown
+            # the job as queued (as for any other job)
+            QTimer.singleShot(0, lambda: self.finished.emit(job_id, output_path))
+            return job_id
+        job_id = self.db.add_image_job(chat_id, prompt, params, output_path)
+        with self._cond:
+            self._dirty = True
+            self._cond.notify_all()
+        return job_id
+
+    def cancel(self, job_id):
+        if self.db.cancel_queued_image_job(job_id):
+            self.cancelled.emit(job_id)
+            return True
+        with self._cond:
+            if job_id not in self._running:
+                return False
+            self._cancelled.add(job_id)
+            # The pipeline stops at the next step once nobody wants its images
+            token = self._token if self._cancelled.issuperset(self._running) else None
+        if token is not None:
+            token.cancel()
+        return True
+
+    def cancel_all(self):
+        # Queued jobs first, so none of them starts once the batch stops
+        job_ids = [job[0] for job in self.db.get_queued_image_jobs()]
+        with self._cond:
+            job_ids += list(self._running)
+        return sum(self.cancel(job_id) for job_id in job_ids)
+
+    def status(self, job_id):
+        """{"status", "step", "steps", "error", "output_path"} or None."""
+        job = self.db.get_image_job(job_id)
+        if job is None:
+            return None
+        _, _, _, _, output_path, status, error = job
+        with self._cond:
+            step, total = self._running.get(job_id, (0, 0))
+        return {"status": status, "step": step, "steps": total, "error": error, "output_path": output_path}
+
+    def pending(self):
+        # Jobs queued or running
+        with self._cond:
+            running = len(self._running)
+        return running + len(self.db.get_queued_image_jobs())
+
+    # --- worker thread ---
+
+    def _cache_key(self, prompt, params):
+        local_sd = self.local_sd
+        if self.cache is None or local_sd is None:
+            return None
+        return cache_key(local_sd.model_id, local_sd.profile, local_sd.options["scheduler"],
+                         prompt, local_sd.generation_params(**params))
+
+    def _copy_cached(self, key, output_path, record_miss=True):
+        # A cache entry that cannot be copied is treated as a miss: the
+        # image is generated again
+        try:
+            return self.cache.copy_to(key, output_path, record_miss)
+        except OSError as e:
+            print("Image cache error:", e)
+            return False
+
+    def _next_batch(self):
+        jobs = self.db.get_queued_image_jobs()
+        if not jobs:
+            return []
+        key = batch_key(jobs[0][3])
+        return [job for job in jobs if batch_key(job[3]) == key][:self.max_batch]
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._stopping and (self.local_sd is None or not self._dirty):
+                    self._cond.wait()
+                if self._stopping:
+                    return
+                self._dirty = False
+            try:
+                batch = self._next_batch()
+                if batch:
+                    self._run_batch(batch)
+            except Exception as e:
+                # Keep the thread alive; the next submit() tries again
+                print("Image queue error:", e)
+                continue
+            if batch:
+                # Other parameter groups may still be waiting
+                with self._cond:
+                    self._dirty = True
+
+    def _on_step(self, job_ids, step, total):
+        with self._cond:
+            for job_id in job_ids:
+                self._running[job_id] = (step, total)
+        for job_id in job_ids:
+            self.progress.emit(job_id, step, total)
+
+    def _run_batch(self, batch):
+        job_ids = [job[0] for job in batch]
+        token = CancellationToken()
+        with self._cond:
+            for job_id in job_ids:
+                self._running[job_id] = (0, 0)
+            self._token = token
+            if self._stopping:
+                token.cancel()
+        try:
+            outputs, errors = self._generate(batch, job_ids, token)
+        except Exception as e:
+            # Database error: the whole batch fails below
+            print("Image job error:", e)
+            outputs, errors = {}, {job_id: str(e) for job_id in job_ids}
+
+        with self._cond:
+            self._token = None
+            stopping = self._stopping
+            cancelled = {job_id for job_id in job_ids if job_id in self._cancelled}
+            self._cancelled -= cancelled
+            for job_id in job_ids:
+                self._running.pop(job_id, None)
+
+        for job_id in job_ids:
+            error = errors.get(job_id)
+            try:
+                if job_id in cancelled:
+                    self.db.set_image_job_status(job_id, "cancelled")
+                    self.cancelled.emit(job_id)
+                elif job_id in outputs:
+                    self.db.set_image_job_status(job_id, "done")
+                    self.finished.emit(job_id, outputs[job_id])
+                elif stopping and error is None:
+                    # Interrupted by stop(): resume on the next start
+                    self.db.set_image_job_status(job_id, "queued")
+                else:
+                    self.db.set_image_job_status(job_id, "failed", error)
+                    self.failed.emit(job_id, error or "image was not generated")
+            except Exception as e:
+                print("Image job error:", e)
+                self.failed.emit(job_id, str(e))
+
+    def _generate(self, batch, job_ids, token):
+        # Runs the pipeline for the batch: ({job_id: image path},
+        # {job_id: error message}) for the jobs that got one
+        with self.db.batch():
+            for job_id in job_ids:
+                self.db.set_image_job_status(job_id, "running")
+
+        # Cache hits are answered without the pipeline and identical
+        # requests in the batch share one generated image
+        outputs = {}      # job_id -> finished image path
+        to_generate = []  # (job, key)
+        primary = {}      # key -> job_id generating it
+        duplicates = []   # (job, key)
+        for job in batch:
+            job_id, _, prompt, params, output_path, _, _ = job
+            key = self._cache_key(prompt, params)
+            if key is not None and key in primary:
+                duplicates.append((job, key))
+            elif key is not None and self._copy_cached(key, output_path):
+                outputs[job_id] = output_path
+            else:
+                if key is not None:
+                    primary[key] = job_id
+                to_generate.append((job, key))
+
+        errors = {}
+        if to_generate:
+            params = dict(to_generate[0][0][3])
+            params.pop("seed", None)
+            args = ([job[2] for job, _ in to_generate], [job[3]["seed"] for job, _ in to_generate])
+            params.update(on_step=lambda step, total: self._on_step(job_ids, step, total), cancel=token)
+            try:
+                if self.scheduler is not None:
+                    images = self.scheduler.run(IMAGE, self.local_sd.generate_batch, *args, **params)
+                else:
+                    images = self.local_sd.generate_batch(*args, **params)
+            except CancelledError:
+                images = None
+            except Exception as e:
+                images = None
+                errors = {job[0]: str(e) for job, _ in to_generate}
+                print("Image generation error:", e)
+            for index, (job, key) in enumerate(to_generate if images is not None else []):
+                output_path = job[4]
+                try:
+                    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+                    images[index].save(output_path)
+                except OSError as e:
+                    print("Image save error:", e)
+                    errors[job[0]] = str(e)
+                    continue
+                outputs[job[0]] = output_path
+                if key is not None:
+                    try:
+                        self.cache.put(key, output_path)
+                    except Exception as e:
+                        # The image is there, only the next request misses
+                        print("Image cache error:", e)
+        for job, key in duplicates:
+            source = outputs.get(primary[key])
+            if source is None:
+                errors[job[0]] = errors.get(primary[key])
+                continue
+            try:
+                os.makedirs(os.path.dirname(job[4]), exist_ok=True)
+                shutil.copyfile(source, job[4])
+            except OSError as e:
+                print("Image save error:", e)
+                errors[job[0]] = str(e)
+                continue
+            outputs[job[0]] = job[4]
+            self.cache.record_dedupe()
+        return outputs, errors
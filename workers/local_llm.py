@@ -1,15 +1,102 @@
+from collections import OrderedDict
 from llama_cpp import Llama
 import os
+import sys
+import time
+import threading
+
+from settings import load_settings, save_settings, physical_cores, thread_budget
+from workers.response_cache import ResponseCache, model_hash
+
+# Mistral-instruct turn format. BOS is added by the tokenizer.
+USER_TURN = "[INST] {content} [/INST]"
+AI_TURN = " {content}</s>"
+# Turns dropped at a time when a chat outgrows the context: the prompt
+# prefix, and with it the chat's saved KV state, then stays valid for
+# several turns instead of changing on every one
+DROP_TURNS = 16
+# Retrieved earlier messages (workers/retrieval.py), put in front of the
+# latest user message so the turns before it keep their cached KV state.
+# They come from other chats and from the part of this chat that is no
+# longer in the prompt; each line names its chat.
+CONTEXT_TEMPLATE = "Related earlier messages:\n{context}\n\n{content}"
+
+
+def resolve_threads(settings):
+    n_threads = settings.get("n_threads") or thread_budget()["llm"]
+    n_threads_batch = settings.get("n_threads_batch") or n_threads
+    return n_threads, n_threads_batch
+
 
 class LocalLLM:
-    def __init__(self):
-        model_path = os.path.join("models", "llm", "mistral-7b-instruct-v0.1.Q4_K_M.gguf")
-        self.model = Llama(model_path=model_path, n_ctx=2048, n_threads=4)
+    def __init__(self, settings=None, max_sessions=2, db=None):
+        # settings: the "llm" section of settings.load_settings(); with a
+        # DatabaseManager, responses are cached (see ResponseCache)
+        self.settings = settings or load_settings()["llm"]
+        self.n_threads, self.n_threads_batch = resolve_threads(self.settings)
+        self.model = Llama(
+            model_path=self.settings["model_path"],
+            n_ctx=self.settings["n_ctx"],
+            n_threads=self.n_threads,
+            n_threads_batch=self.n_threads_batch,
+            n_batch=self.settings["n_batch"],
+            use_mmap=self.settings["use_mmap"],
+            use_mlock=self.settings["use_mlock"],
+            verbose=False,
+        )
+        # Saved llama.cpp states (KV cache) of recently used chats, LRU.
+        # Each one holds the whole KV cache, so keep only a few.
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()
+        self._active_chat = None
+        # The llama.cpp context is not thread-safe and the scheduler pool
+        # has several workers: one generation (with its KV state swap) at
+        # a time. Reentrant, chat() takes it before _stream() does.
+        self._lock = threading.RLock()
+
+        self.cache = None
+        if db is not None and self.settings.get("cache", True):
+            self.cache = ResponseCache(db, model_hash(self.settings["model_path"]),
+                                       self.settings.get("cache_max_entries", 500))
 
-    def ask(self, prompt: str, stream=False, **kwargs):
-        # kwargs can include max_tokens, temperature, etc.
+    def generation_params(self, **kwargs):
+        # Configured defaults, overridden per request (max_tokens, temperature,
+        # top_p, repeat_penalty, seed, stop, ... - anything create_completion takes)
+        params = dict(self.settings["generation"])
+        params.update(kwargs)
+        return params
+
+    def ask(self, prompt: str, stream=False, force=False, cancel=None, **kwargs):
+        # force: regenerate even if the response is cached
+        # cancel: CancellationToken, stops generation after the current token
+        produce = lambda params: self._stream(prompt, params, cancel)
+        return self._generate(prompt, produce, stream, force, cancel, kwargs)
+
+    def _generate(self, prompt, produce, stream, force, cancel, kwargs):
+        params = self.generation_params(**kwargs)
+        if self.cache is not None:
+            chunks = self.cache.stream(prompt, params, lambda: produce(params), force)
+        elif stream:
+            chunks = produce(params)
+        else:
+            if cancel is not None:
+                params["stopping_criteria"] = cancel.stopping_criteria()
+            with self._lock:
+                output = self.model(prompt, **params)
+            if cancel is not None:
+                cancel.raise_if_cancelled()
+            return output["choices"][0]["text"].strip()
         if stream:
-            for output in self.model(prompt, stream=True, max_tokens=128, temperature=0.7, top_p=0.95, repeat_penalty=1.1):
+            return chunks
+        return "".join(chunks).strip()
+
+    def _stream(self, prompt, params, cancel=None):
+        if cancel is not None:
+            cancel.raise_if_cancelled()
+            # Not part of params: those are also the response cache key
+            params = dict(params, stopping_criteria=cancel.stopping_criteria())
+        with self._lock:
+            for output in self.model(prompt, stream=True, **params):
                 # output is a dict, extract text
                 if "choices" in output and output["choices"]:
                     yield output["choices"][0].get("text", "")
@@ -17,6 +104,130 @@ class LocalLLM:
                     yield output["text"]
                 else:
                     yield str(output)
+        if cancel is not None:
+            # Ended by the token rather than max_tokens / a stop word; the
+            # partial answer must not be cached
+            cancel.raise_if_cancelled()
+
+    # --- conversation sessions ---
+
+    def count_tokens(self, text):
+        return len(self.model.tokenize(text.encode("utf-8"), add_bos=False))
+
+    def build_prompt(self, history, max_tokens, context=""):
+        """Instruct-format prompt for a chat history of (content, sender)
+        rows, oldest first, ending with the user's latest message, which
+        gets `context` (retrieved snippets) in front of it.
+
+        Policy when over budget: drop the oldest turns first, DROP_TURNS at
+        a time counted from the start of `history`, so the prefix only
+        changes when another chunk has to go; the newest user message is
+        always kept and, if it alone does not fit, cut from the front.
+        """
+        budget = self.model.n_ctx() - max_tokens - 8
+        turns = []
+        for index, (content, sender) in enumerate(history):
+            if content.startswith("[image:") and content.endswith("]"):
+                continue
+            content = content.strip()
+            if context and index == len(history) - 1 and sender == 'user':
+                content = CONTEXT_TEMPLATE.format(context=context, content=content)
+            template = USER_TURN if sender == 'user' else AI_TURN
+            turns.append(template.format(content=content))
+
+        costs = [self.count_tokens(turn) for turn in turns]
+        total = sum(costs)
+        start = 0
+        while total > budget and start < len(turns) - 1:
+            drop = min(DROP_TURNS, len(turns) - 1 - start)
+            total -= sum(costs[start:start + drop])
+            start += drop
+        turns = turns[start:]
+        # Never open the prompt with an assistant turn
+        while len(turns) > 1 and not turns[0].startswith("[INST]"):
+            turns.pop(0)
+
+        if turns and total > budget:
+            tokens = self.model.tokenize(turns[-1].encode("utf-8"), add_bos=False)
+            tail = self.model.detokenize(tokens[-budget:]).decode("utf-8", errors="ignore")
+            turns[-1] = tail if tail.startswith("[INST]") else "[INST] " + tail
+        return "".join(turns)
+
+    def _activate(self, chat_id):
+        # Swap llama.cpp's KV state so the previous turns of this chat do
+        # not have to be evaluated again.
+        if chat_id == self._active_chat:
+            return
+        if self._active_chat is not None:
+            self._sessions[self._active_chat] = self.model.save_state()
+            self._sessions.move_to_end(self._active_chat)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        state = self._sessions.pop(chat_id, None)
+        if state is not None:
+            self.model.load_state(state)
         else:
-            output = self.model(prompt, max_tokens=128, temperature=0.7, top_p=0.95, repeat_penalty=1.1)
-            return output["choices"][0]["text"].strip()
\ No newline at end of file
+            self.model.reset()
+        self._active_chat = chat_id
+
+    def chat(self, chat_id, history, stream=False, force=False, cancel=None, context="", **kwargs):
+        prompt = self.build_prompt(history, self.generation_params(**kwargs)["max_tokens"], context)
+
+        def produce(params):
+            # Only the tokens past the longest common prefix with the chat's
+            # cached state are evaluated (llama.cpp reuses the rest). Not
+            # needed at all when the response comes from the cache.
+            with self._lock:
+                self._activate(chat_id)
+                yield from self._stream(prompt, params, cancel)
+        return self._generate(prompt, produce, stream, force, cancel, kwargs)
+
+    def forget(self, chat_id):
+        with self._lock:
+            self._sessions.pop(chat_id, None)
+            if chat_id == self._active_chat:
+                self.model.reset()
+                self._active_chat = None
+
+
+def autotune(prompt="Write a short paragraph about the sea.", tokens=64, candidates=None):
+    """Benchmark thread settings and return [(n_threads, n_threads_batch,
+    prompt tok/s, generation tok/s)], fastest generation first."""
+    base = load_settings()["llm"]
+    cores = physical_cores()
+    if candidates is None:
+        candidates = sorted({max(1, cores // 4), max(1, cores // 2), cores, os.cpu_count() or cores})
+    results = []
+    for n_threads in candidates:
+        # Prompt evaluation is batched and keeps scaling past the point
+        # where token generation becomes memory-bound.
+        settings = dict(base, n_threads=n_threads, n_threads_batch=max(n_threads, cores))
+        llm = LocalLLM(settings)
+        n_prompt = llm.count_tokens(prompt)
+        t0 = time.perf_counter()
+        first = None
+        generated = 0
+        for _ in llm.ask(prompt, stream=True, max_tokens=tokens, temperature=0.0):
+            if first is None:
+                first = time.perf_counter()
+            generated += 1
+        end = time.perf_counter()
+        first = first or end
+        prompt_tps = n_prompt / max(first - t0, 1e-9)
+        gen_tps = (generated - 1) / max(end - first, 1e-9) if generated > 1 else 0.0
+        results.append((llm.n_threads, llm.n_threads_batch, prompt_tps, gen_tps))
+        print(f"n_threads={llm.n_threads:>3} n_threads_batch={llm.n_threads_batch:>3}  "
+              f"prompt {prompt_tps:8.1f} tok/s  generation {gen_tps:6.1f} tok/s")
+        del llm
+    results.sort(key=lambda r: r[3], reverse=True)
+    return results
+
+
+if __name__ == "__main__":
+    # python -m workers.local_llm --autotune [--save]
+    if "--autotune" in sys.argv:
+        best = autotune()[0]
+        print(f"best: n_threads={best[0]} n_threads_batch={best[1]}")
+        if "--save" in sys.argv:
+            save_settings("llm", {"n_threads": best[0], "n_threads_batch": best[1]})
+            print("saved to settings.json")
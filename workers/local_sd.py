@@ -0,0 +1,288 @@
+import os
+import sys
+import json
+import time
+import shutil
+from collections import OrderedDict
+
+import torch
+from diffusers import StableDiffusionPipeline, DPMSolverMultistepScheduler
+
+from settings import load_settings, thread_budget
+
+# CPU performance profiles. Scheduler and steps trade image quality for
+# time; slicing/tiling trade a little speed for a lower peak RSS.
+PROFILES = {
+    "quality": {
+        "scheduler": None,        # keep the checkpoint's scheduler (PNDM)
+        "steps": 50,
+        "attention_slicing": False,
+        "vae_slicing": False,
+        "vae_tiling": False,
+        "channels_last": False,
+        "bfloat16": False,
+        "compile": False,
+    },
+    "balanced": {
+        "scheduler": "dpm++",     # DPM-Solver++ reaches PNDM@50 quality in ~25 steps
+        "steps": 25,
+        "attention_slicing": True,
+        "vae_slicing": True,
+        "vae_tiling": False,
+        "channels_last": True,
+        "bfloat16": False,
+        "compile": False,
+    },
+    "fast": {
+        "scheduler": "dpm++karras",
+        "steps": 15,
+        "attention_slicing": False,
+        "vae_slicing": False,
+        "vae_tiling": False,
+        "channels_last": True,
+        "bfloat16": True,         # only where the CPU has native bf16
+        "compile": True,          # torch.compile the UNet (not on Windows)
+    },
+}
+
+
+def cpu_supports_bf16():
+    # bf16 matmuls are only faster than fp32 with AVX512-BF16 or AMX
+    try:
+        with open("/proc/cpuinfo", "r") as f:
+            flags = f.read()
+    except OSError:
+        return False
+    return "avx512_bf16" in flags or "amx_bf16" in flags
+
+
+def resolve_profile(settings, profile=None):
+    name = profile or settings.get("profile", "balanced")
+    if name not in PROFILES:
+        raise ValueError(f"unknown SD profile {name!r}, expected one of {list(PROFILES)}")
+    options = dict(PROFILES[name])
+    # The profile's steps can be overridden without editing the profile
+    options.update(settings.get("overrides") or {})
+    if options["bfloat16"] and (torch.cuda.is_available() or not cpu_supports_bf16()):
+        options["bfloat16"] = False
+    if options["compile"] and (sys.platform == "win32" or not hasattr(torch, "compile")):
+        options["compile"] = False
+    return name, options
+
+
+def checkpoint_id(path):
+    # Identity of the weights for cache keys: name, size and mtime rather
+    # than hashing a multi-GB file on every start
+    st = os.stat(path)
+    return f"{os.path.basename(path)}:{st.st_size}:{st.st_mtime_ns}"
+
+
+# One-time conversion of the .ckpt to diffusers layout with safetensors
+# weights: from_single_file unpickles the whole checkpoint and rebuilds the
+# config on every start, while the converted copy is memory-mapped.
+DTYPES = {"float32": torch.float32, "float16": torch.float16, "bfloat16": torch.bfloat16}
+SOURCE_FILE = "converted_from.json"
+
+
+def converted_path(settings, dtype_name):
+    name = os.path.splitext(os.path.basename(settings["model_path"]))[0]
+    return os.path.join(settings["converted_dir"], f"{name}-{dtype_name}")
+
+
+def is_converted(settings, dtype_name):
+    # Valid only if converted from the checkpoint that is there now
+    try:
+        with open(os.path.join(converted_path(settings, dtype_name), SOURCE_FILE), "r") as f:
+            source = json.load(f)
+    except (OSError, ValueError):
+        return False
+    return source.get("checkpoint") == checkpoint_id(settings["model_path"])
+
+
+def convert_checkpoint(settings, dtype_name="float32"):
+    """Write the checkpoint as a diffusers directory with safetensors
+    weights in `dtype_name`; returns the directory."""
+    out = converted_path(settings, dtype_name)
+    pipe = StableDiffusionPipeline.from_single_file(settings["model_path"], torch_dtype=DTYPES[dtype_name])
+    # Written next to the target and renamed, so an interrupted conversion
+    # is never mistaken for a complete one
+    tmp = out + ".tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    pipe.save_pretrained(tmp, safe_serialization=True)
+    with open(os.path.join(tmp, SOURCE_FILE), "w") as f:
+        json.dump({"checkpoint": checkpoint_id(settings["model_path"]), "dtype": dtype_name}, f)
+    shutil.rmtree(out, ignore_errors=True)
+    os.replace(tmp, out)
+    return out
+
+
+def load_pipeline(settings, dtype):
+    if not settings.get("convert", True):
+        return StableDiffusionPipeline.from_single_file(settings["model_path"], torch_dtype=dtype)
+    dtype_name = settings.get("convert_dtype") or next(k for k, v in DTYPES.items() if v == dtype)
+    if not is_converted(settings, dtype_name):
+        try:
+            print("Converting", settings["model_path"], "to", converted_path(settings, dtype_name))
+            convert_checkpoint(settings, dtype_name)
+        except Exception as e:
+            print("Checkpoint conversion error:", e)
+            return StableDiffusionPipeline.from_single_file(settings["model_path"], torch_dtype=dtype)
+    return StableDiffusionPipeline.from_pretrained(
+        converted_path(settings, dtype_name), torch_dtype=dtype, use_safetensors=True)
+
+
+def make_scheduler(name, config):
+    if name == "dpm++":
+        return DPMSolverMultistepScheduler.from_config(config, algorithm_type="dpmsolver++")
+    if name == "dpm++karras":
+        return DPMSolverMultistepScheduler.from_config(
+            config, algorithm_type="dpmsolver++", use_karras_sigmas=True)
+    raise ValueError(f"unknown scheduler {name!r}")
+
+
+class LocalSD:
+    def __init__(self, settings=None, profile=None):
+        # settings: the "sd" section of settings.load_settings()
+        self.settings = settings or load_settings()["sd"]
+        self.profile, self.options = resolve_profile(self.settings, profile)
+        self.model_id = checkpoint_id(self.settings["model_path"])
+        if self.settings.get("convert", True) and self.settings.get("convert_dtype"):
+            # Weights stored at reduced precision give different images
+            self.model_id += ":" + self.settings["convert_dtype"]
+        self.n_threads = self.settings.get("n_threads") or thread_budget()["sd"]
+        torch.set_num_threads(self.n_threads)
+
+        self.dtype = torch.bfloat16 if self.options["bfloat16"] else torch.float32
+        self.device = "cuda" if torch.cuda.is_available() else "cpu"
+        pipe = load_pipeline(self.settings, self.dtype)
+        self.pipe = pipe.to(self.device)
+        self._apply_options()
+
+        # CLIP text embeddings of recent prompts, LRU, plus the empty
+        # prompt's (the unconditional half of classifier-free guidance)
+        self.embedding_cache_size = self.settings.get("embedding_cache_size", 64)
+        self._embeddings = OrderedDict()
+        self.embedding_hits = 0
+        self.embedding_misses = 0
+        self.encode_seconds = 0.0
+        with torch.inference_mode():
+            self.unconditional = self._encode("")
+
+    def _apply_options(self):
+        pipe, options = self.pipe, self.options
+        if options["scheduler"]:
+            pipe.scheduler = make_scheduler(options["scheduler"], pipe.scheduler.config)
+        if options["attention_slicing"]:
+            pipe.enable_attention_slicing()
+        if options["vae_slicing"]:
+            pipe.enable_vae_slicing()
+        if options["vae_tiling"]:
+            pipe.enable_vae_tiling()
+        if options["channels_last"]:
+            pipe.unet.to(memory_format=torch.channels_last)
+            pipe.vae.to(memory_format=torch.channels_last)
+        if options["compile"]:
+            try:
+                # Compiles lazily: the first image pays for it
+                pipe.unet = torch.compile(pipe.unet)
+            except Exception as e:
+                print("torch.compile error:", e)
+                self.options["compile"] = False
+
+    def generation_params(self, **kwargs):
+        # Profile defaults, overridden per request (num_inference_steps,
+        # guidance_scale, negative_prompt, width, height, generator, ...)
+        params = {
+            "num_inference_steps": self.options["steps"],
+            "guidance_scale": self.settings.get("guidance_scale", 7.5),
+        }
+        params.update(kwargs)
+        return params
+
+    # --- prompt embeddings ---
+
+    def _encode(self, text):
+        t0 = time.perf_counter()
+        embeds, _ = self.pipe.encode_prompt(text, self.device, 1, False)
+        self.encode_seconds += time.perf_counter() - t0
+        return embeds
+
+    def embed(self, prompt):
+        # The CLIP tokenizer lower-cases and splits on whitespace anyway
+        text = " ".join(prompt.lower().split())
+        if not text:
+            self.embedding_hits += 1
+            return self.unconditional
+        key = (self.model_id, text)
+        embeds = self._embeddings.get(key)
+        if embeds is not None:
+            self._embeddings.move_to_end(key)
+            self.embedding_hits += 1
+            return embeds
+        self.embedding_misses += 1
+        embeds = self._encode(text)
+        self._embeddings[key] = embeds
+        while len(self._embeddings) > self.embedding_cache_size:
+            self._embeddings.popitem(last=False)
+        return embeds
+
+    def embedding_params(self, prompts, negative_prompt=None):
+        # prompt_embeds / negative_prompt_embeds for a pipeline call, in
+        # place of prompt / negative_prompt
+        negative = self.embed(negative_prompt or "")
+        return {
+            "prompt_embeds": torch.cat([self.embed(prompt) for prompt in prompts]),
+            "negative_prompt_embeds": negative.expand(len(prompts), -1, -1),
+        }
+
+    def embedding_stats(self):
+        lookups = self.embedding_hits + self.embedding_misses
+        per_encode = self.encode_seconds / max(self.embedding_misses + 1, 1)  # +1: unconditional
+        return {
+            "hits": self.embedding_hits,
+            "misses": self.embedding_misses,
+            "hit_rate": self.embedding_hits / lookups if lookups else 0.0,
+            "entries": len(self._embeddings),
+            "encode_seconds": self.encode_seconds,
+            # Each hit (and every reuse of the unconditional embedding)
+            # skips one text encoder pass
+            "saved_seconds_estimate": self.embedding_hits * per_encode,
+        }
+
+    def generate(self, prompt, **kwargs):
+        return self.generate_batch([prompt], [None], **kwargs)[0]
+
+    def generate_batch(self, prompts, seeds, on_step=None, cancel=None, **kwargs):
+        """One pipeline call for several prompts sharing size, steps and
+        guidance; seeds has one entry per prompt. on_step(step, total) is
+        called after every denoising step. A cancelled token raises
+        CancelledError at the next step; unwinding the pipeline call
+        releases its latents right away."""
+        params = self.generation_params(**kwargs)
+        if any(seed is not None for seed in seeds):
+            params["generator"] = [
+                torch.Generator("cpu").manual_seed(seed if seed is not None else torch.seed())
+                for seed in seeds
+            ]
+        if on_step is not None or cancel is not None:
+            total = params["num_inference_steps"]
+
+            def step_end(pipe, step, timestep, callback_kwargs):
+                if cancel is not None:
+                    cancel.raise_if_cancelled()
+                if on_step is not None:
+                    on_step(step + 1, total)
+                return callback_kwargs
+            params["callback_on_step_end"] = step_end
+        if cancel is not None:
+            cancel.raise_if_cancelled()
+        with torch.inference_mode():
+            params.update(self.embedding_params(prompts, params.pop("negative_prompt", None)))
+            return self.pipe(**params).images
+
+
+if __name__ == "__main__":
+    # python -m workers.local_sd --convert [--dtype float16]
+    if "--convert" in sys.argv:
+        dtype_name = sys.argv[sys.argv.index("--dtype") + 1] if "--dtype" in sys.argv else "float32"
+        print("written to", convert_checkpoint(load_settings()["sd"], dtype_name))
@@ -0,0 +1,79 @@
+import threading
+from PySide6.QtCore import QObject, Signal
+
+UNLOADED = "unloaded"
+LOADING = "loading"
+READY = "ready"
+FAILED = "failed"
+
+
+class ModelRegistry(QObject):
+    """Models loaded independently, each in its own background thread.
+
+    register() a factory per model name; load() starts it (once) and the
+    result is announced with `ready`. Nothing is loaded until asked for,
+    so callers decide what is eager and what is on demand.
+    """
+
+    state_changed = Signal(str, str)   # name, state
+    ready = Signal(str, object)        # name, model
+    failed = Signal(str, str)          # name, message
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._factories = {}
+        self._models = {}
+        self._states = {}
+        self._loaded = {}
+        self._lock = threading.Lock()
+
+    def register(self, name, factory):
+        with self._lock:
+            self._factories[name] = factory
+            self._states[name] = UNLOADED
+            self._loaded[name] = threading.Event()
+
+    def load(self, name):
+        # No-op if the model is loading or loaded; retries after a failure
+        with self._lock:
+            if self._states[name] in (LOADING, READY):
+                return
+            self._states[name] = LOADING
+            self._loaded[name].clear()
+        self.state_changed.emit(name, LOADING)
+        threading.Thread(target=self._load, args=(name,), daemon=True).start()
+
+    def _load(self, name):
+        import traceback
+        try:
+            model = self._factories[name]()
+        except Exception as e:
+            tb = traceback.format_exc()
+            print("Model loading error:", tb)
+            with self._lock:
+                self._states[name] = FAILED
+                self._loaded[name].set()
+            self.state_changed.emit(name, FAILED)
+            self.failed.emit(name, f"{e}\n{tb}")
+            return
+        with self._lock:
+            self._models[name] = model
+            self._states[name] = READY
+            self._loaded[name].set()
+        self.state_changed.emit(name, READY)
+        self.ready.emit(name, model)
+
+    def get(self, name):
+        # The model if it is ready, else None
+        with self._lock:
+            return self._models.get(name)
+
+    def state(self, name):
+        with self._lock:
+            return self._states[name]
+
+    def wait(self, name, timeout=None):
+        """Block until `name` finished loading (for scripts and benchmarks);
+        returns the model or None if it failed or timed out."""
+        self._loaded[name].wait(timeout)
+        return self.get(name)
@@ -0,0 +1,124 @@
+import os
+import json
+import time
+import hashlib
+import threading
+
+from workers.cancellation import CancelledError
+
+
+def model_hash(path, block=1 << 20):
+    # sha256 of the size and the first and last MiB: hashing a multi-GB
+    # GGUF on every start would take longer than loading it
+    digest = hashlib.sha256()
+    size = os.path.getsize(path)
+    digest.update(str(size).encode("ascii"))
+    with open(path, "rb") as f:
+        digest.update(f.read(block))
+        f.seek(max(0, size - block))
+        digest.update(f.read(block))
+    return digest.hexdigest()
+
+
+class _InFlight:
+    # One generation in progress; followers replay its chunks as they come
+    def __init__(self):
+        self.chunks = []
+        self.done = False
+        self.complete = False
+        self.cond = threading.Condition()
+
+    def add(self, chunk):
+        with self.cond:
+            self.chunks.append(chunk)
+            self.cond.notify_all()
+
+    def finish(self, complete):
+        with self.cond:
+            self.done = True
+            self.complete = complete
+            self.cond.notify_all()
+
+    def follow(self):
+        index = 0
+        while True:
+            with self.cond:
+                self.cond.wait_for(lambda: len(self.chunks) > index or self.done)
+                new = self.chunks[index:]
+                done = self.done
+            index += len(new)
+            yield from new
+            if done and index == len(self.chunks):
+                if not self.complete:
+                    # The generation was cancelled or failed: what was
+                    # replayed so far is not a whole answer
+                    raise CancelledError()
+                return
+
+
+class ResponseCache:
+    """LLM responses persisted in the llm_cache table, keyed by (model
+    hash, prompt, generation params incl. seed) and LRU-evicted past
+    `max_entries`. Hits are replayed chunk by chunk, so callers consume a
+    cached answer exactly like a live stream. Identical requests made
+    while one is generating follow that generation instead of starting
+    their own."""
+
+    def __init__(self, db, model_id, max_entries=500):
+        self.db = db
+        self.model_id = model_id
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def key(self, prompt, params):
+        fields = {"model": self.model_id, "prompt": prompt, "params": params}
+        return hashlib.sha256(json.dumps(fields, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+    def stream(self, prompt, params, produce, force=False):
+        """Chunks for prompt/params: cached, following an identical
+        generation in progress, or from produce() (a chunk iterator).
+        force skips the cache lookup but still coalesces."""
+        key = self.key(prompt, params)
+        with self._lock:
+            flight = self._in_flight.get(key)
+            if flight is not None:
+                self.coalesced += 1
+                return flight.follow()
+            if not force:
+                cached = self.db.get_cached_response(key, time.time())
+                if cached is not None:
+                    self.hits += 1
+                    return iter(json.loads(cached))
+            self.misses += 1
+            flight = self._in_flight[key] = _InFlight()
+        return self._produce(key, flight, produce)
+
+    def _produce(self, key, flight, produce):
+        complete = False
+        try:
+            for chunk in produce():
+                flight.add(chunk)
+                yield chunk
+            complete = True
+        finally:
+            # A generation that was cancelled or failed is not cached
+            with self._lock:
+                self._in_flight.pop(key, None)
+            flight.finish(complete)
+            if complete:
+                self.db.add_cached_response(key, json.dumps(flight.chunks), time.time(), self.max_entries)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "in_flight": len(self._in_flight),
+            }
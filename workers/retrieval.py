@@ -0,0 +1,320 @@
+import os
+import sys
+import json
+import threading
+
+import numpy as np
+
+from settings import load_settings, thread_budget
+from workers.response_cache import model_hash
+from workers.scheduler import INDEX
+
+EMBED_MAX_CHARS = 2000    # longer messages are embedded by their beginning
+SNIPPET_MAX_CHARS = 300   # per retrieved message in the prompt
+SEARCH_BLOCK = 65536      # index rows scored per matmul (~100 MB at 384 dims)
+TASK_BATCHES = 4          # embedding batches per scheduler task
+
+
+class Embedder:
+    """Sentence embeddings on the CPU through llama.cpp, from a GGUF
+    embedding model (all-MiniLM-L6-v2 by default). Rows are L2-normalised
+    float32, so a dot product is the cosine similarity."""
+
+    def __init__(self, settings):
+        from llama_cpp import Llama
+        n_ctx = settings.get("n_ctx", 512)
+        self.model = Llama(
+            model_path=settings["model_path"],
+            embedding=True,
+            n_ctx=n_ctx,
+            # Encoder models need a whole input in one batch
+            n_batch=n_ctx,
+            n_ubatch=n_ctx,
+            n_threads=settings.get("n_threads") or thread_budget()["index"],
+            verbose=False,
+        )
+        self.model_id = model_hash(settings["model_path"])
+        self.dim = self.model.n_embd()
+        # One llama.cpp context: query embeddings (chat) and indexing
+        # batches (background) take turns
+        self._lock = threading.Lock()
+
+    def embed(self, texts):
+        texts = [text[:EMBED_MAX_CHARS] for text in texts]
+        with self._lock:
+            vectors = self.model.embed(texts, normalize=True, truncate=True)
+        return np.asarray(vectors, dtype=np.float32).reshape(len(texts), self.dim)
+
+
+class VectorIndex:
+    """Append-only matrix of unit vectors with the message id of each row:
+    `<path>.f32` (float32 rows), `<path>.ids` (int64) and `<path>.json`
+    ({"model", "dim", "count", "last_id"}). Searched through a read-only
+    memory map, so a 1M x 384 index costs page cache, not process memory.
+
+    The data files are appended before the metadata is replaced, so after
+    a crash the rows past "count" are simply cut off on open.
+    """
+
+    def __init__(self, path, dim, model_id):
+        self.path = path
+        self.dim = dim
+        self.model_id = model_id
+        self._lock = threading.RLock()
+        self._vectors = None
+        self._ids = None
+        self._load()
+
+    def _load(self):
+        meta = {}
+        try:
+            with open(self.path + ".json", "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            pass
+        self.count = 0
+        self.last_id = 0
+        # Vectors of another model are useless: start over
+        if meta.get("model") == self.model_id and meta.get("dim") == self.dim:
+            self.count = meta["count"]
+            self.last_id = meta["last_id"]
+        for ext, itemsize in ((".f32", 4 * self.dim), (".ids", 8)):
+            name = self.path + ext
+            size = os.path.getsize(name) if os.path.exists(name) else 0
+            if size < self.count * itemsize:
+                print("Retrieval index error: truncated", name)
+                self.count = self.last_id = 0
+        for ext, itemsize in ((".f32", 4 * self.dim), (".ids", 8)):
+            with open(self.path + ext, "ab") as f:
+                f.truncate(self.count * itemsize)
+        self._vectors = self._ids = None
+
+    def _write_meta(self):
+        meta = {"model": self.model_id, "dim": self.dim, "count": self.count, "last_id": self.last_id}
+        with open(self.path + ".json.tmp", "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(self.path + ".json.tmp", self.path + ".json")
+
+    def add(self, ids, vectors, last_id):
+        # last_id: highest message id seen, including skipped messages
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32).reshape(len(ids), self.dim)
+        with self._lock:
+            if len(ids):
+                with open(self.path + ".f32", "ab") as f:
+                    f.write(vectors.tobytes())
+                with open(self.path + ".ids", "ab") as f:
+                    f.write(np.asarray(ids, dtype=np.int64).tobytes())
+                self.count += len(ids)
+                self._vectors = self._ids = None  # remapped at the new size
+            self.last_id = last_id
+            self._write_meta()
+
+    def _maps(self):
+        if self._vectors is None:
+            self._vectors = np.memmap(self.path + ".f32", np.float32, "r", shape=(self.count, self.dim))
+            self._ids = np.memmap(self.path + ".ids", np.int64, "r", shape=(self.count,))
+        return self._vectors, self._ids
+
+    def search(self, queries, k):
+        """Top-k rows by cosine similarity for each query (unit vectors,
+        one per row): [[(message_id, score), ...] best first, per query].
+        All queries are scored in the same pass over the index."""
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, self.dim)
+        with self._lock:
+            if not self.count or k <= 0:
+                return [[] for _ in range(len(queries))]
+            vectors, ids = self._maps()
+            k = min(k, self.count)
+            best_scores = np.empty((len(queries), 0), np.float32)
+            best_rows = np.empty((len(queries), 0), np.int64)
+            for start in range(0, self.count, SEARCH_BLOCK):
+                # rows x queries is the faster layout for BLAS
+                scores = (vectors[start:start + SEARCH_BLOCK] @ queries.T).T
+                rows = np.broadcast_to(np.arange(start, start + scores.shape[1]), scores.shape)
+                scores = np.concatenate([best_scores, scores], axis=1)
+                rows = np.concatenate([best_rows, rows], axis=1)
+                if scores.shape[1] > k:
+                    top = np.argpartition(scores, -k, axis=1)[:, -k:]
+                    scores = np.take_along_axis(scores, top, axis=1)
+                    rows = np.take_along_axis(rows, top, axis=1)
+                best_scores, best_rows = scores, rows
+            order = np.argsort(-best_scores, axis=1)
+            best_scores = np.take_along_axis(best_scores, order, axis=1)
+            best_ids = ids[np.take_along_axis(best_rows, order, axis=1)]
+        return [list(zip(best_ids[i].tolist(), best_scores[i].tolist())) for i in range(len(queries))]
+
+    def clear(self):
+        with self._lock:
+            self.count = self.last_id = 0
+            for ext in (".f32", ".ids"):
+                with open(self.path + ext, "wb"):
+                    pass
+            self._vectors = self._ids = None
+            self._write_meta()
+
+    def replace_with(self, other):
+        # Takes over other's files (a rebuilt index of the same model)
+        with self._lock, other._lock:
+            self._vectors = self._ids = other._vectors = other._ids = None
+            # Without metadata a half-swapped index is rebuilt, not misread
+            if os.path.exists(self.path + ".json"):
+                os.remove(self.path + ".json")
+            for ext in (".f32", ".ids", ".json"):
+                os.replace(other.path + ext, self.path + ext)
+            self._load()
+
+
+class RetrievalIndex:
+    """Semantic memory over every stored message, for LLM context.
+
+    New messages are embedded in the background (lowest scheduler
+    priority) as the database announces them; messages added while the
+    app was closed, or all of them after a change of embedding model, are
+    picked up the same way on start(). context_for() turns the closest
+    earlier messages into prompt text within a token budget.
+    """
+
+    def __init__(self, db, scheduler, settings=None, embedder=None):
+        self.settings = settings or load_settings()["retrieval"]
+        self.db = db
+        self.scheduler = scheduler
+        self.embedder = embedder or Embedder(self.settings)
+        os.makedirs(self.settings["index_dir"], exist_ok=True)
+        self.index = VectorIndex(os.path.join(self.settings["index_dir"], "messages"),
+                                 self.embedder.dim, self.embedder.model_id)
+        self._lock = threading.Lock()
+        self._update_lock = threading.Lock()  # one indexing pass at a time
+        self._update_scheduled = False
+
+    def start(self):
+        self.db.message_added.connect(self._on_message_added)
+        self.schedule_update()
+
+    def _on_message_added(self, chat_id, message_id):
+        self.schedule_update()
+
+    def schedule_update(self):
+        # At most one update waits in the queue; it indexes everything
+        # added up to the moment it runs
+        with self._lock:
+            if self._update_scheduled:
+                return
+            self._update_scheduled = True
+        self.scheduler.submit(INDEX, self._update)
+
+    def _update(self):
+        with self._lock:
+            self._update_scheduled = False
+        try:
+            with self._update_lock:
+                caught_up = self._index_new(self.index, TASK_BATCHES)
+        except Exception as e:
+            print("Indexing error:", e)
+            return
+        if not caught_up:
+            # The rest in another task: a long backlog (first run, model
+            # change) must not hold a pool worker for minutes
+            self.schedule_update()
+
+    def update_now(self):
+        # Catch up in the calling thread, for scripts
+        with self._update_lock:
+            self._index_new(self.index)
+
+    def _index_new(self, index, max_batches=None):
+        # Embeds the messages past index.last_id, a batch at a time;
+        # False if it stopped after max_batches with more left
+        batches = 0
+        while max_batches is None or batches < max_batches:
+            batches += 1
+            rows = self.db.get_messages_after(index.last_id, self.settings["batch_size"])
+            if not rows:
+                return True
+            ids, texts = [], []
+            for message_id, content in rows:
+                content = content.strip()
+                if not content or (content.startswith("[image:") and content.endswith("]")):
+                    continue
+                ids.append(message_id)
+                texts.append(content)
+            vectors = self.embedder.embed(texts) if texts else np.empty((0, index.dim), np.float32)
+            index.add(ids, vectors, rows[-1][0])
+        return False
+
+    def reindex(self):
+        """Rebuild the index from scratch in background tasks and swap it
+        in when done; searches use the current one meanwhile. Returns a
+        threading.Event set once finished."""
+        rebuilt = VectorIndex(self.index.path + ".rebuild", self.index.dim, self.index.model_id)
+        rebuilt.clear()
+        done = threading.Event()
+        self.scheduler.submit(INDEX, self._reindex_step, rebuilt, done)
+        return done
+
+    def _reindex_step(self, rebuilt, done):
+        try:
+            if not self._index_new(rebuilt, TASK_BATCHES):
+                self.scheduler.submit(INDEX, self._reindex_step, rebuilt, done)
+                return
+            with self._update_lock:
+                # Messages added during the rebuild
+                self._index_new(rebuilt)
+                self.index.replace_with(rebuilt)
+        except Exception as e:
+            print("Reindexing error:", e)
+        done.set()
+
+    def search(self, texts, k=None):
+        # [[(message_id, score), ...] best first, per text]
+        return self.index.search(self.embedder.embed(texts), k or self.settings["top_k"])
+
+    def context_for(self, text, count_tokens, exclude_ids=(), budget=None):
+        """Earlier messages related to `text` as prompt lines, most similar
+        first, within `budget` tokens (count_tokens: the LLM's tokenizer).
+        exclude_ids: messages already in the prompt. "" if nothing fits."""
+        budget = budget or self.settings["context_tokens"]
+        top_k = self.settings["top_k"]
+        exclude = set(exclude_ids)
+        # Over-fetch: excluded ids and deleted chats are dropped below
+        hits = self.search([text], 2 * top_k + len(exclude))[0]
+        hits = [(message_id, score) for message_id, score in hits
+                if message_id not in exclude and score >= self.settings["min_score"]]
+        if not hits:
+            return ""
+        rows = {row[0]: row for row in self.db.get_messages_by_ids([message_id for message_id, _ in hits])}
+        lines = []
+        used = 0
+        for message_id, _ in hits:
+            if message_id not in rows:
+                continue
+            _, _, content, sender, title = rows[message_id]
+            content = " ".join(content.split())
+            if len(content) > SNIPPET_MAX_CHARS:
+                content = content[:SNIPPET_MAX_CHARS].rsplit(" ", 1)[0] + " …"
+            line = f"- {'User' if sender == 'user' else 'Assistant'} in \"{title}\": {content}"
+            cost = count_tokens(line + "\n")
+            if used + cost > budget:
+                continue  # a shorter one further down may still fit
+            lines.append(line)
+            used += cost
+            if len(lines) == top_k:
+                break
+        return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    # python -m workers.retrieval --reindex | --query "text"
+    from database import DatabaseManager
+    from workers.scheduler import InferenceScheduler
+    scheduler = InferenceScheduler(1)
+    scheduler.start()
+    retrieval = RetrievalIndex(DatabaseManager(load_settings()["database"]["path"]), scheduler)
+    if "--reindex" in sys.argv:
+        retrieval.reindex().wait()
+        print(f"indexed {retrieval.index.count} messages")
+    elif "--query" in sys.argv:
+        retrieval.update_now()
+        query = sys.argv[sys.argv.index("--query") + 1]
+        for message_id, score in retrieval.search([query])[0]:
+            print(f"{score:.3f}  message {message_id}")
+    scheduler.shutdown()
@@ -0,0 +1,161 @@
+import time
+import heapq
+import itertools
+import threading
+from collections import deque
+
+from workers.cancellation import CancelledError
+
+# Priorities, most urgent first: a waiting chat reply runs before voice
+# work, which runs before image batches; background indexing goes last.
+# Running tasks are not preempted.
+CHAT = 0
+VOICE = 1
+IMAGE = 2
+INDEX = 3
+PRIORITY_NAMES = {CHAT: "chat", VOICE: "voice", IMAGE: "image", INDEX: "index"}
+
+WAIT_SAMPLES = 256  # recent queue waits kept per priority for stats()
+
+
+class Task:
+    def __init__(self, scheduler, priority, fn, args, kwargs):
+        self.scheduler = scheduler
+        self.priority = priority
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.submitted_at = time.perf_counter()
+        self.started_at = None
+        self.result_value = None
+        self.exception = None
+        self.done = threading.Event()
+
+    def cancel(self):
+        # Only a task still waiting in the queue can be cancelled
+        return self.scheduler._remove(self)
+
+    def result(self, timeout=None):
+        if not self.done.wait(timeout):
+            raise TimeoutError("task still running")
+        if self.exception is not None:
+            raise self.exception
+        return self.result_value
+
+    def _finish(self, value=None, exception=None):
+        self.result_value = value
+        self.exception = exception
+        self.done.set()
+
+
+class InferenceScheduler:
+    """Long-lived worker pool shared by all inference work (chat replies,
+    voice sessions, image batches) with one priority queue in front of it.
+
+    Workers are started once and reused; submit() never blocks, so it is
+    safe to call from the UI thread. Results go wherever the task sends
+    them (Qt signals for the UI), or through Task.result() for callers
+    that are already on a background thread.
+    """
+
+    def __init__(self, workers=3):
+        self.workers = workers
+        self._cond = threading.Condition()
+        self._queue = []  # heap of (priority, seq, task)
+        self._seq = itertools.count()
+        self._threads = []
+        self._running = {priority: 0 for priority in PRIORITY_NAMES}
+        self._waits = {priority: deque(maxlen=WAIT_SAMPLES) for priority in PRIORITY_NAMES}
+        self._completed = {priority: 0 for priority in PRIORITY_NAMES}
+        self._stopping = False
+
+    def start(self):
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"inference-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, priority, fn, *args, **kwargs):
+        task = Task(self, priority, fn, args, kwargs)
+        with self._cond:
+            if self._stopping:
+                task._finish(exception=CancelledError())
+                return task
+            heapq.heappush(self._queue, (priority, next(self._seq), task))
+            self._cond.notify()
+        return task
+
+    def run(self, priority, fn, *args, **kwargs):
+        """submit() and wait for the result, for background threads only.
+        If the call gets a `cancel` token, cancelling it while the task is
+        still queued drops the task (CancelledError)."""
+        task = self.submit(priority, fn, *args, **kwargs)
+        if kwargs.get("cancel") is not None:
+            kwargs["cancel"].on_cancel(task.cancel)
+        return task.result()
+
+    def shutdown(self, timeout=None):
+        # Queued tasks fail with CancelledError; running ones finish
+        with self._cond:
+            self._stopping = True
+            queued, self._queue = self._queue, []
+            self._cond.notify_all()
+        for _, _, task in queued:
+            task._finish(exception=CancelledError())
+        if timeout:
+            deadline = time.monotonic() + timeout
+            for thread in self._threads:
+                thread.join(max(0, deadline - time.monotonic()))
+
+    def stats(self):
+        """{"chat": {"queued", "running", "completed", "wait_mean",
+        "wait_p95", "wait_max"}, "voice": ..., "image": ..., "index": ...}; waits are
+        seconds from submit() to start over the recent tasks."""
+        with self._cond:
+            queued = {priority: 0 for priority in PRIORITY_NAMES}
+            for priority, _, _ in self._queue:
+                queued[priority] += 1
+            stats = {}
+            for priority, name in PRIORITY_NAMES.items():
+                waits = sorted(self._waits[priority])
+                stats[name] = {
+                    "queued": queued[priority],
+                    "running": self._running[priority],
+                    "completed": self._completed[priority],
+                    "wait_mean": sum(waits) / len(waits) if waits else 0.0,
+                    "wait_p95": waits[int(0.95 * (len(waits) - 1))] if waits else 0.0,
+                    "wait_max": waits[-1] if waits else 0.0,
+                }
+            return stats
+
+    def _remove(self, task):
+        with self._cond:
+            for index, (_, _, queued) in enumerate(self._queue):
+                if queued is task:
+                    self._queue.pop(index)
+                    heapq.heapify(self._queue)
+                    break
+            else:
+                return False
+        task._finish(exception=CancelledError())
+        return True
+
+    def _work(self):
+        while True:
+            with self._cond:
+                while not self._stopping and not self._queue:
+                    self._cond.wait()
+                if self._stopping:
+                    return
+                priority, _, task = heapq.heappop(self._queue)
+                task.started_at = time.perf_counter()
+                self._waits[priority].append(task.started_at - task.submitted_at)
+                self._running[priority] += 1
+            try:
+                task._finish(task.fn(*task.args, **task.kwargs))
+            except Exception as e:
+                task._finish(exception=e)
+            finally:
+                with self._cond:
+                    self._running[priority] -= 1
+                    self._completed[priority] += 1
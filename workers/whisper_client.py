@@ -0,0 +1,273 @@
+import time
+import socket
+import itertools
+import threading
+import subprocess
+from collections import deque
+from PySide6.QtCore import QObject, Signal
+
+from Whisper_worker import protocol
+
+WHISPER_PYTHON = r"whisper_worker\.venv\Scripts\python.exe"
+WHISPER_SCRIPT = r"whisper_worker\whisper_server.py"
+
+
+class SessionState:
+    # Client-side view of one session: negotiated format and flow control
+    def __init__(self):
+        self.ready = threading.Event()
+        self.format = None
+        self.error = None
+        self.window = 0
+        self.sent = 0
+        self.acked = 0
+
+
+class WhisperClient(QObject):
+    """Connection to the long-lived whisper daemon, reused across voice
+    inputs. Each utterance is its own session on the shared socket."""
+
+    transcription = Signal(int, str, bool)  # session_id, text, final
+    error = Signal(int, str)                # session_id, message
+
+    def __init__(self, host="localhost", port=protocol.DEFAULT_PORT,
+                 python=WHISPER_PYTHON, script=WHISPER_SCRIPT, cpu_threads=None, parent=None):
+        super().__init__(parent)
+        self.host = host
+        self.port = port
+        self.cpu_threads = cpu_threads  # CTranslate2 threads of a daemon we start
+        self.python = python
+        self.script = script
+        self.process = None  # only set if this client started the daemon
+        self.sock = None
+        self.send_lock = threading.Lock()
+        self.reader_thread = None
+        self._session_ids = itertools.count(1)
+        self._pong = None
+        self._pong_event = threading.Event()
+        self._sessions = {}
+        self._finished = deque(maxlen=16)  # recently finished session ids
+        self._flow = threading.Condition()
+
+    # --- connection ---
+
+    def _connect(self):
+        sock = socket.create_connection((self.host, self.port))
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.sock = sock
+        self.reader_thread = threading.Thread(target=self._read_loop, daemon=True)
+        self.reader_thread.start()
+
+    def is_connected(self):
+        return self.sock is not None
+
+    def ensure_server(self, timeout=30.0):
+        """Connect to the daemon, starting it first if nobody is listening.
+        The model loads once inside the daemon, so only the first call of a
+        session pays for it."""
+        if self.sock is not None and self.ping(timeout=2.0) is not None:
+            return True
+        self._drop_socket()
+        try:
+            self._connect()
+            return True
+        except ConnectionRefusedError:
+            pass
+
+        if self.process is None or self.process.poll() is not None:
+            args = [self.python, self.script, "--socket", "--port", str(self.port)]
+            if self.cpu_threads:
+                args += ["--threads", str(self.cpu_threads)]
+            self.process = subprocess.Popen(
+                args,
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+            )
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            try:
+                self._connect()
+                return True
+            except ConnectionRefusedError:
+                if self.process.poll() is not None:
+                    return False
+                time.sleep(0.1)
+        return False
+
+    def _read_loop(self):
+        sock = self.sock
+        while True:
+            try:
+                frame = protocol.read_frame(sock)
+            except (OSError, ValueError) as e:
+                if self.sock is sock:  # not closed by us
+                    print("Socket receive error:", e)
+                break
+            if frame is None:
+                break
+            msg_type, session_id, payload = frame
+            if msg_type == protocol.ACK:
+                with self._flow:
+                    state = self._sessions.get(session_id)
+                    if state is not None:
+                        state.acked = protocol.decode_ack(payload)
+                        self._flow.notify_all()
+                continue
+            try:
+                msg = protocol.decode_json(payload)
+            except ValueError as e:
+                print("Transcription parse error:", e)
+                continue
+            if msg_type in (protocol.PARTIAL, protocol.FINAL):
+                final = msg_type == protocol.FINAL
+                with self._flow:
+                    if session_id not in self._sessions:
+                        continue  # cancelled, text still in flight
+                    if final:
+                        self._sessions.pop(session_id, None)
+                        self._finished.append(session_id)
+                        self._flow.notify_all()  # senders waiting on its window
+                self.transcription.emit(session_id, msg.get("text", ""), final)
+            elif msg_type == protocol.READY:
+                state = self._sessions.get(session_id)
+                if state is not None:
+                    state.format = msg
+                    state.window = msg["window"]
+                    state.ready.set()
+            elif msg_type == protocol.ERROR:
+                state = self._sessions.get(session_id)
+                if state is not None and not state.ready.is_set():
+                    state.error = msg.get("error", "unknown error")
+                    state.ready.set()
+                self.error.emit(session_id, msg.get("error", "unknown error"))
+            elif msg_type == protocol.PONG:
+                self._pong = msg
+                self._pong_event.set()
+        if self.sock is sock:
+            self.sock = None
+        # Wake up anyone blocked on flow control or negotiation
+        with self._flow:
+            for state in self._sessions.values():
+                state.error = state.error or "connection closed"
+                state.ready.set()
+            self._sessions.clear()
+            self._flow.notify_all()
+
+    def _send(self, data):
+        sock = self.sock
+        if sock is None:
+            raise ConnectionError("whisper daemon not connected")
+        with self.send_lock:
+            sock.sendall(data)
+
+    def _drop_socket(self):
+        sock, self.sock = self.sock, None
+        if sock is not None:
+            try:
+                sock.close()
+            except OSError:
+                pass
+
+    # --- requests ---
+
+    def ping(self, timeout=2.0):
+        # Health check: returns the daemon's status dict or None
+        self._pong_event.clear()
+        try:
+            self._send(protocol.encode(protocol.PING, 0))
+        except (OSError, ConnectionError):
+            return None
+        if not self._pong_event.wait(timeout):
+            return None
+        return self._pong
+
+    def start_session(self, sample_rate=16000, format="s16le", channels=1, timeout=5.0,
+                      cancel=None, **options):
+        """Open a session and negotiate the audio format; returns the
+        session id once the daemon answered READY. Extra options (vad,
+        end_silence) are passed through in the HELLO. Cancelling the
+        `cancel` token drops the session (see cancel_session)."""
+        session_id = next(self._session_ids)
+        state = SessionState()
+        with self._flow:
+            self._sessions[session_id] = state
+        self._send(protocol.encode_json(protocol.HELLO, session_id, {
+            "sample_rate": sample_rate, "format": format, "channels": channels, **options,
+        }))
+        if not state.ready.wait(timeout):
+            state.error = "no answer from whisper daemon"
+        if state.error:
+            with self._flow:
+                self._sessions.pop(session_id, None)
+            raise ConnectionError(state.error)
+        if cancel is not None:
+            cancel.on_cancel(lambda: self.cancel_session(session_id))
+        return session_id
+
+    def send_audio(self, session_id, chunk, timeout=None):
+        """Send one chunk, waiting while the session's flow-control window
+        is full. Returns False if it is still full after `timeout` seconds
+        (the chunk is not sent), so a realtime caller can decide to drop.
+        Also returns False once the daemon finished the session on its own
+        (end of speech)."""
+        with self._flow:
+            state = self._sessions.get(session_id)
+            if state is None:
+                if session_id in self._finished:
+                    return False
+                raise ConnectionError(f"whisper session {session_id} is not open")
+            if not self._flow.wait_for(
+                    lambda: state.sent - state.acked + len(chunk) <= state.window
+                    or state.sent == state.acked or state.error
+                    or session_id not in self._sessions,
+                    timeout):
+                return False
+            if state.error:
+                raise ConnectionError(state.error)
+            if session_id not in self._sessions:
+                return False  # cancelled or finished while waiting
+            state.sent += len(chunk)
+        self._send(protocol.encode(protocol.AUDIO, session_id, chunk))
+        return True
+
+    def in_flight(self, session_id):
+        # Audio bytes sent but not yet consumed by the daemon
+        with self._flow:
+            state = self._sessions.get(session_id)
+            return 0 if state is None else state.sent - state.acked
+
+    def end_session(self, session_id):
+        self._send(protocol.encode(protocol.END, session_id))
+
+    def cancel_session(self, session_id):
+        # No final transcription will come; senders blocked on flow control
+        # wake up and get False like for a session that ended on silence
+        with self._flow:
+            if self._sessions.pop(session_id, None) is None:
+                return
+            self._finished.append(session_id)
+            self._flow.notify_all()
+        try:
+            self._send(protocol.encode(protocol.CANCEL, session_id))
+        except (OSError, ConnectionError):
+            pass
+
+    def close(self, shutdown_server=False):
+        # shutdown_server only stops a daemon this client started; one that
+        # was already running belongs to another instance and its clients
+        if shutdown_server and self.process is not None and self.sock is not None:
+            try:
+                self._send(protocol.encode(protocol.SHUTDOWN, 0))
+            except (OSError, ConnectionError):
+                pass
+        self._drop_socket()
+        if shutdown_server and self.process is not None:
+            # Called from closeEvent: the daemon is reaped off the UI thread
+            threading.Thread(target=self._reap, args=(self.process,)).start()
+            self.process = None
+
+    @staticmethod
+    def _reap(process):
+        try:
+            process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            process.terminate()